@@ -0,0 +1,8 @@
+# automatcher/__main__.py - Punto de entrada sin interfaz gráfica: python -m automatcher
+
+import sys
+
+from automatcher.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
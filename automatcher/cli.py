@@ -0,0 +1,392 @@
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import metricas
+from utils.logger import activar_debug, get_logger
+
+logger = get_logger(__name__)
+
+EXTENSION_PDF = '.pdf'
+PREFIJO_FRAGMENTO = 'fragmento_'
+
+
+@dataclass
+class Trabajo:
+    """Una tripleta PDF de soportes / Excel de TBs / carpeta de salida."""
+    pdf: str
+    excel: str
+    salida: str
+
+
+def leer_manifiesto(ruta: str) -> List[Trabajo]:
+    """
+    Lee un manifiesto JSON (lista de objetos) o CSV con las claves/columnas
+    'pdf', 'excel' y 'salida'. Las rutas relativas se resuelven respecto a la
+    carpeta del manifiesto.
+    """
+    base = os.path.dirname(os.path.abspath(ruta))
+    with open(ruta, 'r', encoding='utf-8-sig', newline='') as f:
+        if ruta.lower().endswith('.json'):
+            filas = json.load(f)
+        else:
+            filas = list(csv.DictReader(f))
+
+    trabajos = []
+    for numero, fila in enumerate(filas, start=1):
+        faltantes = [clave for clave in ('pdf', 'excel', 'salida') if not fila.get(clave)]
+        if faltantes:
+            raise ValueError(f"Manifiesto '{ruta}', entrada {numero}: faltan {', '.join(faltantes)}")
+        trabajos.append(Trabajo(*(os.path.join(base, str(fila[clave]).strip())
+                                  for clave in ('pdf', 'excel', 'salida'))))
+    return trabajos
+
+
+def _ejecutar_trabajo(trabajo: Trabajo, margen: float, workers: Optional[int],
+                     asignacion: str) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """
+    Ejecuta el flujo de un trabajo y devuelve su resumen y, si se ejecutó en
+    un proceso aparte, las métricas registradas en él.
+    """
+    from core.pipeline import ejecutar_flujo
+
+    nombre = os.path.basename(trabajo.pdf)
+    en_proceso_propio = multiprocessing.parent_process() is not None
+    if en_proceso_propio:
+        metricas.reiniciar()
+    resumen = ejecutar_flujo(
+        trabajo.pdf, trabajo.excel, trabajo.salida,
+        margen=margen, workers=workers, asignacion=asignacion,
+        log=lambda msg: logger.info(f"[{nombre}] {msg}")
+    )
+    if not en_proceso_propio or metricas.METRICAS.vacia():
+        return resumen, None
+    return resumen, metricas.METRICAS.instantanea()
+
+
+class ColaTrabajos:
+    """
+    Cola acotada de trabajos atendida por un número fijo de hilos.
+
+    Cada trabajo ya reparte su OCR entre procesos; los hilos solo permiten
+    solapar trabajos independientes. Con más de un hilo, cada trabajo se
+    ejecuta en un proceso propio: pdfium no admite llamadas simultáneas
+    desde varios hilos y, en modo serie, el renderizado usa el documento
+    abierto del proceso. Los trabajos que comparten Excel se serializan con
+    un candado por archivo para no pisar la columna 'usado'.
+    """
+
+    def __init__(self, hilos: int = 1, workers: Optional[int] = None, margen: float = 100.0,
+                 asignacion: str = 'secuencial'):
+        self.workers = workers
+        self.margen = margen
+        self.asignacion = asignacion
+        self._cola: queue.Queue = queue.Queue(maxsize=max(1, hilos) * 2)
+        self._candados: Dict[str, threading.Lock] = {}
+        self._candado_global = threading.Lock()
+        self.fallidos: List[Trabajo] = []
+        self.completados: List[Trabajo] = []
+        # 'spawn': no se hereda por fork el estado de los hilos de este proceso
+        self._procesos: Optional[ProcessPoolExecutor] = None
+        if hilos > 1:
+            self._procesos = ProcessPoolExecutor(max_workers=hilos,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        self._hilos = [threading.Thread(target=self._atender, daemon=True) for _ in range(max(1, hilos))]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def _candado(self, excel: str) -> threading.Lock:
+        with self._candado_global:
+            return self._candados.setdefault(os.path.abspath(excel), threading.Lock())
+
+    def encolar(self, trabajo: Trabajo, al_terminar=None) -> None:
+        """Bloquea si la cola está llena (contrapresión sobre quien encola)."""
+        self._cola.put((trabajo, al_terminar))
+
+    def _atender(self) -> None:
+        while True:
+            item = self._cola.get()
+            if item is None:
+                self._cola.task_done()
+                return
+            trabajo, al_terminar = item
+            ok = self._ejecutar(trabajo)
+            if al_terminar is not None:
+                al_terminar(trabajo, ok)
+            self._cola.task_done()
+
+    def _ejecutar(self, trabajo: Trabajo) -> bool:
+        nombre = os.path.basename(trabajo.pdf)
+        argumentos = (trabajo, self.margen, self.workers, self.asignacion)
+        try:
+            with self._candado(trabajo.excel):
+                logger.info(f"[{nombre}] Iniciando trabajo")
+                if self._procesos is None:
+                    resumen, instantanea = _ejecutar_trabajo(*argumentos)
+                else:
+                    resumen, instantanea = self._procesos.submit(_ejecutar_trabajo, *argumentos).result()
+            if instantanea is not None:
+                metricas.METRICAS.fusionar(instantanea)
+            logger.info(f"[{nombre}] {resumen.emparejados}/{resumen.soportes} soportes emparejados, "
+                        f"{resumen.pdfs} PDFs generados")
+            with self._candado_global:
+                self.completados.append(trabajo)
+            return True
+        except Exception as e:
+            logger.exception(f"[{nombre}] El trabajo falló: {e}")
+            with self._candado_global:
+                self.fallidos.append(trabajo)
+            return False
+
+    def cerrar(self) -> None:
+        """Espera a que terminen los trabajos encolados y detiene los hilos."""
+        for _ in self._hilos:
+            self._cola.put(None)
+        for hilo in self._hilos:
+            hilo.join()
+        if self._procesos is not None:
+            self._procesos.shutdown(wait=True)
+
+
+def comando_run(args: argparse.Namespace) -> int:
+    trabajos = leer_manifiesto(args.manifiesto)
+    logger.info(f"Manifiesto con {len(trabajos)} trabajos")
+    cola = ColaTrabajos(hilos=args.trabajos, workers=args.workers, margen=args.margen,
+                        asignacion=args.asignacion)
+    for trabajo in trabajos:
+        cola.encolar(trabajo)
+    cola.cerrar()
+    logger.info(f"Completados: {len(cola.completados)}, fallidos: {len(cola.fallidos)}")
+    for trabajo in cola.fallidos:
+        logger.error(f"Falló: {trabajo.pdf}")
+    return 1 if cola.fallidos else 0
+
+
+def _mover(ruta: str, carpeta: str) -> None:
+    os.makedirs(carpeta, exist_ok=True)
+    destino = os.path.join(carpeta, os.path.basename(ruta))
+    if os.path.exists(destino):
+        raiz, ext = os.path.splitext(destino)
+        destino = f"{raiz}_{time.strftime('%Y%m%d%H%M%S')}{ext}"
+    shutil.move(ruta, destino)
+
+
+def comando_watch(args: argparse.Namespace) -> int:
+    """
+    Vigila una carpeta y procesa cada PDF nuevo cuando su tamaño deja de
+    cambiar entre dos sondeos. Los PDFs procesados se mueven a 'procesados/'
+    y los fallidos a 'errores/' dentro de la carpeta vigilada.
+    """
+    carpeta = os.path.abspath(args.carpeta)
+    procesados = os.path.join(carpeta, 'procesados')
+    errores = os.path.join(carpeta, 'errores')
+    cola = ColaTrabajos(hilos=args.trabajos, workers=args.workers, margen=args.margen,
+                        asignacion=args.asignacion)
+    vistos: Dict[str, tuple] = {}
+    en_curso = set()
+    candado = threading.Lock()
+
+    def al_terminar(trabajo: Trabajo, ok: bool) -> None:
+        try:
+            _mover(trabajo.pdf, procesados if ok else errores)
+        except OSError as e:
+            logger.error(f"No se pudo mover '{trabajo.pdf}': {e}")
+        with candado:
+            en_curso.discard(trabajo.pdf)
+
+    logger.info(f"Vigilando '{carpeta}' cada {args.intervalo}s (Ctrl+C para salir)")
+    try:
+        while True:
+            actuales = {}
+            for nombre in sorted(os.listdir(carpeta)):
+                ruta = os.path.join(carpeta, nombre)
+                if not nombre.lower().endswith(EXTENSION_PDF) or not os.path.isfile(ruta):
+                    continue
+                with candado:
+                    if ruta in en_curso:
+                        continue
+                stat = os.stat(ruta)
+                actuales[ruta] = (stat.st_size, stat.st_mtime_ns)
+                # Solo se procesa cuando el archivo terminó de copiarse
+                if vistos.get(ruta) == actuales[ruta]:
+                    salida = os.path.join(args.salida, os.path.splitext(nombre)[0])
+                    with candado:
+                        en_curso.add(ruta)
+                    logger.info(f"Nuevo PDF detectado: {nombre}")
+                    cola.encolar(Trabajo(ruta, args.excel, salida), al_terminar)
+            vistos = actuales
+            if args.una_vez and not actuales:
+                break
+            time.sleep(args.intervalo)
+    except KeyboardInterrupt:
+        logger.info("Vigilancia detenida; esperando trabajos en curso...")
+    cola.cerrar()
+    return 1 if cola.fallidos else 0
+
+
+def _carpeta_fragmento(base: str, primera: int, ultima: int) -> str:
+    return os.path.join(base, f"{PREFIJO_FRAGMENTO}{primera:05d}-{ultima:05d}")
+
+
+def _leer_rango(texto: str) -> Tuple[int, int]:
+    try:
+        primera, _, ultima = texto.partition('-')
+        return int(primera), int(ultima or primera)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Rango de páginas inválido: '{texto}' (p. ej. 1-500)")
+
+
+def comando_shard(args: argparse.Namespace) -> int:
+    """
+    Procesa un fragmento de páginas del PDF (--rango, o --fragmentos con
+    --numero). Con --fragmentos y sin --numero lanza todos los fragmentos
+    como procesos locales independientes.
+    """
+    from core.fragmentos import ejecutar_fragmento, rangos_paginas
+    from core.render_pdfium import contar_paginas
+
+    if args.rango:
+        primera, ultima = args.rango
+        ejecutar_fragmento(args.pdf, primera, ultima, _carpeta_fragmento(args.carpeta, primera, ultima),
+                           workers=args.workers, forzar=args.forzar)
+        return 0
+    if not args.fragmentos:
+        raise SystemExit("Indica --rango o --fragmentos")
+
+    rangos = rangos_paginas(contar_paginas(args.pdf), args.fragmentos)
+    if args.numero:
+        if not 1 <= args.numero <= len(rangos):
+            raise SystemExit(f"--numero debe estar entre 1 y {len(rangos)}")
+        primera, ultima = rangos[args.numero - 1]
+        ejecutar_fragmento(args.pdf, primera, ultima, _carpeta_fragmento(args.carpeta, primera, ultima),
+                           workers=args.workers, forzar=args.forzar)
+        return 0
+
+    # Todos los fragmentos a la vez, repartiendo los núcleos entre ellos
+    workers = args.workers or max(1, (os.cpu_count() or 1) // len(rangos))
+    procesos = []
+    for primera, ultima in rangos:
+        comando = [sys.executable, '-m', 'automatcher', 'shard', args.pdf, '--carpeta', args.carpeta,
+                   '--rango', f"{primera}-{ultima}", '--workers', str(workers)]
+        if args.forzar:
+            comando.append('--forzar')
+        logger.info(f"Lanzando fragmento {primera}-{ultima}")
+        procesos.append(((primera, ultima), subprocess.Popen(comando)))
+    fallidos = [rango for rango, proceso in procesos if proceso.wait() != 0]
+    for primera, ultima in fallidos:
+        logger.error(f"Falló el fragmento {primera}-{ultima}")
+    return 1 if fallidos else 0
+
+
+def _carpetas_fragmentos(rutas: List[str]) -> List[str]:
+    """Acepta carpetas de fragmentos o la carpeta base que los contiene."""
+    from core.fragmentos import NOMBRE_RESULTADO
+
+    carpetas = []
+    for ruta in rutas:
+        if os.path.isfile(os.path.join(ruta, NOMBRE_RESULTADO)):
+            carpetas.append(ruta)
+            continue
+        hijas = sorted(os.path.join(ruta, nombre) for nombre in os.listdir(ruta)
+                       if nombre.startswith(PREFIJO_FRAGMENTO))
+        carpetas.extend(hijas or [ruta])
+    return carpetas
+
+
+def comando_merge(args: argparse.Namespace) -> int:
+    from core.fragmentos import fusionar_fragmentos
+
+    resumen = fusionar_fragmentos(
+        _carpetas_fragmentos(args.fragmentos), args.excel, args.salida,
+        margen=args.margen, workers=args.workers, asignacion=args.asignacion
+    )
+    logger.info(f"{resumen.emparejados}/{resumen.soportes} soportes emparejados, "
+                f"{resumen.pdfs} PDFs generados")
+    return 0
+
+
+def construir_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m automatcher',
+        description='AutoMatcher sin interfaz gráfica: empareja soportes PDF con TBs de Excel'
+    )
+    parser.add_argument('--debug', action='store_true',
+                        help='Registra también cada página, soporte y TB (o AUTOMATCHER_DEBUG=1)')
+    parser.add_argument('--metricas', metavar='RUTA',
+                        help='Guarda al terminar un informe JSON con contadores y tiempos por etapa')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    def opciones_comunes(p: argparse.ArgumentParser) -> None:
+        p.add_argument('--trabajos', type=int, default=1,
+                       help='Trabajos simultáneos (los que comparten Excel se serializan)')
+        p.add_argument('--workers', type=int, default=None,
+                       help='Procesos de renderizado/OCR por trabajo (por defecto, uno por núcleo)')
+        p.add_argument('--margen', type=float, default=100.0,
+                       help='Margen en pesos para emparejar')
+        p.add_argument('--asignacion', choices=['secuencial', 'global'], default='secuencial',
+                       help="'global' espera a leer todos los soportes y minimiza la desviación total")
+
+    run = sub.add_parser('run', help='Procesa los trabajos de un manifiesto JSON o CSV')
+    run.add_argument('manifiesto', help="Archivo con entradas 'pdf', 'excel' y 'salida'")
+    opciones_comunes(run)
+    run.set_defaults(func=comando_run)
+
+    watch = sub.add_parser('watch', help='Procesa los PDFs que aparezcan en una carpeta')
+    watch.add_argument('carpeta', help='Carpeta a vigilar')
+    watch.add_argument('--excel', required=True, help='Excel de TBs para todos los PDFs')
+    watch.add_argument('--salida', required=True,
+                       help='Carpeta de salida; cada PDF usa una subcarpeta con su nombre')
+    watch.add_argument('--intervalo', type=float, default=10.0, help='Segundos entre sondeos')
+    watch.add_argument('--una-vez', action='store_true',
+                       help='Termina cuando la carpeta queda vacía (útil en cron)')
+    opciones_comunes(watch)
+    watch.set_defaults(func=comando_watch)
+
+    shard = sub.add_parser('shard', help='Extrae y pasa OCR a un rango de páginas, sin tocar el Excel')
+    shard.add_argument('pdf', help='PDF de soportes completo')
+    shard.add_argument('--carpeta', required=True,
+                       help='Carpeta base; cada fragmento usa una subcarpeta con su rango')
+    shard.add_argument('--rango', type=_leer_rango, help='Páginas del fragmento, p. ej. 1-500')
+    shard.add_argument('--fragmentos', type=int, help='Divide el PDF en N fragmentos iguales')
+    shard.add_argument('--numero', type=int,
+                       help='Fragmento a procesar (desde 1); sin él se lanzan todos como procesos locales')
+    shard.add_argument('--workers', type=int, default=None,
+                       help='Procesos de renderizado/OCR por fragmento')
+    shard.add_argument('--forzar', action='store_true', help='Repite fragmentos ya terminados')
+    shard.set_defaults(func=comando_shard)
+
+    merge = sub.add_parser('merge', help='Asigna TBs a los soportes de todos los fragmentos y genera los PDFs')
+    merge.add_argument('fragmentos', nargs='+', help='Carpetas de fragmentos o su carpeta base')
+    merge.add_argument('--excel', required=True, help='Excel de TBs')
+    merge.add_argument('--salida', required=True, help='Carpeta de salida de PDFs')
+    merge.add_argument('--workers', type=int, default=None, help='Procesos de generación de PDFs')
+    merge.add_argument('--margen', type=float, default=100.0, help='Margen en pesos para emparejar')
+    merge.add_argument('--asignacion', choices=['secuencial', 'global'], default='secuencial',
+                       help="'global' minimiza la desviación total")
+    merge.set_defaults(func=comando_merge)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = construir_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.debug:
+        activar_debug()
+    try:
+        return args.func(args)
+    finally:
+        if args.metricas:
+            metricas.guardar_reporte(args.metricas)
+            logger.info(f"Informe de métricas guardado en '{args.metricas}'")
@@ -0,0 +1,58 @@
+"""
+Compara la asignación secuencial (primera TB libre) con la asignación
+global de mínima desviación sobre un libro sintético: tiempo, soportes
+emparejados y desviación total.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_asignacion --filas 100000 --soportes 10000
+    python -m benchmarks.bench_asignacion --repetidos 3000   # montos iguales
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from benchmarks.bench_indice_tbs import generar_libro
+from core.matcher import Emparejador
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark de asignación secuencial vs. global')
+    parser.add_argument('--filas', type=int, default=100_000)
+    parser.add_argument('--soportes', type=int, default=10_000)
+    parser.add_argument('--margen', type=float, default=100.0)
+    parser.add_argument('--repetidos', type=int, default=0,
+                        help='Soportes (y 5 veces más TBs) con el mismo monto')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = np.random.default_rng(3)
+    base = generar_libro(args.filas)
+    elegidas = rng.choice(args.filas, args.soportes, replace=False)
+    valores = np.round(base['Valor'].to_numpy()[elegidas] + rng.uniform(-50, 50, args.soportes), 2)
+    if args.repetidos:
+        base.loc[:args.repetidos * 5 - 1, 'Valor'] = 1_000_000.0
+        valores[:args.repetidos] = 1_000_000.0
+    items = [(f"soporte_{i}", 'ABONADO', float(v)) for i, v in enumerate(valores)]
+
+    for modo in ('secuencial', 'global'):
+        df = base.copy()
+        inicio = time.perf_counter()
+        emparejador = Emparejador(df, args.margen)
+        if modo == 'global':
+            resultados = emparejador.emparejar_lote(items)
+        else:
+            resultados = [emparejador.emparejar(*item) for item in items]
+        segundos = time.perf_counter() - inicio
+        pares = [(r['valor_soporte'], r['tb_info']['Valor']) for r in resultados if r['tb_info'] is not None]
+        desviacion = sum(abs(s - t) for s, t in pares)
+        linea = (f"{modo:<11} {segundos:7.2f}s  emparejados {len(pares)}/{len(items)}  "
+                 f"desviación total {desviacion:,.2f}")
+        if modo == 'global':
+            linea += f"  empates {len(emparejador.asignacion.empates)}"
+        print(linea)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Control de regresión del tiempo de importación por punto de entrada.
+
+Cada módulo se importa en un intérprete nuevo (el mejor de varios intentos)
+y se comprueba que no supere su presupuesto en milisegundos ni cargue
+dependencias pesadas que deberían importarse al usarse. Termina con código
+1 si algún punto de entrada no cumple, para poder usarlo en CI.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_importacion
+    python -m benchmarks.bench_importacion --escala 2   # máquinas lentas
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# La sonda importa los módulos del repositorio desde su raíz
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PESADOS = ['pandas', 'pytesseract', 'reportlab', 'pdfplumber', 'openpyxl', 'tkinter', 'customtkinter']
+
+# módulo -> (presupuesto en ms, módulos que no debe importar)
+PRESUPUESTOS: Dict[str, Tuple[float, List[str]]] = {
+    'automatcher.cli': (100, PESADOS + ['core.pipeline']),
+    'gui.main_window': (400, ['pandas', 'pytesseract', 'reportlab', 'pdfplumber', 'openpyxl', 'core.pipeline']),
+    'core.matcher': (120, PESADOS),
+    'core.extractor': (200, PESADOS),
+    'core.ocr_processor': (150, PESADOS),
+    'core.pdf_generator': (120, PESADOS),
+}
+
+_SONDA = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+ms = (time.perf_counter() - inicio) * 1000
+print(json.dumps({{'ms': ms, 'cargados': [m for m in {pesados!r} if m in sys.modules]}}))
+"""
+
+
+def medir(modulo: str, vigilados: List[str], intentos: int) -> Tuple[float, List[str]]:
+    mejor = float('inf')
+    cargados: List[str] = []
+    for _ in range(intentos):
+        salida = subprocess.run(
+            [sys.executable, '-c', _SONDA.format(modulo=modulo, pesados=vigilados)],
+            capture_output=True, text=True, check=True, cwd=_RAIZ
+        ).stdout.strip().splitlines()[-1]
+        datos = json.loads(salida)
+        mejor = min(mejor, datos['ms'])
+        cargados = datos['cargados']
+    return mejor, cargados
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Presupuesto de tiempo de importación')
+    parser.add_argument('--intentos', type=int, default=5)
+    parser.add_argument('--escala', type=float, default=1.0, help='Multiplica todos los presupuestos')
+    args = parser.parse_args()
+
+    fallos = 0
+    for modulo, (presupuesto, vigilados) in PRESUPUESTOS.items():
+        try:
+            ms, cargados = medir(modulo, vigilados, args.intentos)
+        except subprocess.CalledProcessError as e:
+            print(f"{modulo:<22} ERROR al importar:\n{e.stderr}")
+            fallos += 1
+            continue
+        limite = presupuesto * args.escala
+        ok = ms <= limite and not cargados
+        fallos += not ok
+        detalle = f"  importa {', '.join(cargados)}" if cargados else ''
+        print(f"{modulo:<22} {ms:7.1f} ms / {limite:5.0f} ms  {'OK' if ok else 'FALLA'}{detalle}")
+    sys.exit(1 if fallos else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Compara la búsqueda de TB libre por máscara booleana (excel_reader) con el
+índice ordenado (core.indice_tbs) sobre un libro sintético.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_indice_tbs --filas 200000 --soportes 4000
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.excel_reader import obtener_transaccion_libre, marcar_usado
+from core.indice_tbs import IndiceTBs
+
+
+def generar_libro(filas: int, semilla: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({
+        'No Egreso': np.arange(filas),
+        'Girado a': 'Proveedor',
+        'Valor': np.round(rng.uniform(10_000, 5_000_000, filas), 2),
+        'usado': False,
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark de búsqueda de TB libre')
+    parser.add_argument('--filas', type=int, default=200_000)
+    parser.add_argument('--soportes', type=int, default=4_000)
+    parser.add_argument('--margen', type=float, default=100.0)
+    args = parser.parse_args()
+
+    # Los mensajes por soporte distorsionan la medición
+    logging.getLogger('core.excel_reader').setLevel(logging.ERROR)
+    logging.getLogger('core.indice_tbs').setLevel(logging.ERROR)
+
+    df = generar_libro(args.filas)
+    rng = np.random.default_rng(11)
+    consultas = df['Valor'].sample(args.soportes, random_state=3).to_numpy() \
+        + rng.uniform(-50, 50, args.soportes)
+
+    df_mascara = df.copy()
+    inicio = time.perf_counter()
+    asignados_mascara = []
+    for valor in consultas:
+        idx, tb = obtener_transaccion_libre(df_mascara, valor, args.margen)
+        if tb is not None:
+            marcar_usado(df_mascara, idx)
+        asignados_mascara.append(idx)
+    t_mascara = time.perf_counter() - inicio
+
+    df_indice = df.copy()
+    inicio = time.perf_counter()
+    indice = IndiceTBs(df_indice)
+    t_construccion = time.perf_counter() - inicio
+    asignados_indice = []
+    for valor in consultas:
+        idx, tb = indice.obtener_transaccion_libre(valor, args.margen)
+        if tb is not None:
+            indice.marcar_usado(idx)
+        asignados_indice.append(idx)
+    indice.sincronizar()
+    t_indice = time.perf_counter() - inicio
+
+    iguales = asignados_mascara == asignados_indice and \
+        df_mascara['usado'].astype(bool).equals(df_indice['usado'])
+    print(f"Filas: {args.filas}, soportes: {args.soportes}")
+    print(f"Máscara booleana: {t_mascara:.3f}s ({t_mascara / args.soportes * 1e6:.1f} µs/soporte)")
+    print(f"Índice ordenado:  {t_indice:.3f}s (construcción {t_construccion:.3f}s, "
+          f"{(t_indice - t_construccion) / args.soportes * 1e6:.1f} µs/soporte)")
+    print(f"Aceleración: x{t_mascara / t_indice:.1f}")
+    print(f"Mismas asignaciones: {'sí' if iguales else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
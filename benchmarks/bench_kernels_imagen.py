@@ -0,0 +1,80 @@
+"""
+Microbenchmark de los núcleos de imagen: compara las versiones píxel a píxel
+originales de la detección de soportes vacíos y del preprocesado con las
+versiones vectorizadas, y comprueba que el resultado sea idéntico.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_kernels_imagen --repeticiones 20
+"""
+import argparse
+import time
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+from core.extractor import soporte_tiene_contenido
+from core.ocr_processor import preprocesar_imagen
+
+
+def tiene_contenido_original(soporte_imagen: Image.Image, umbral_blanco: float = 0.98) -> bool:
+    soporte_gris = soporte_imagen.convert("L")
+    pixeles_totales = soporte_gris.width * soporte_gris.height
+    pixeles_no_blancos = sum(1 for pixel in soporte_gris.getdata() if pixel < 240)
+    return pixeles_no_blancos / pixeles_totales > (1 - umbral_blanco)
+
+
+def preprocesar_original(img: Image.Image) -> Image.Image:
+    img = img.convert("L")
+    img = img.filter(ImageFilter.MedianFilter())
+    img = ImageEnhance.Contrast(img).enhance(2)
+    return img.point(lambda x: 0 if x < 128 else 255, '1')
+
+
+def soporte_sintetico(ancho: int, alto: int, semilla: int) -> Image.Image:
+    rng = np.random.default_rng(semilla)
+    pixeles = np.full((alto, ancho, 3), 250, dtype=np.uint8)
+    # Bloques de "texto" oscuros con ruido de escaneo
+    for _ in range(40):
+        x, y = rng.integers(0, ancho - 60), rng.integers(0, alto - 12)
+        pixeles[y:y + 10, x:x + 60] = rng.integers(0, 90, (10, 60, 3), dtype=np.uint8)
+    ruido = rng.integers(-12, 12, pixeles.shape)
+    return Image.fromarray(np.clip(pixeles + ruido, 0, 255).astype(np.uint8), 'RGB')
+
+
+def cronometrar(func, imagenes, repeticiones: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for img in imagenes:
+            func(img)
+    return (time.perf_counter() - inicio) / (repeticiones * len(imagenes))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Microbenchmark de núcleos de imagen')
+    parser.add_argument('--ancho', type=int, default=612)
+    parser.add_argument('--alto', type=int, default=264)
+    parser.add_argument('--imagenes', type=int, default=10)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    imagenes = [soporte_sintetico(args.ancho, args.alto, i) for i in range(args.imagenes)]
+
+    identicos = all(
+        tiene_contenido_original(img) == soporte_tiene_contenido(img)
+        and preprocesar_original(img).tobytes() == preprocesar_imagen(img).tobytes()
+        for img in imagenes
+    )
+
+    for nombre, original, nueva in (
+        ('soporte_tiene_contenido', tiene_contenido_original, soporte_tiene_contenido),
+        ('preprocesar_imagen', preprocesar_original, preprocesar_imagen),
+    ):
+        t_original = cronometrar(original, imagenes, args.repeticiones)
+        t_nueva = cronometrar(nueva, imagenes, args.repeticiones)
+        print(f"{nombre}: original {t_original * 1e3:.2f} ms, "
+              f"vectorizada {t_nueva * 1e3:.2f} ms (x{t_original / t_nueva:.1f})")
+    print(f"Resultados idénticos: {'sí' if identicos else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Mide el rendimiento de la generación de PDFs de salida: en serie, con el
+pool de procesos por lotes y en modo consolidado (un único PDF).
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_pdf --emparejados 5000 --workers 8
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from core.pdf_generator import generar_pdfs
+from core.soporte import Soporte
+
+
+def resultados_sinteticos(cantidad: int, ancho: int, alto: int):
+    rng = np.random.default_rng(5)
+    # Un conjunto pequeño de imágenes distintas evita agotar la memoria con miles de recortes
+    imagenes = []
+    for _ in range(32):
+        pixeles = np.full((alto, ancho), 245, dtype=np.uint8)
+        pixeles[rng.integers(0, alto, 400), rng.integers(0, ancho, 400)] = 0
+        imagenes.append(Image.fromarray(pixeles).convert('RGB'))
+    resultados = []
+    for i in range(cantidad):
+        soporte = Soporte(imagenes[i % len(imagenes)], i // 3 + 1, i % 3 + 1, (0, 0, 612, 264))
+        resultados.append({
+            'soporte': soporte,
+            'estado': 'ABONADO',
+            'valor_soporte': 1000.0 + i,
+            'tb_idx': i,
+            'tb_info': {'No Egreso': str(100000 + i), 'Girado a': f'Proveedor {i % 97}'},
+        })
+    return resultados
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark de generación de PDFs')
+    parser.add_argument('--emparejados', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--ancho', type=int, default=850)
+    parser.add_argument('--alto', type=int, default=367)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    resultados = resultados_sinteticos(args.emparejados, args.ancho, args.alto)
+    configuraciones = (
+        ('serie', dict(workers=1)),
+        ('pool por lotes', dict(workers=args.workers)),
+        ('consolidado', dict(consolidado=True)),
+    )
+    for nombre, opciones in configuraciones:
+        with tempfile.TemporaryDirectory() as salida:
+            inicio = time.perf_counter()
+            generar_pdfs(resultados, salida, **opciones)
+            segundos = time.perf_counter() - inicio
+        print(f"{nombre}: {args.emparejados} emparejados en {segundos:.2f}s "
+              f"({args.emparejados / segundos:.0f} PDFs/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Compara el renderizado de soportes con pdfplumber (página completa a 72 dpi)
+y con pypdfium2 (solo las regiones, a la resolución de OCR, en paralelo):
+páginas por segundo y, si tesseract está disponible, precisión del valor OCR.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_render --paginas 50 --workers 4 --ocr
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.sinteticos import generar_pdf_soportes
+from core.extractor import iterar_soportes
+from core.render_pdfium import DPI_OCR
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark de renderizado de soportes')
+    parser.add_argument('--pdf', help='PDF propio; por defecto se genera uno sintético')
+    parser.add_argument('--paginas', type=int, default=30)
+    parser.add_argument('--dpi', type=int, default=DPI_OCR)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--ocr', action='store_true',
+                        help='Mide también la precisión del valor OCR (requiere tesseract)')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        esperados = {}
+        pdf_path = args.pdf
+        if pdf_path is None:
+            pdf_path = os.path.join(tmp, 'soportes.pdf')
+            esperados = generar_pdf_soportes(pdf_path, args.paginas)
+
+        configuraciones = (
+            ('pdfplumber 72 dpi', dict(motor='pdfplumber')),
+            ('pdfium 72 dpi', dict(motor='pdfium', dpi=72, workers=args.workers)),
+            (f'pdfium {args.dpi} dpi', dict(motor='pdfium', dpi=args.dpi, workers=args.workers)),
+            (f'pdfium {args.dpi} dpi, coordenadas fijas',
+             dict(motor='pdfium', dpi=args.dpi, workers=args.workers, detectar=False)),
+        )
+        for nombre, opciones in configuraciones:
+            inicio = time.perf_counter()
+            soportes = list(iterar_soportes(pdf_path, **opciones))
+            segundos = time.perf_counter() - inicio
+            paginas = len({s.pagina for s in soportes}) or 1
+            linea = (f"{nombre}: {len(soportes)} soportes de {paginas} páginas en {segundos:.2f}s "
+                     f"({paginas / segundos:.1f} páginas/s), "
+                     f"{sum(s.imagen.width * s.imagen.height for s in soportes) / 1e6:.1f} Mpx para OCR")
+            if args.ocr and esperados:
+                from core.ocr_processor import procesar_soporte
+                aciertos = sum(
+                    1 for s in soportes
+                    if procesar_soporte(s, usar_cache=False)[1] == esperados.get(s.nombre)
+                )
+                linea += f", precisión de valor {aciertos}/{len(soportes)}"
+            print(linea)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Compara la latencia por recorte de tesseract con un proceso por llamada
+(pytesseract) y con el tesseract persistente de `core.tesseract_persistente`,
+sobre los recortes que usa la cascada: el soporte reducido y la línea del
+estado (nivel 'estado'), la línea del valor (nivel 'valor') y el soporte
+completo, y la cascada entera por soporte con `procesar_soporte`.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_tesseract --paginas 10
+    python -m benchmarks.bench_tesseract --tesseract "C:/Program Files/Tesseract-OCR/tesseract.exe"
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.sinteticos import generar_pdf_soportes
+from core.extractor import iterar_soportes
+
+MODOS = ('proceso', 'persistente')
+
+
+def _recortes(soportes) -> List[Tuple[str, Image.Image, str]]:
+    """(tipo, imagen preprocesada, config) de cada recorte de la cascada."""
+    from core import ocr_processor as op
+
+    recortes = []
+    for soporte in soportes:
+        reducida = op.preprocesar_imagen(soporte.imagen.reduce(op.REDUCCION_ESTADO))
+        completa = op.preprocesar_imagen(soporte.imagen)
+        recortes.append(('estado', reducida, op.CONFIG_TESSERACT))
+        recortes.append(('completo', completa, op.CONFIG_TESSERACT))
+        # Líneas del estado y del valor según el nivel 'estado'
+        ocr = op.ejecutar_ocr(reducida)
+        for tipo, linea, config in (('linea estado', op._linea_estado(ocr), op.CONFIG_ESTADO),
+                                    ('valor', op._linea_valor(ocr), op.CONFIG_VALOR)):
+            recorte = op._recortar_linea(ocr, linea, completa)
+            if recorte is not None:
+                recortes.append((tipo, recorte, config))
+    return recortes
+
+
+def _medir(funcion: Callable[[], object], repeticiones: int) -> List[float]:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def _fila(nombre: str, tiempos: Dict[str, List[float]]) -> None:
+    partes = []
+    for modo in MODOS:
+        ms = np.asarray(tiempos[modo])
+        partes.append(f"{modo} p50 {np.percentile(ms, 50):7.1f} ms  p95 {np.percentile(ms, 95):7.1f} ms")
+    mejora = np.median(tiempos['proceso']) / np.median(tiempos['persistente'])
+    print(f"{nombre:<18} {len(tiempos['proceso']):>4}  " + "  |  ".join(partes) + f"  x{mejora:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Latencia de tesseract por recorte')
+    parser.add_argument('--paginas', type=int, default=5)
+    parser.add_argument('--repeticiones', type=int, default=1,
+                        help='Veces que se lee cada recorte en cada modo')
+    parser.add_argument('--tesseract', help='Ruta al ejecutable de tesseract')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    import pytesseract
+    from core import ocr_processor as op
+    from core import tesseract_persistente
+
+    if args.tesseract:
+        pytesseract.pytesseract.tesseract_cmd = args.tesseract
+    try:
+        print(f"tesseract {pytesseract.get_tesseract_version()}")
+    except Exception:
+        print("tesseract no disponible: no hay nada que medir")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, 'soportes.pdf')
+        generar_pdf_soportes(pdf_path, args.paginas)
+        soportes = list(iterar_soportes(pdf_path))
+    os.environ['AUTOMATCHER_TESSERACT'] = 'proceso'
+    recortes = _recortes(soportes)
+
+    tiempos: Dict[str, Dict[str, List[float]]] = {}
+    for modo in MODOS:
+        os.environ['AUTOMATCHER_TESSERACT'] = modo
+        if modo == 'persistente':
+            # El arranque (carga del modelo) se paga una vez por proceso y configuración
+            inicio = time.perf_counter()
+            for config in {c for _, _, c in recortes}:
+                op.ejecutar_ocr(Image.new('L', (64, 64), 255), config)
+            print(f"arranque persistente {(time.perf_counter() - inicio) * 1000:.0f} ms")
+            if tesseract_persistente.image_to_data(recortes[0][1], op.IDIOMA_OCR) is None:
+                print("el tesseract instalado no admite el modo persistente")
+                return
+        for tipo, img, config in recortes:
+            tiempos.setdefault(tipo, {m: [] for m in MODOS})[modo] += _medir(
+                lambda: op.ejecutar_ocr(img, config), args.repeticiones)
+        tiempos.setdefault('procesar_soporte', {m: [] for m in MODOS})[modo] += [
+            t for s in soportes
+            for t in _medir(lambda: op.procesar_soporte(s, usar_cache=False), args.repeticiones)
+        ]
+    tesseract_persistente.cerrar_trabajadores()
+
+    print(f"{'recorte':<18} {'n':>4}")
+    for nombre, por_modo in tiempos.items():
+        _fila(nombre, por_modo)
+
+
+if __name__ == '__main__':
+    main()
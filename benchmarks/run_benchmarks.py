@@ -0,0 +1,213 @@
+"""
+Suite de benchmarks por etapa sobre datos sintéticos.
+
+Genera un PDF de soportes con valores ABONADO conocidos y un Excel de TBs
+del tamaño indicado, cronometra por separado cada etapa del flujo y guarda
+los resultados en JSON para comparar entre commits.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.run_benchmarks --paginas 50 --filas 100000 --salida resultados.json
+    python -m benchmarks.run_benchmarks --comparar resultados_anteriores.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from benchmarks.sinteticos import generar_excel_tbs, generar_pdf_soportes, formatear_valor
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return 'desconocido'
+
+
+def _tesseract_disponible() -> bool:
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+class Cronometro:
+    def __init__(self) -> None:
+        self.etapas: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def etapa(self, nombre: str, items: int = 0) -> Iterator[Dict[str, Any]]:
+        registro: Dict[str, Any] = {'items': items}
+        inicio = time.perf_counter()
+        yield registro
+        segundos = time.perf_counter() - inicio
+        registro['segundos'] = round(segundos, 4)
+        if registro['items']:
+            registro['items_por_segundo'] = round(registro['items'] / segundos, 2) if segundos else None
+        self.etapas[nombre] = registro
+        print(f"{nombre:<32} {segundos:9.3f}s  {registro['items']:>8} items")
+
+
+def _ocr_stub(texto_por_soporte: Dict[str, str]):
+    """OCR simulado: devuelve el texto que tesseract leería de cada soporte."""
+    from core.ocr_processor import ResultadoOCR
+
+    def ejecutar(img, config=''):
+        return ResultadoOCR(texto=texto_por_soporte['actual'])
+    return ejecutar
+
+
+def ejecutar_suite(args: argparse.Namespace, tmp: str) -> Dict[str, Any]:
+    import core.matcher as matcher
+    import core.ocr_processor as ocr_processor
+    from core.duplicados import marcar_duplicados
+    from core.excel_reader import guardar_excel, leer_excel
+    from core.extractor import extract_soportes, iterar_soportes
+    from core.pdf_generator import generar_pdfs
+
+    cron = Cronometro()
+    pdf_path = os.path.join(tmp, 'soportes.pdf')
+    excel_path = os.path.join(tmp, 'tbs.xlsx')
+
+    with cron.etapa('sinteticos (pdf + excel)') as r:
+        esperados = generar_pdf_soportes(pdf_path, args.paginas)
+        r['items'] = generar_excel_tbs(excel_path, esperados, args.filas)
+
+    with cron.etapa('extract_soportes', args.paginas) as r:
+        rutas = extract_soportes(pdf_path, os.path.join(tmp, 'png'))
+        r['soportes'] = len(rutas)
+
+    soportes = list(iterar_soportes(pdf_path, workers=args.workers))
+    muestra = soportes[:args.muestra_ocr]
+
+    # Firmas perceptuales e índice de duplicados; se desmarcan para que el
+    # emparejamiento posterior vea todos los soportes
+    with cron.etapa('marcar_duplicados', len(soportes)) as r:
+        r['duplicados'] = sum(1 for s in marcar_duplicados(soportes) if s.duplicado_de is not None)
+    for soporte in soportes:
+        soporte.duplicado_de = None
+
+    # OCR simulado: mide preprocesado y análisis del texto sin tesseract
+    texto = {'actual': ''}
+    original = ocr_processor.ejecutar_ocr
+    ocr_processor.ejecutar_ocr = _ocr_stub(texto)
+    try:
+        with cron.etapa('procesar_soporte (OCR stub)', len(muestra)):
+            for soporte in muestra:
+                texto['actual'] = f"Estado: ABONADO\nValor: $ {formatear_valor(esperados[soporte.nombre])}"
+                ocr_processor.procesar_soporte(soporte, usar_cache=False)
+    finally:
+        ocr_processor.ejecutar_ocr = original
+
+    if _tesseract_disponible():
+        # Por defecto un proceso por llamada; el persistente se activa con AUTOMATCHER_TESSERACT
+        for nombre, modo in (('procesar_soporte (tesseract)', 'proceso'),
+                             ('procesar_soporte (tesseract persistente)', 'persistente')):
+            os.environ['AUTOMATCHER_TESSERACT'] = modo
+            with cron.etapa(nombre, len(muestra)) as r:
+                aciertos = sum(1 for s in muestra
+                               if ocr_processor.procesar_soporte(s, usar_cache=False)[1] == esperados[s.nombre])
+            r['precision_valor'] = round(aciertos / len(muestra), 4) if muestra else None
+        os.environ.pop('AUTOMATCHER_TESSERACT')
+    else:
+        print("procesar_soporte (tesseract)     omitido: tesseract no disponible")
+
+    with cron.etapa('leer_excel', args.filas) as r:
+        df = leer_excel(excel_path)
+        r['items'] = len(df)
+
+    # Caché columnar del Excel: primera lectura (la crea) y siguiente (mmap)
+    os.environ['AUTOMATCHER_CACHE'] = '1'
+    os.environ['AUTOMATCHER_CACHE_DIR'] = os.path.join(tmp, 'cache')
+    try:
+        with cron.etapa('leer_excel (crea caché)', args.filas) as r:
+            r['items'] = len(leer_excel(excel_path))
+        with cron.etapa('leer_excel (caché)', args.filas) as r:
+            r['items'] = len(leer_excel(excel_path))
+    finally:
+        os.environ['AUTOMATCHER_CACHE'] = '0'
+
+    # Emparejamiento con OCR conocido: aísla el coste del motor de emparejamiento
+    original = ocr_processor.procesar_soporte
+    ocr_processor.procesar_soporte = lambda s, usar_cache=True: ('ABONADO', esperados[s.nombre])
+    try:
+        with cron.etapa('matchear_soportes (OCR stub)', len(soportes)) as r:
+            resultados = matcher.matchear_soportes(soportes, df, paralelo=False)
+            r['emparejados'] = sum(1 for res in resultados if res['tb_info'] is not None)
+    finally:
+        ocr_processor.procesar_soporte = original
+
+    with cron.etapa('guardar_excel', len(df)):
+        guardar_excel(df, excel_path)
+
+    with cron.etapa('generar_pdfs', len(resultados)) as r:
+        r['pdfs'] = len(generar_pdfs(resultados, os.path.join(tmp, 'salida'), workers=args.workers))
+
+    return cron.etapas
+
+
+def comparar(actual: Dict[str, Any], anterior: Dict[str, Any]) -> None:
+    print(f"\nComparación con {anterior.get('commit')} ({anterior.get('fecha')}):")
+    for nombre, etapa in actual['etapas'].items():
+        previa = anterior.get('etapas', {}).get(nombre)
+        if not previa or not previa.get('segundos'):
+            continue
+        cambio = (etapa['segundos'] - previa['segundos']) / previa['segundos'] * 100
+        print(f"{nombre:<32} {previa['segundos']:9.3f}s -> {etapa['segundos']:9.3f}s  ({cambio:+.1f}%)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmarks por etapa de AutoMatcher')
+    parser.add_argument('--paginas', type=int, default=20)
+    parser.add_argument('--filas', type=int, default=50_000, help='TBs adicionales en el Excel')
+    parser.add_argument('--muestra-ocr', type=int, default=30,
+                        help='Soportes usados para cronometrar procesar_soporte')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--salida', default='benchmarks_resultados.json')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior')
+    parser.add_argument('--conservar', help='Carpeta donde conservar los datos sintéticos')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    os.environ['AUTOMATCHER_CACHE'] = '0'
+    tmp = tempfile.mkdtemp(prefix='automatcher_bench_')
+    try:
+        etapas = ejecutar_suite(args, tmp)
+        if args.conservar:
+            shutil.copytree(tmp, args.conservar, dirs_exist_ok=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    from utils import metricas
+
+    resultado = {
+        'commit': _commit(),
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'parametros': {'paginas': args.paginas, 'filas': args.filas,
+                       'muestra_ocr': args.muestra_ocr, 'workers': args.workers},
+        'etapas': etapas,
+        'metricas': metricas.reporte(),
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Generadores de datos sintéticos para los benchmarks: PDFs de soportes con
+valores ABONADO conocidos dibujados en las regiones que espera el extractor.
+"""
+import random
+from typing import Dict
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from core.extractor import COORDENADAS_DEFECTO
+
+
+def formatear_valor(valor: float) -> str:
+    """Formato colombiano: 1.234.567,89"""
+    entero, decimales = f"{valor:.2f}".split(".")
+    return f"{int(entero):,}".replace(",", ".") + "," + decimales
+
+
+def generar_pdf_soportes(ruta: str, paginas: int, semilla: int = 1) -> Dict[str, float]:
+    """
+    Genera un PDF Carta con un soporte por región de COORDENADAS_DEFECTO.
+
+    Returns:
+        Dict nombre de soporte (soporte_p{página}_{región}) -> valor dibujado.
+    """
+    rng = random.Random(semilla)
+    ancho, alto = letter
+    c = canvas.Canvas(ruta, pagesize=letter)
+    esperados: Dict[str, float] = {}
+    for pagina in range(1, paginas + 1):
+        for region, (x1, y1, x2, y2) in enumerate(COORDENADAS_DEFECTO, start=1):
+            valor = round(rng.uniform(10_000, 5_000_000), 2)
+            esperados[f"soporte_p{pagina}_{region}"] = valor
+            # Las coordenadas tienen el origen arriba; ReportLab abajo
+            base = alto - y2
+            c.setLineWidth(3)
+            c.rect(x1 + 20, base + 15, (x2 - x1) - 40, (y2 - y1) - 30)
+            c.setFont("Helvetica-Bold", 18)
+            c.drawString(x1 + 50, alto - y1 - 60, "BANCO DE PRUEBA S.A.")
+            c.setFont("Helvetica", 14)
+            c.drawString(x1 + 50, alto - y1 - 95, "Estado: ABONADO")
+            c.drawString(x1 + 50, alto - y1 - 125, f"Referencia: {rng.randint(10**7, 10**8 - 1)}")
+            c.drawString(x1 + 50, alto - y1 - 155, f"Valor: $ {formatear_valor(valor)}")
+        c.showPage()
+    c.save()
+    return esperados
+
+
+def generar_excel_tbs(
+    ruta: str,
+    esperados: Dict[str, float],
+    filas_extra: int = 0,
+    semilla: int = 2
+) -> int:
+    """
+    Genera un Excel de TBs con una fila por soporte esperado (con una
+    diferencia menor que el margen de emparejamiento) más `filas_extra`
+    transacciones aleatorias, todas mezcladas.
+
+    Returns:
+        int: Número total de filas de datos.
+    """
+    from openpyxl import Workbook
+
+    rng = random.Random(semilla)
+    valores = [round(v + rng.uniform(-50, 50), 2) for v in esperados.values()]
+    valores += [round(rng.uniform(10_000, 5_000_000), 2) for _ in range(filas_extra)]
+    rng.shuffle(valores)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('TBs')
+    ws.append(['No Egreso', 'Girado a', 'Valor'])
+    for i, valor in enumerate(valores, start=1):
+        ws.append([100000 + i, f"Proveedor {i % 997}", valor])
+    wb.save(ruta)
+    return len(valores)
@@ -0,0 +1,165 @@
+"""
+Asignación global de soportes a TBs por valor.
+
+En lugar de dar a cada soporte la primera TB libre del margen en el orden
+en que llegan, se resuelven todos a la vez: se maximiza el número de
+soportes emparejados y, entre las soluciones con ese máximo, se minimiza la
+suma de |valor soporte - valor TB|.
+
+Con ambos lados ordenados por valor existe siempre una solución óptima sin
+cruces (si s1 <= s2 entonces t1 <= t2), así que basta una programación
+dinámica de alineamiento: F_k(j) es el mejor peso con los k primeros
+soportes y las j primeras TBs. Cada fila solo cambia en la ventana de TBs
+del margen del soporte, que se calcula con operaciones vectorizadas; a la
+derecha de la ventana la fila vale una constante, que se aplica de forma
+perezosa. El costo es proporcional al número de pares candidatos con una
+constante pequeña, también en grupos densos de importes redondos donde
+cada soporte alcanza miles de TBs. Para reconstruir la solución se guardan
+dos bits por par candidato. Los importes se manejan en centavos enteros.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class ResultadoAsignacion:
+    """Resultado de `asignar_global`."""
+    # índice del soporte en `valores` -> posición de la TB en el DataFrame
+    asignaciones: Dict[int, int] = field(default_factory=dict)
+    # Suma de las diferencias absolutas de valor de los pares, en pesos
+    costo: float = 0.0
+    # Soportes cuya TB podría cambiarse por otra sin variar el costo: otra TB
+    # igual de cercana, u otro soporte emparejado con el mismo valor
+    empates: List[int] = field(default_factory=list)
+
+
+@dataclass
+class _Fila:
+    """Lo necesario para reconstruir la solución desde la fila de un soporte."""
+    lo: int
+    hi: int
+    # F_k(j) == F_k(j - 1) y F_k(j) == F_{k-1}(j), para j en lo+1..hi,
+    # empaquetados con np.packbits. Si no se cumple ninguna, F_k(j) sale de
+    # emparejar k con la TB j - 1
+    igual_izquierda: np.ndarray
+    sin_soporte: np.ndarray
+
+
+def _a_centavos(valores: np.ndarray) -> np.ndarray:
+    return np.round(np.asarray(valores, dtype=np.float64) * 100).astype(np.int64)
+
+
+def asignar_global(
+    valores: Sequence[float],
+    valores_tb: np.ndarray,
+    libres: np.ndarray,
+    margen: float = 100.0
+) -> ResultadoAsignacion:
+    """
+    Calcula la asignación de máximo número de pares y mínima desviación total.
+
+    Args:
+        valores: Valor leído de cada soporte a emparejar.
+        valores_tb: Columna 'Valor' de las TBs, por posición en el DataFrame.
+        libres: Máscara de TBs disponibles (no usadas y con valor).
+        margen: Diferencia máxima en pesos entre soporte y TB.
+
+    Returns:
+        ResultadoAsignacion. Ante empates de costo ganan la TB de menor
+        valor (a igual valor, la de menor posición) y el primer soporte.
+    """
+    resultado = ResultadoAsignacion()
+    centavos_s = _a_centavos(valores)
+    posiciones_tb = np.flatnonzero(libres)
+    if len(centavos_s) == 0 or len(posiciones_tb) == 0:
+        return resultado
+
+    # Orden estable: a igual valor, primero la fila anterior del Excel
+    centavos_t = _a_centavos(np.asarray(valores_tb, dtype=np.float64)[posiciones_tb])
+    orden_t = np.argsort(centavos_t, kind='stable')
+    t = centavos_t[orden_t]
+    pos_t = posiciones_tb[orden_t]
+    orden_s = np.argsort(centavos_s, kind='stable')
+    s = centavos_s[orden_s]
+
+    m = int(round(margen * 100))
+    lo = np.searchsorted(t, s - m, side='left')
+    hi = np.searchsorted(t, s + m, side='right')
+
+    # Peso de un par: GRANDE - desviación. GRANDE supera cualquier suma de
+    # desviaciones, así que primero se maximiza el número de pares
+    grande = m * len(s) + 1
+    # F de la fila actual, válida (con `piso` aplicado) en 0..materializado-1;
+    # más a la derecha vale `piso`, la constante de la última ventana
+    f = np.zeros(len(t) + 1, dtype=np.int64)
+    materializado, piso = 0, 0
+    filas: List[Optional[_Fila]] = []
+    lo_l, hi_l, s_l = lo.tolist(), hi.tolist(), s.tolist()
+    for k in range(len(s_l)):
+        a, b = lo_l[k], hi_l[k]
+        if a == b:
+            filas.append(None)
+            continue
+        if b + 1 > materializado:
+            f[materializado:b + 1] = piso
+            materializado = b + 1
+        previa = f[a:b + 1]
+        # Emparejar k con la TB i (i en a..b-1) lleva de F_{k-1}(i) a F_k(i + 1)
+        con_par = previa[:-1] + (grande - np.abs(t[a:b] - s_l[k]))
+        nueva = np.maximum.accumulate(np.maximum(previa[1:], con_par))
+        filas.append(_Fila(
+            a, b,
+            np.packbits(nueva == np.concatenate((previa[:1], nueva[:-1]))),
+            np.packbits(nueva == previa[1:]),
+        ))
+        f[a + 1:b + 1] = nueva
+        piso = int(nueva[-1])
+
+    # Reconstrucción desde F_n(len(t)). Ante igualdad se prefiere no usar la
+    # TB j - 1 y después no usar el soporte k: los pares quedan en las TBs de
+    # menor valor (a igual valor, de menor posición) y en los primeros soportes
+    pares: List[Tuple[int, int]] = []
+    j = len(t)
+    for k in range(len(s_l) - 1, -1, -1):
+        fila = filas[k]
+        if fila is None or j <= fila.lo:
+            continue
+        j = min(j, fila.hi)
+        n = fila.hi - fila.lo
+        igual = np.unpackbits(fila.igual_izquierda, count=n).astype(bool)
+        sin_soporte = np.unpackbits(fila.sin_soporte, count=n).astype(bool)
+        while j > fila.lo:
+            indice = j - fila.lo - 1
+            if igual[indice]:
+                j -= 1
+            elif sin_soporte[indice]:
+                break
+            else:
+                pares.append((k, j - 1))
+                j -= 1
+                break
+
+    costo = 0
+    for k, j in pares:
+        resultado.asignaciones[int(orden_s[k])] = int(pos_t[j])
+        costo += abs(s_l[k] - int(t[j]))
+    resultado.costo = costo / 100
+
+    # Empates: otra TB del margen a la misma distancia, o mismo valor que otro soporte emparejado
+    valores_emparejados: Dict[int, int] = {}
+    for k, _ in pares:
+        valores_emparejados[s_l[k]] = valores_emparejados.get(s_l[k], 0) + 1
+    empates = []
+    for k, j in pares:
+        desviacion = abs(s_l[k] - int(t[j]))
+        # TBs a la misma distancia, a cada lado del soporte
+        iguales = sum(
+            int(np.searchsorted(t, v, side='right') - np.searchsorted(t, v, side='left'))
+            for v in {s_l[k] - desviacion, s_l[k] + desviacion}
+        )
+        if iguales > 1 or valores_emparejados[s_l[k]] > 1:
+            empates.append(int(orden_s[k]))
+    resultado.empates = sorted(empates)
+    return resultado
@@ -0,0 +1,212 @@
+"""
+Caché columnar del Excel de TBs.
+
+Leer un libro grande con openpyxl cuesta decenas de segundos; las columnas
+que usa el flujo se guardan aparte como archivos .npy (uno por columna) en
+la carpeta de caché, junto a un meta.json con la ruta, el mtime y el tamaño
+del Excel. En las siguientes ejecuciones las columnas se abren con mmap y,
+si el Excel cambió, la caché se descarta y se reconstruye.
+
+Las columnas de texto o con celdas de tipos mezclados (números y texto,
+fechas) se guardan de forma que la lectura desde la caché dé el mismo
+DataFrame que openpyxl: mismos valores, mismas celdas vacías y mismo dtype.
+
+La columna 'usado' se guarda aparte y se reescribe (con el meta) cada vez
+que `guardar_excel` actualiza el libro, así que la escritura propia del
+flujo no invalida la caché.
+"""
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.ocr_cache import cache_habilitada, directorio_cache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+VERSION = 2
+SUBCARPETA = 'tbs'
+NOMBRE_META = 'meta.json'
+
+
+def carpeta_cache(excel_path: str, sheet_name: Optional[str], columnas: List[str]) -> str:
+    """Carpeta de la caché de un Excel, una por ruta, hoja y columnas pedidas."""
+    clave = json.dumps([os.path.abspath(excel_path), sheet_name, list(columnas)], ensure_ascii=False)
+    nombre = hashlib.sha256(clave.encode('utf-8')).hexdigest()[:32]
+    return os.path.join(directorio_cache(), SUBCARPETA, nombre)
+
+
+def firma(excel_path: str) -> Dict[str, Any]:
+    """Ruta, mtime y tamaño del Excel: si cambian, la caché deja de valer."""
+    st = os.stat(excel_path)
+    return {'ruta': os.path.abspath(excel_path), 'mtime_ns': st.st_mtime_ns, 'tamano': st.st_size}
+
+
+def _escribir_atomico(ruta: str, escribir) -> None:
+    temporal = ruta + '.tmp'
+    with open(temporal, 'wb') as f:
+        escribir(f)
+    os.replace(temporal, ruta)
+
+
+def _guardar_meta(carpeta: str, meta: Dict[str, Any]) -> None:
+    datos = json.dumps(meta, ensure_ascii=False, indent=1).encode('utf-8')
+    _escribir_atomico(os.path.join(carpeta, NOMBRE_META), lambda f: f.write(datos))
+
+
+def _leer_meta(carpeta: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(carpeta, NOMBRE_META), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _columna_a_arrays(serie: pd.Series) -> Dict[str, np.ndarray]:
+    """
+    Convierte una columna en arrays para guardarla: numéricas y de fechas tal
+    cual, para abrirlas con mmap; de enteros o de texto, el array y una
+    máscara de celdas vacías; con tipos mezclados, los valores originales
+    como array de objetos, que no se puede abrir con mmap pero conserva el
+    tipo de cada celda.
+    """
+    if serie.dtype.kind in 'biufmM':
+        return {'datos': serie.to_numpy()}
+    valores = serie.to_numpy(dtype=object)
+    vacios = pd.isna(valores).astype(bool)
+    presentes = valores[~vacios]
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in presentes):
+        datos = np.zeros(len(valores), dtype=np.int64)
+        datos[~vacios] = presentes.astype(np.int64)
+    elif all(isinstance(v, str) for v in presentes):
+        datos = np.full(len(valores), '', dtype=object)
+        datos[~vacios] = presentes
+        datos = datos.astype(str)
+    else:
+        return {'objetos': valores}
+    return {'datos': datos, 'vacios': vacios}
+
+
+def _arrays_a_columna(datos: np.ndarray, vacios: Optional[np.ndarray]) -> Any:
+    if vacios is None:
+        return datos
+    columna = datos.astype(object)
+    columna[vacios] = None
+    return columna
+
+
+def cargar(excel_path: str, sheet_name: Optional[str], columnas: List[str]) -> Optional[pd.DataFrame]:
+    """
+    Devuelve el DataFrame cacheado del Excel, o None si no hay caché válida.
+
+    'Valor' y demás columnas numéricas quedan respaldadas por mmap de solo
+    lectura; 'usado' se carga en memoria porque el flujo la modifica.
+    """
+    if not cache_habilitada():
+        return None
+    carpeta = carpeta_cache(excel_path, sheet_name, columnas)
+    meta = _leer_meta(carpeta)
+    if meta is None:
+        return None
+    if meta.get('version') != VERSION or meta.get('firma') != firma(excel_path):
+        logger.info(f"Caché de TBs desactualizada para '{excel_path}', se reconstruye")
+        return None
+    try:
+        columnas_df: Dict[str, Any] = {}
+        for nombre, archivos in meta['columnas'].items():
+            if 'objetos' in archivos:
+                # Escrito por `guardar` en la carpeta de caché de este usuario
+                datos = np.load(os.path.join(carpeta, archivos['objetos']), allow_pickle=True)
+            else:
+                # Vista ndarray del mmap, sin copiar: la subclase memmap no debe llegar al DataFrame
+                datos = np.asarray(np.load(os.path.join(carpeta, archivos['datos']), mmap_mode='r'))
+            vacios = None
+            if 'vacios' in archivos:
+                vacios = np.load(os.path.join(carpeta, archivos['vacios']))
+            if len(datos) != meta['filas']:
+                raise ValueError(f"columna '{nombre}' con {len(datos)} filas")
+            columnas_df[nombre] = _arrays_a_columna(datos, vacios)
+        usado = np.load(os.path.join(carpeta, meta['usado']))
+        if len(usado) != meta['filas']:
+            raise ValueError(f"columna 'usado' con {len(usado)} filas")
+    except Exception as e:
+        logger.warning(f"Caché de TBs ilegible en '{carpeta}': {e}")
+        return None
+    df = pd.DataFrame(columnas_df, copy=False)
+    df['usado'] = usado.astype(bool)
+    df.attrs.update(meta['attrs'])
+    df.attrs['cache_tbs'] = carpeta
+    return df
+
+
+def guardar(df: pd.DataFrame, excel_path: str, sheet_name: Optional[str], columnas: List[str]) -> None:
+    """
+    Guarda las columnas de `df` (recién leído de `excel_path`) en la caché.
+
+    Los errores solo se registran: sin caché el flujo sigue funcionando.
+    """
+    if not cache_habilitada():
+        return
+    carpeta = carpeta_cache(excel_path, sheet_name, columnas)
+    try:
+        firma_excel = firma(excel_path)
+        shutil.rmtree(carpeta, ignore_errors=True)
+        os.makedirs(carpeta, exist_ok=True)
+        archivos: Dict[str, Dict[str, str]] = {}
+        for i, nombre in enumerate(c for c in df.columns if c != 'usado'):
+            archivos[nombre] = {}
+            for parte, array in _columna_a_arrays(df[nombre]).items():
+                archivo = f"{i}_{parte}.npy"
+                _escribir_atomico(os.path.join(carpeta, archivo), lambda f, a=array: np.save(f, a))
+                archivos[nombre][parte] = archivo
+        usado = df['usado'].to_numpy(dtype=bool)
+        _escribir_atomico(os.path.join(carpeta, 'usado.npy'), lambda f: np.save(f, usado))
+        # El meta se escribe al final: sin él la carpeta no cuenta como caché
+        _guardar_meta(carpeta, {
+            'version': VERSION,
+            'firma': firma_excel,
+            'filas': len(df),
+            'columnas': archivos,
+            'usado': 'usado.npy',
+            'attrs': {k: v for k, v in df.attrs.items() if k in ('hoja', 'fila_inicio')},
+        })
+        df.attrs['cache_tbs'] = carpeta
+        logger.debug(f"Caché de TBs guardada en '{carpeta}'")
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la caché de TBs de '{excel_path}': {e}")
+
+
+def actualizar_usado(df: pd.DataFrame, excel_path: str, firma_previa: Dict[str, Any]) -> None:
+    """
+    Tras escribir 'usado' en el Excel, actualiza esa columna en la caché y la
+    firma del archivo, para que la próxima lectura siga usando la caché.
+
+    Args:
+        df: DataFrame leído con `leer_excel` y ya guardado.
+        excel_path: Ruta al Excel.
+        firma_previa: `firma` del Excel justo antes de guardar. Si no coincide
+            con la de la caché, el Excel se editó por fuera durante el flujo y
+            la caché se descarta en lugar de darla por buena.
+    """
+    carpeta = df.attrs.get('cache_tbs')
+    if not carpeta or not cache_habilitada():
+        return
+    meta = _leer_meta(carpeta)
+    if meta is None:
+        return
+    if meta.get('firma') != firma_previa or meta.get('filas') != len(df):
+        shutil.rmtree(carpeta, ignore_errors=True)
+        logger.info(f"Caché de TBs descartada: '{excel_path}' cambió durante la ejecución")
+        return
+    try:
+        usado = df['usado'].to_numpy(dtype=bool)
+        _escribir_atomico(os.path.join(carpeta, meta['usado']), lambda f: np.save(f, usado))
+        meta['firma'] = firma(excel_path)
+        _guardar_meta(carpeta, meta)
+    except Exception as e:
+        logger.warning(f"No se pudo actualizar la caché de TBs en '{carpeta}': {e}")
@@ -0,0 +1,160 @@
+"""
+Detección de soportes en una página a partir de perfiles de proyección de
+tinta, para no depender de coordenadas fijas pensadas para tamaño Carta.
+
+La página (ya rasterizada para la detección de regiones vacías) se corta
+primero en bandas horizontales separadas por filas en blanco y cada banda
+en columnas separadas por un canal en blanco; cada bloque resultante se
+ajusta a su tinta y se amplía con un pequeño margen.
+
+Las cajas detectadas solo se usan si su geometría es la de un soporte
+(`validar_regiones`): en diseños sin borde, con más blanco entre líneas que
+HUECO_FILAS_PT, un soporte se parte en bloques bajos y alargados y es mejor
+usar las coordenadas configuradas. El número de cajas no se compara con el
+de coordenadas: una página con más soportes que bandas (p. ej. A4 a dos
+columnas) es justo la que necesita la detección.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.kernels_imagen import UMBRAL_BLANCO_PIXEL
+
+# Parámetros en puntos PDF (1/72 de pulgada); se escalan a la resolución de la vista
+HUECO_FILAS_PT = 18.0
+HUECO_COLUMNAS_PT = 24.0
+MARGEN_PT = 4.0
+ALTO_MIN_PT = 36.0
+ANCHO_MIN_PT = 72.0
+# Píxeles con tinta que debe tener una fila/columna para contar como contenido
+TINTA_MIN_PIXELES = 2
+# Más regiones que esto en una página indica que no es una página de soportes
+MAX_REGIONES = 12
+# Tamaño mínimo en puntos y proporción máxima (lado largo / corto) de una
+# caja detectada para tomarla por un soporte entero
+ALTO_MIN_SOPORTE_PT = 100.0
+ANCHO_MIN_SOPORTE_PT = 144.0
+ASPECTO_MAX_SOPORTE = 6.0
+
+
+def _segmentos(activo: np.ndarray, hueco_min: int) -> List[Tuple[int, int]]:
+    """
+    Tramos [inicio, fin) de posiciones activas, uniendo los separados por
+    menos de `hueco_min` posiciones inactivas.
+    """
+    if not activo.any():
+        return []
+    bordes = np.diff(np.concatenate(([0], activo.astype(np.int8), [0])))
+    inicios = np.flatnonzero(bordes == 1)
+    fines = np.flatnonzero(bordes == -1)
+    cortes = np.flatnonzero(inicios[1:] - fines[:-1] >= hueco_min)
+    inicios = np.concatenate((inicios[:1], inicios[cortes + 1]))
+    fines = np.concatenate((fines[cortes], fines[-1:]))
+    return list(zip(inicios.tolist(), fines.tolist()))
+
+
+def _unir_pequenos(tramos: List[Tuple[int, int]], minimo: float) -> List[Tuple[int, int]]:
+    """
+    Une cada tramo más corto que `minimo` con su vecino más cercano, para no
+    perder una línea de un soporte separada por un blanco grande (o un
+    encabezado de página, que queda pegado al primer soporte).
+    """
+    tramos = list(tramos)
+    while len(tramos) > 1:
+        cortos = [i for i, (a, b) in enumerate(tramos) if b - a < minimo]
+        if not cortos:
+            break
+        i = cortos[0]
+        hueco_previo = tramos[i][0] - tramos[i - 1][1] if i > 0 else None
+        hueco_siguiente = tramos[i + 1][0] - tramos[i][1] if i + 1 < len(tramos) else None
+        if hueco_siguiente is None or (hueco_previo is not None and hueco_previo <= hueco_siguiente):
+            j = i - 1
+        else:
+            j = i + 1
+        a, b = min(i, j), max(i, j)
+        tramos[a:b + 1] = [(tramos[a][0], tramos[b][1])]
+    return tramos
+
+
+def detectar_regiones(
+    gris: np.ndarray,
+    escala: float = 1.0,
+    umbral_pixel: int = UMBRAL_BLANCO_PIXEL,
+    hueco_filas: float = HUECO_FILAS_PT,
+    hueco_columnas: float = HUECO_COLUMNAS_PT,
+    margen: float = MARGEN_PT,
+    max_regiones: int = MAX_REGIONES
+) -> Optional[List[Tuple[float, float, float, float]]]:
+    """
+    Detecta las cajas de los soportes de una página.
+
+    Args:
+        gris: Página en escala de grises (alto, ancho).
+        escala: Píxeles por punto PDF de `gris` (DPI de la vista / 72).
+        umbral_pixel: Intensidad por debajo de la cual un píxel es tinta.
+        hueco_filas: Alto mínimo en puntos del blanco que separa dos soportes.
+        hueco_columnas: Ancho mínimo en puntos del canal entre soportes lado a lado.
+        margen: Puntos añadidos alrededor de la tinta de cada soporte.
+        max_regiones: Con más regiones se considera que la detección falló.
+
+    Returns:
+        Cajas (x1, y1, x2, y2) en puntos con origen arriba a la izquierda, en
+        orden de lectura, o None si no se detectó nada utilizable.
+    """
+    tinta = gris < umbral_pixel
+    alto, ancho = tinta.shape
+    hueco_f = max(1, int(round(hueco_filas * escala)))
+    hueco_c = max(1, int(round(hueco_columnas * escala)))
+    alto_min, ancho_min = ALTO_MIN_PT * escala, ANCHO_MIN_PT * escala
+
+    cajas: List[Tuple[float, float, float, float]] = []
+    bandas = _unir_pequenos(_segmentos(tinta.sum(axis=1) >= TINTA_MIN_PIXELES, hueco_f), alto_min)
+    for y1, y2 in bandas:
+        banda = tinta[y1:y2]
+        columnas = _segmentos(banda.sum(axis=0) >= TINTA_MIN_PIXELES, hueco_c)
+        if any(x2 - x1 < ancho_min for x1, x2 in columnas):
+            # Un trozo estrecho es parte de un soporte (p. ej. etiqueta y valor
+            # separados), no un soporte aparte: la banda no se divide
+            columnas = [(columnas[0][0], columnas[-1][1])]
+        for x1, x2 in columnas:
+            # Ajuste vertical del bloque: la banda puede ser más alta que su tinta
+            filas = np.flatnonzero(banda[:, x1:x2].any(axis=1))
+            by1, by2 = y1 + int(filas[0]), y1 + int(filas[-1]) + 1
+            if by2 - by1 < alto_min or x2 - x1 < ancho_min:
+                continue
+            cajas.append((
+                max(0.0, x1 / escala - margen), max(0.0, by1 / escala - margen),
+                min(ancho / escala, x2 / escala + margen), min(alto / escala, by2 / escala + margen)
+            ))
+        if len(cajas) > max_regiones:
+            return None
+    return cajas or None
+
+
+def validar_regiones(
+    cajas: Sequence[Tuple[float, float, float, float]],
+    max_regiones: int = MAX_REGIONES
+) -> bool:
+    """
+    Indica si las cajas detectadas son creíbles como soportes por su propia
+    geometría: entre 1 y `max_regiones` cajas, cada una de al menos
+    ALTO_MIN_SOPORTE_PT x ANCHO_MIN_SOPORTE_PT, no más alargada que
+    ASPECTO_MAX_SOPORTE y sin solaparse con otra más allá de los márgenes.
+    Un soporte partido en trozos (etiqueta y valor por separado) deja cajas
+    bajas que no cumplen el alto mínimo.
+    """
+    if not cajas or len(cajas) > max_regiones:
+        return False
+    for x1, y1, x2, y2 in cajas:
+        ancho, alto = x2 - x1, y2 - y1
+        if alto < ALTO_MIN_SOPORTE_PT or ancho < ANCHO_MIN_SOPORTE_PT:
+            return False
+        if max(ancho, alto) > ASPECTO_MAX_SOPORTE * min(ancho, alto):
+            return False
+    # Dos cajas contiguas pueden compartir hasta los márgenes añadidos a cada una
+    solape = 2 * MARGEN_PT
+    for i, (ax1, ay1, ax2, ay2) in enumerate(cajas):
+        for bx1, by1, bx2, by2 in cajas[i + 1:]:
+            if min(ax2, bx2) - max(ax1, bx1) > solape and min(ay2, by2) - max(ay1, by1) > solape:
+                return False
+    return True
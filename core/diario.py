@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PIL import Image
+from core.ocr_cache import clave_imagen
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+NOMBRE_DIARIO = '.automatcher_diario.jsonl'
+
+
+def hash_archivo(ruta: str, bloque: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for trozo in iter(lambda: f.read(bloque), b''):
+            h.update(trozo)
+    return h.hexdigest()
+
+
+def hash_imagen(img: Image.Image) -> str:
+    return clave_imagen(img, '')
+
+
+def hash_entrada_pdf(hash_img: str, no_egreso: str, girado_a: str) -> str:
+    """Identifica las entradas de un PDF de salida: imagen del soporte y datos de la TB."""
+    return hashlib.sha256(f"{hash_img}|{no_egreso}|{girado_a}".encode('utf-8')).hexdigest()
+
+
+@dataclass
+class EstadoSoporte:
+    """Lo que el diario sabe de un soporte (página, región) de un PDF."""
+    imagen: Optional[str] = None
+    estado: Optional[str] = None
+    valor: Optional[float] = None
+    tb: Optional[int] = None
+    excel: Optional[str] = None
+    pdf: Optional[str] = None
+    entrada_pdf: Optional[str] = None
+
+
+@dataclass
+class EstadoPDF:
+    """Estado reconstruido del diario para un PDF de soportes concreto."""
+    regiones: Dict[int, List[int]] = field(default_factory=dict)
+    soportes: Dict[Tuple[int, int], EstadoSoporte] = field(default_factory=dict)
+
+    def soporte(self, pagina: int, region: int) -> EstadoSoporte:
+        return self.soportes.setdefault((pagina, region), EstadoSoporte())
+
+    def soporte_terminado(self, pagina: int, region: int, excel: str) -> bool:
+        """
+        Un soporte está terminado si fue rechazado por OCR, o si está
+        emparejado con una TB de este mismo Excel y su PDF existe en disco.
+        Los ABONADO sin TB y los errores se reintentan.
+        """
+        s = self.soportes.get((pagina, region))
+        if s is None or s.estado is None:
+            return False
+        if s.estado == 'RECHAZADO':
+            return True
+        return (s.estado == 'ABONADO' and s.tb is not None and s.excel == excel
+                and s.pdf is not None and os.path.isfile(s.pdf))
+
+    def paginas_terminadas(self, excel: str) -> Set[int]:
+        return {
+            pagina for pagina, regiones in self.regiones.items()
+            if all(self.soporte_terminado(pagina, region, excel) for region in regiones)
+        }
+
+    def asignaciones(self, excel: str) -> Dict[Tuple[int, int], int]:
+        """TBs asignadas a soportes ABONADO en ejecuciones anteriores sobre `excel`."""
+        return {
+            clave: s.tb for clave, s in self.soportes.items()
+            if s.estado == 'ABONADO' and s.tb is not None and s.excel == excel
+        }
+
+
+class DiarioEjecucion:
+    """
+    Diario de solo anexado para reanudar ejecuciones interrumpidas.
+
+    Cada línea es un registro JSON con clave (hash del PDF, página, región):
+    regiones extraídas, resultados OCR, TB asignada y PDF generado. Una línea
+    final truncada por una caída se ignora al leer. Puede escribirse desde
+    varios hilos (las etapas del flujo).
+    """
+
+    def __init__(self, output_dir: str, nombre: str = NOMBRE_DIARIO):
+        os.makedirs(output_dir, exist_ok=True)
+        self.ruta = os.path.join(output_dir, nombre)
+        self._archivo = None
+        self._candado = threading.Lock()
+
+    def cargar(self, hash_pdf: str) -> EstadoPDF:
+        estado = EstadoPDF()
+        if not os.path.isfile(self.ruta):
+            return estado
+        with open(self.ruta, 'r', encoding='utf-8') as f:
+            for numero, linea in enumerate(f, start=1):
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    logger.warning(f"Diario: línea {numero} ilegible, se ignora")
+                    continue
+                if registro.get('pdf') != hash_pdf:
+                    continue
+                self._aplicar(estado, registro)
+        return estado
+
+    @staticmethod
+    def _aplicar(estado: EstadoPDF, r: Dict[str, Any]) -> None:
+        tipo = r.get('tipo')
+        if tipo == 'pagina':
+            estado.regiones[r['pagina']] = list(r['regiones'])
+            return
+        s = estado.soporte(r['pagina'], r['region'])
+        if tipo == 'region':
+            if s.imagen != r['imagen']:
+                # La imagen cambió: lo registrado para la anterior ya no vale
+                estado.soportes[(r['pagina'], r['region'])] = s = EstadoSoporte()
+            s.imagen = r['imagen']
+        elif tipo == 'ocr':
+            s.estado, s.valor = r['estado'], r['valor']
+        elif tipo == 'tb':
+            s.tb, s.excel = r['tb'], r['excel']
+        elif tipo == 'salida':
+            s.pdf, s.entrada_pdf = r['ruta'], r['entrada']
+
+    def registrar(self, tipo: str, hash_pdf: str, sincronizar: bool = False, **datos: Any) -> None:
+        linea = json.dumps({'tipo': tipo, 'pdf': hash_pdf, **datos}, ensure_ascii=False) + '\n'
+        with self._candado:
+            self._escribir(linea, sincronizar)
+
+    def _escribir(self, linea: str, sincronizar: bool) -> None:
+        if self._archivo is None:
+            linea_abierta = False
+            if os.path.isfile(self.ruta) and os.path.getsize(self.ruta) > 0:
+                with open(self.ruta, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    linea_abierta = f.read(1) != b'\n'
+            self._archivo = open(self.ruta, 'a', encoding='utf-8')
+            if linea_abierta:
+                # Una caída dejó la última línea a medias: se cierra antes de seguir
+                self._archivo.write('\n')
+        self._archivo.write(linea)
+        self._archivo.flush()
+        if sincronizar:
+            os.fsync(self._archivo.fileno())
+
+    def cerrar(self) -> None:
+        with self._candado:
+            if self._archivo is not None:
+                self._archivo.flush()
+                os.fsync(self._archivo.fileno())
+                self._archivo.close()
+                self._archivo = None
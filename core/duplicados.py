@@ -0,0 +1,251 @@
+"""
+Detección de soportes duplicados por hash perceptual, antes del OCR.
+
+El mismo comprobante llega a veces dos veces (páginas repetidas o PDFs que
+se solapan). Cada soporte se reduce a una firma: su tinta recortada a la
+caja que la envuelve y promediada en una rejilla de REJILLA celdas, más un
+dHash de 64 bits de esa rejilla. Dos soportes son candidatos a duplicados
+si sus dHash están a poca distancia de Hamming y ninguna celda de la
+rejilla difiere más de DIFERENCIA_MAX_CELDA.
+
+La rejilla no basta para separar comprobantes de la misma plantilla que
+difieren en un dígito (en la celda del dígito la diferencia puede quedar
+por debajo del umbral), y tomar uno por copia del otro pierde un pago. Por
+eso cada candidato se confirma comparando la tinta binarizada a resolución
+completa, píxel a píxel con un píxel de tolerancia: un dígito distinto deja
+decenas de píxeles sin pareja en un mismo bloque y una copia casi ninguno.
+La tinta de cada original se guarda comprimida (unos pocos KB).
+
+La detección está activa por defecto; AUTOMATCHER_DUPLICADOS=0 la desactiva.
+Solo compara los soportes de una misma ejecución (un PDF, o los fragmentos
+de uno en la fusión): el índice no se guarda entre trabajos.
+"""
+import os
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from core.kernels_imagen import UMBRAL_BINARIZADO, a_gris
+from core.soporte import Soporte
+from utils.logger import get_logger
+from utils import metricas
+
+logger = get_logger(__name__)
+
+# (ancho, alto) de la rejilla de la firma
+REJILLA = (96, 48)
+# Bits distintos como máximo entre los dHash de dos duplicados
+DISTANCIA_MAX_HASH = 6
+# Diferencia máxima (0-255) de intensidad media en cualquier celda
+DIFERENCIA_MAX_CELDA = 32
+# Píxeles oscuros que debe tener una fila/columna para entrar en la caja de tinta
+TINTA_MIN_PIXELES = 2
+# Diferencia relativa máxima de proporciones (ancho / alto) de la tinta
+TOLERANCIA_ASPECTO = 0.03
+# Confirmación a resolución completa: lado de los bloques en píxeles, píxeles
+# de tinta sin pareja (a un píxel de distancia) tolerados por bloque y
+# diferencia máxima de alto o ancho de la caja de tinta
+BLOQUE_CONFIRMACION = 16
+PIXELES_MAX_BLOQUE = 8
+TOLERANCIA_TAMANO = 2
+
+
+def deteccion_habilitada() -> bool:
+    return os.environ.get('AUTOMATCHER_DUPLICADOS', '1').strip().lower() not in ('0', 'false', 'no')
+
+
+@dataclass
+class FirmaSoporte:
+    """Firma perceptual de un soporte."""
+    dhash: int
+    rejilla: np.ndarray
+    aspecto: float
+    # Tinta binarizada a resolución completa: (alto, ancho) y bits comprimidos
+    forma: Tuple[int, int] = (0, 0)
+    tinta: bytes = b''
+
+
+def _desempaquetar(forma: Tuple[int, int], tinta: bytes) -> np.ndarray:
+    bits = np.unpackbits(np.frombuffer(zlib.decompress(tinta), dtype=np.uint8), count=forma[0] * forma[1])
+    return bits.reshape(forma).astype(bool)
+
+
+def _dilatar(tinta: np.ndarray) -> np.ndarray:
+    """Tinta ampliada un píxel en las ocho direcciones."""
+    alto, ancho = tinta.shape
+    borde = np.pad(tinta, 1)
+    dilatada = np.zeros_like(tinta)
+    for dy in range(3):
+        for dx in range(3):
+            dilatada |= borde[dy:dy + alto, dx:dx + ancho]
+    return dilatada
+
+
+def misma_tinta(a: FirmaSoporte, b: FirmaSoporte, maximo: int = PIXELES_MAX_BLOQUE) -> bool:
+    """
+    True si la tinta de `a` y `b` a resolución completa coincide salvo el
+    desplazamiento de un píxel del rasterizado.
+    """
+    if a.tinta == b.tinta and a.forma == b.forma:
+        return True
+    if any(abs(x - y) > TOLERANCIA_TAMANO for x, y in zip(a.forma, b.forma)):
+        return False
+    alto, ancho = max(a.forma[0], b.forma[0]), max(a.forma[1], b.forma[1])
+    lado = BLOQUE_CONFIRMACION
+    alto_b, ancho_b = -(-alto // lado) * lado, -(-ancho // lado) * lado
+    ta = np.zeros((alto_b, ancho_b), dtype=bool)
+    tb = np.zeros((alto_b, ancho_b), dtype=bool)
+    ta[:a.forma[0], :a.forma[1]] = _desempaquetar(a.forma, a.tinta)
+    tb[:b.forma[0], :b.forma[1]] = _desempaquetar(b.forma, b.tinta)
+    sin_pareja = (ta & ~_dilatar(tb)) | (tb & ~_dilatar(ta))
+    por_bloque = sin_pareja.reshape(alto_b // lado, lado, ancho_b // lado, lado).sum(axis=(1, 3))
+    return int(por_bloque.max()) <= maximo
+
+
+def calcular_firma(img: Image.Image) -> Optional[FirmaSoporte]:
+    """Firma del soporte, o None si no tiene tinta."""
+    gris = a_gris(img)
+    # Tinta oscura, para que el ruido de un escaneo no agrande la caja
+    tinta = gris < UMBRAL_BINARIZADO
+    filas = np.flatnonzero(tinta.sum(axis=1) >= TINTA_MIN_PIXELES)
+    columnas = np.flatnonzero(tinta.sum(axis=0) >= TINTA_MIN_PIXELES)
+    if not filas.size or not columnas.size:
+        return None
+    y1, y2, x1, x2 = filas[0], filas[-1] + 1, columnas[0], columnas[-1] + 1
+    # Recortar a la tinta alinea dos copias aunque el recorte de la página difiera
+    recorte = Image.fromarray(np.ascontiguousarray(gris[y1:y2, x1:x2]))
+    rejilla = np.asarray(recorte.resize(REJILLA, Image.BOX), dtype=np.uint8)
+    # dHash: signo del gradiente horizontal en una reducción de 9x8 de la rejilla
+    reducida = np.asarray(Image.fromarray(rejilla).resize((9, 8), Image.BOX), dtype=np.int16)
+    bits = (reducida[:, 1:] > reducida[:, :-1]).ravel()
+    dhash = int(np.packbits(bits).view('>u8')[0])
+    forma = (int(y2 - y1), int(x2 - x1))
+    comprimida = zlib.compress(np.packbits(tinta[y1:y2, x1:x2]).tobytes(), 1)
+    return FirmaSoporte(dhash, rejilla, (x2 - x1) / (y2 - y1), forma, comprimida)
+
+
+class IndiceDuplicados:
+    """
+    Firmas de los soportes ya vistos, en arreglos contiguos para comparar una
+    firma nueva con todas a la vez. La tinta a resolución completa de cada
+    uno solo se descomprime para confirmar un candidato.
+    """
+
+    def __init__(
+        self,
+        distancia_hash: int = DISTANCIA_MAX_HASH,
+        diferencia_celda: int = DIFERENCIA_MAX_CELDA,
+        tolerancia_aspecto: float = TOLERANCIA_ASPECTO
+    ):
+        self.distancia_hash = distancia_hash
+        self.diferencia_celda = diferencia_celda
+        self.tolerancia_aspecto = tolerancia_aspecto
+        self.nombres: List[str] = []
+        self._firmas: List[FirmaSoporte] = []
+        # Rejilla exacta -> posición: las copias idénticas no pasan por el filtro de la rejilla
+        self._exactos: Dict[bytes, int] = {}
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._aspectos = np.zeros(0, dtype=np.float64)
+        self._rejillas = np.zeros((0, REJILLA[0] * REJILLA[1]), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.nombres)
+
+    def buscar(self, firma: FirmaSoporte) -> Optional[str]:
+        """Nombre del primer soporte registrado del que `firma` es duplicado."""
+        exacto = self._exactos.get(firma.rejilla.tobytes())
+        if exacto is not None and self._confirmar(exacto, firma):
+            return self.nombres[exacto]
+        n = len(self.nombres)
+        if not n:
+            return None
+        hashes, aspectos = self._hashes[:n], self._aspectos[:n]
+        candidatos = np.flatnonzero(
+            (np.bitwise_count(hashes ^ np.uint64(firma.dhash)) <= self.distancia_hash)
+            & (np.abs(aspectos - firma.aspecto) <= self.tolerancia_aspecto * firma.aspecto)
+        )
+        if not candidatos.size:
+            return None
+        diferencias = np.abs(
+            self._rejillas[candidatos].astype(np.int16) - firma.rejilla.ravel().astype(np.int16)
+        ).max(axis=1)
+        for i in candidatos[diferencias <= self.diferencia_celda].tolist():
+            if self._confirmar(i, firma):
+                return self.nombres[i]
+        return None
+
+    def _confirmar(self, i: int, firma: FirmaSoporte) -> bool:
+        with metricas.etapa('duplicados.confirmacion'):
+            igual = misma_tinta(self._firmas[i], firma)
+        if not igual:
+            metricas.contar('duplicados.descartados')
+            logger.debug(f"Candidato a duplicado de {self.nombres[i]} descartado a resolución completa")
+        return igual
+
+    def agregar(self, nombre: str, firma: FirmaSoporte) -> None:
+        n = len(self.nombres)
+        if n == len(self._hashes):
+            # Crecimiento geométrico, como una lista
+            capacidad = max(64, 2 * n)
+            self._hashes = np.resize(self._hashes, capacidad)
+            self._aspectos = np.resize(self._aspectos, capacidad)
+            self._rejillas = np.resize(self._rejillas, (capacidad, self._rejillas.shape[1]))
+        self._hashes[n] = firma.dhash
+        self._aspectos[n] = firma.aspecto
+        self._rejillas[n] = firma.rejilla.ravel()
+        self._exactos.setdefault(firma.rejilla.tobytes(), n)
+        self._firmas.append(firma)
+        self.nombres.append(nombre)
+
+    def registrar(self, nombre: str, img: Image.Image) -> Optional[str]:
+        """
+        Devuelve el nombre del original si `img` duplica un soporte ya
+        registrado; si no, la registra como original y devuelve None.
+        """
+        firma = calcular_firma(img)
+        if firma is None:
+            return None
+        original = self.buscar(firma)
+        if original is None:
+            self.agregar(nombre, firma)
+        return original
+
+
+def marcar_duplicados(
+    soportes: Iterable[Union[str, Soporte]],
+    indice: Optional[IndiceDuplicados] = None
+) -> Iterator[Union[str, Soporte]]:
+    """
+    Anota en `duplicado_de` de cada soporte el nombre del primer soporte
+    igual que lo precede, a medida que pasan. Los duplicados se siguen
+    entregando: `matcher.ocr_soportes` les copia el OCR del original sin
+    llamar a tesseract y el emparejador no les asigna TB. Las rutas pasan
+    sin comparar, y todos los soportes si la detección está desactivada
+    (ver `deteccion_habilitada`).
+    """
+    if not deteccion_habilitada():
+        yield from soportes
+        return
+    indice = indice if indice is not None else IndiceDuplicados()
+    for soporte in soportes:
+        if isinstance(soporte, Soporte) and soporte.duplicado_de is None:
+            with metricas.etapa('duplicados.firma'):
+                original = indice.registrar(soporte.nombre, soporte.imagen)
+            if original is not None:
+                soporte.duplicado_de = original
+                metricas.contar('duplicados.detectados')
+                logger.info(f"Soporte {soporte.nombre} duplicado de {original}: se omite su OCR")
+        yield soporte
+
+
+def comparar(a: Image.Image, b: Image.Image) -> Tuple[int, int]:
+    """(distancia de Hamming de los dHash, máxima diferencia de celda) entre dos imágenes."""
+    fa, fb = calcular_firma(a), calcular_firma(b)
+    if fa is None or fb is None:
+        return 64, 255
+    distancia = bin(fa.dhash ^ fb.dhash).count('1')
+    diferencia = int(np.abs(fa.rejilla.astype(np.int16) - fb.rejilla.astype(np.int16)).max())
+    return distancia, diferencia
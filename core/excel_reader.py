@@ -1,18 +1,73 @@
+import os
 import pandas as pd
-from typing import Tuple
+from typing import Any, Dict, List, Optional, Tuple
+from core import cache_tbs
 from utils.logger import get_logger
+from utils import metricas
 
 logger = get_logger(__name__)
 
 
-def leer_excel(excel_path: str, sheet_name: str = None) -> pd.DataFrame:
+COLUMNAS_TB: List[str] = ['Valor', 'No Egreso', 'Girado a', 'usado']
+EXTENSIONES_OPENPYXL = ('.xlsx', '.xlsm')
+
+
+def _a_booleano(valor: Any) -> bool:
+    if isinstance(valor, str):
+        return valor.strip().lower() in ('true', 'verdadero', '1', 'si', 'sí', 'x')
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return False
+    return bool(valor)
+
+
+def _usa_openpyxl(excel_path: str) -> bool:
+    return os.path.splitext(excel_path)[1].lower() in EXTENSIONES_OPENPYXL
+
+
+def leer_excel(
+    excel_path: str,
+    sheet_name: str = None,
+    columnas: Optional[List[str]] = COLUMNAS_TB
+) -> pd.DataFrame:
+    """
+    Lee el Excel de TBs.
+
+    Para .xlsx/.xlsm se recorre la hoja con openpyxl en modo de solo lectura
+    y se cargan únicamente `columnas`; la hoja y la fila donde empiezan los
+    datos quedan en `df.attrs` para que `guardar_excel` pueda escribir solo
+    las celdas de 'usado' que cambien. Esas columnas se guardan además en la
+    caché columnar (`core.cache_tbs`), que se usa mientras el Excel no cambie.
+
+    Args:
+        excel_path: Ruta al archivo Excel.
+        sheet_name: Hoja a leer. None usa la primera.
+        columnas: Columnas a cargar. None carga todas con pandas.
+
+    Returns:
+        pd.DataFrame: TBs con la columna booleana 'usado'.
+    """
+    guardar_cache = False
     try:
-        df = pd.read_excel(excel_path, sheet_name=sheet_name, dtype={'Valor': float})
-        df = df.rename(columns=lambda x: x.strip())
-        if 'usado' not in df.columns:
-            df['usado'] = False
-        else:
-            df['usado'] = df['usado'].fillna(False)
+        with metricas.etapa('excel.leer'):
+            df = None
+            if columnas is not None and _usa_openpyxl(excel_path):
+                df = cache_tbs.cargar(excel_path, sheet_name, columnas)
+                if df is not None:
+                    metricas.contar('excel.cache_aciertos')
+                else:
+                    metricas.contar('excel.cache_fallos')
+                    df = _leer_columnas_openpyxl(excel_path, sheet_name, columnas)
+                    guardar_cache = True
+            if df is None:
+                df = pd.read_excel(excel_path, sheet_name=sheet_name or 0, dtype={'Valor': float})
+                df = df.rename(columns=lambda x: str(x).strip())
+            if 'usado' not in df.columns:
+                df['usado'] = False
+            else:
+                df['usado'] = df['usado'].map(_a_booleano).astype(bool)
+            if guardar_cache:
+                cache_tbs.guardar(df, excel_path, sheet_name, columnas)
+        metricas.contar('excel.filas_leidas', len(df))
         logger.info(f"Leído Excel con {len(df)} transacciones desde '{excel_path}'")
         return df
     except FileNotFoundError:
@@ -23,16 +78,110 @@ def leer_excel(excel_path: str, sheet_name: str = None) -> pd.DataFrame:
         raise
 
 
+def _leer_columnas_openpyxl(excel_path: str, sheet_name: Optional[str], columnas: List[str]) -> pd.DataFrame:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        filas = ws.iter_rows(values_only=True)
+        encabezado = [str(c).strip() if c is not None else '' for c in next(filas, ())]
+        posiciones = {nombre: encabezado.index(nombre) for nombre in columnas if nombre in encabezado}
+        if 'Valor' not in posiciones:
+            raise ValueError(f"La hoja '{ws.title}' no tiene la columna 'Valor'")
+
+        datos: Dict[str, list] = {nombre: [] for nombre in posiciones}
+        ultima = 0
+        for fila in filas:
+            vacia = True
+            for nombre, pos in posiciones.items():
+                valor = fila[pos] if pos < len(fila) else None
+                datos[nombre].append(valor)
+                vacia = vacia and valor is None
+            if not vacia:
+                ultima = len(datos['Valor'])
+        hoja = ws.title
+    finally:
+        wb.close()
+
+    # Las filas vacías al final de la hoja no son transacciones
+    df = pd.DataFrame({nombre: valores[:ultima] for nombre, valores in datos.items()})
+    df['Valor'] = pd.to_numeric(df['Valor'], errors='coerce').astype(float)
+    df.attrs['hoja'] = hoja
+    df.attrs['fila_inicio'] = 2
+    return df
+
+
 def guardar_excel(df: pd.DataFrame, excel_path: str) -> None:
+    """
+    Guarda las marcas de 'usado' en el Excel.
+
+    Si el DataFrame se leyó con `leer_excel` desde un .xlsx/.xlsm, solo se
+    actualizan las celdas de 'usado' que cambiaron, conservando el resto de
+    hojas y el formato. En otro caso se reescribe el libro completo.
+    """
     try:
-        with pd.ExcelWriter(excel_path, engine='openpyxl', mode='w') as writer:
-            df.to_excel(writer, index=False)
+        if 'hoja' in df.attrs and _usa_openpyxl(excel_path):
+            with metricas.etapa('excel.guardar'):
+                firma_previa = cache_tbs.firma(excel_path)
+                cambios = guardar_usado_incremental(df, excel_path)
+                cache_tbs.actualizar_usado(df, excel_path, firma_previa)
+            metricas.contar('excel.celdas_usado', cambios)
+            logger.info(f"Excel actualizado ({cambios} celdas de 'usado') en '{excel_path}'")
+            return
+        with metricas.etapa('excel.guardar'):
+            with pd.ExcelWriter(excel_path, engine='openpyxl', mode='w') as writer:
+                df.to_excel(writer, index=False)
         logger.info(f"Excel guardado con marcas de 'usado' en '{excel_path}'")
     except Exception as e:
         logger.error(f"Error guardando Excel: {e}")
         raise
 
 
+def guardar_usado_incremental(df: pd.DataFrame, excel_path: str) -> int:
+    """
+    Escribe en la hoja original solo las celdas de 'usado' que difieren del
+    DataFrame, añadiendo la columna al final si no existe.
+
+    Returns:
+        int: Número de celdas modificadas.
+    """
+    from openpyxl import load_workbook
+
+    keep_vba = excel_path.lower().endswith('.xlsm')
+    wb = load_workbook(excel_path, keep_vba=keep_vba)
+    try:
+        ws = wb[df.attrs['hoja']]
+        fila_inicio = df.attrs.get('fila_inicio', 2)
+
+        columna = None
+        for celda in ws[fila_inicio - 1]:
+            if isinstance(celda.value, str) and celda.value.strip() == 'usado':
+                columna = celda.column
+                break
+        if columna is None:
+            columna = ws.max_column + 1
+            ws.cell(row=fila_inicio - 1, column=columna, value='usado')
+
+        usados = df['usado'].to_numpy(dtype=bool)
+        if not len(usados):
+            return 0
+        actuales = ws.iter_rows(min_row=fila_inicio, max_row=fila_inicio + len(usados) - 1,
+                                min_col=columna, max_col=columna)
+        cambios = 0
+        for usado, (celda,) in zip(usados, actuales):
+            if _a_booleano(celda.value) != usado:
+                celda.value = bool(usado)
+                cambios += 1
+
+        if cambios:
+            wb.save(excel_path)
+        return cambios
+    finally:
+        # Sin cerrar, en Windows el archivo queda bloqueado para la siguiente ejecución
+        wb.close()
+
+
 def obtener_transaccion_libre(df: pd.DataFrame, valor_soporte: float, margen: float = 100.0) -> Tuple[int, pd.Series]:
     candidatos = df[
         (~df['usado']) &
@@ -40,7 +189,7 @@ def obtener_transaccion_libre(df: pd.DataFrame, valor_soporte: float, margen: fl
     ]
     if not candidatos.empty:
         idx = candidatos.index[0]
-        logger.info(f"Transacción libre encontrada en índice {idx} para valor {valor_soporte}")
+        logger.debug(f"Transacción libre encontrada en índice {idx} para valor {valor_soporte}")
         return idx, df.loc[idx]
     else:
         logger.warning(f"No se encontró transacción libre para valor {valor_soporte}")
@@ -50,7 +199,7 @@ def obtener_transaccion_libre(df: pd.DataFrame, valor_soporte: float, margen: fl
 def marcar_usado(df: pd.DataFrame, idx: int) -> None:
     try:
         df.at[idx, 'usado'] = True
-        logger.info(f"Transacción en índice {idx} marcada como usada.")
+        logger.debug(f"Transacción en índice {idx} marcada como usada.")
     except Exception as e:
         logger.error(f"Error marcando transacción usada: {e}")
         raise
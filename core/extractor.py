@@ -1,66 +1,217 @@
 import os
 import logging
-from typing import List, Tuple
+from typing import Callable, Collection, Iterator, List, Optional, Tuple
 
-import pdfplumber
 from PIL import Image
+from core.soporte import Soporte
+from core.detector_regiones import detectar_regiones, validar_regiones
+from core.kernels_imagen import a_gris, proporcion_no_blancos, proporciones_no_blancos_regiones
+from core import render_pdfium
+from core.render_pdfium import DPI_OCR
 from utils.logger import get_logger
+from utils import metricas
+from utils.paralelo import EstadisticasTrabajadores, mapear_ordenado, resolver_workers
 
 logger = get_logger(__name__)
 
 
 def soporte_tiene_contenido(soporte_imagen: Image.Image, umbral_blanco: float = 0.98) -> bool:
-    soporte_gris = soporte_imagen.convert("L")
-    pixeles_totales = soporte_gris.width * soporte_gris.height
-    pixeles_no_blancos = sum(1 for pixel in soporte_gris.getdata() if pixel < 240)
-    proporcion_no_blancos = pixeles_no_blancos / pixeles_totales
-    return proporcion_no_blancos > (1 - umbral_blanco)
+    return proporcion_no_blancos(a_gris(soporte_imagen)) > (1 - umbral_blanco)
 
 
-def extract_soportes(
+COORDENADAS_DEFECTO: List[Tuple[float, float, float, float]] = [
+    (0, 0, 612, 264),
+    (0, 264, 612, 500),
+    (0, 500, 612, 792)
+]
+
+
+def iterar_soportes(
     pdf_path: str,
-    output_dir: str,
     coordenadas: List[Tuple[float, float, float, float]] = None,
-    umbral_blanco: float = 0.98
-) -> List[str]:
-    suport_paths: List[str] = []
+    umbral_blanco: float = 0.98,
+    sumidero_png: Optional[str] = None,
+    motor: str = 'pdfium',
+    dpi: int = DPI_OCR,
+    workers: Optional[int] = None,
+    paginas: Optional[Collection[int]] = None,
+    al_pagina: Optional[Callable[[int, List[int]], None]] = None,
+    detectar: bool = True
+) -> Iterator[Soporte]:
+    """
+    Recorre el PDF y entrega los soportes no vacíos como objetos en memoria.
 
+    Args:
+        pdf_path: Ruta al PDF de soportes.
+        coordenadas: Regiones (x1, y1, x2, y2) en puntos de cada página. Con
+            `detectar` solo se usan en las páginas donde la detección falla.
+        umbral_blanco: Proporción de blanco a partir de la cual se omite una región.
+        sumidero_png: Carpeta opcional donde guardar cada recorte como PNG
+            (solo para depuración; el flujo no necesita los archivos).
+        motor: 'pdfium' rasteriza solo las regiones a `dpi`, repartiendo las
+            páginas entre procesos; 'pdfplumber' es el camino anterior a 72 dpi.
+        dpi: Resolución de OCR para el motor pdfium.
+        workers: Procesos de renderizado para pdfium. None usa uno por núcleo.
+        paginas: Números de página (desde 1) a procesar. None procesa todas.
+        al_pagina: Se llama con (página, regiones no vacías) al renderizar cada
+            página, antes de entregar sus soportes.
+        detectar: Localiza los soportes de cada página por sus perfiles de
+            tinta (`detector_regiones`) en lugar de usar `coordenadas`. Si
+            las cajas detectadas no tienen la forma de un soporte (ver
+            `validar_regiones`), se usan las coordenadas.
+
+    Returns:
+        Generador de Soporte, en orden de página y región.
+    """
     if not os.path.isfile(pdf_path):
         logger.error(f"No se encontró el PDF: {pdf_path}")
         raise FileNotFoundError(f"No se encontró el PDF: {pdf_path}")
-    os.makedirs(output_dir, exist_ok=True)
+    if sumidero_png is not None:
+        os.makedirs(sumidero_png, exist_ok=True)
 
     if coordenadas is None:
-        coordenadas = [
-            (0, 0, 612, 264),
-            (0, 264, 612, 500),
-            (0, 500, 612, 792)
-        ]
+        coordenadas = COORDENADAS_DEFECTO
+
+    if paginas is not None:
+        paginas = set(paginas)
+    if motor == 'pdfium':
+        return _iterar_paginas_pdfium(pdf_path, coordenadas, umbral_blanco, sumidero_png, dpi, workers,
+                                      paginas, al_pagina, detectar)
+    if motor == 'pdfplumber':
+        return _iterar_paginas(pdf_path, coordenadas, umbral_blanco, sumidero_png, paginas, al_pagina,
+                               detectar)
+    raise ValueError(f"Motor de renderizado desconocido: {motor}")
+
+
+def _guardar_png(soporte: Soporte, sumidero_png: Optional[str]) -> None:
+    if sumidero_png is None:
+        return
+    ruta = os.path.join(sumidero_png, f"{soporte.nombre}.png")
+    soporte.imagen.save(ruta)
+    soporte.ruta = ruta
+    logger.debug(f"Guardado soporte: {ruta}")
+
+
+def _iterar_paginas_pdfium(
+    pdf_path: str,
+    coordenadas: List[Tuple[float, float, float, float]],
+    umbral_blanco: float,
+    sumidero_png: Optional[str],
+    dpi: int,
+    workers: Optional[int],
+    paginas_sel: Optional[Collection[int]],
+    al_pagina: Optional[Callable[[int, List[int]], None]],
+    detectar: bool
+) -> Iterator[Soporte]:
+    try:
+        total = render_pdfium.contar_paginas(pdf_path)
+        logger.info(f"Abriendo PDF con {total} páginas")
+        indices = [i for i in range(total) if paginas_sel is None or i + 1 in paginas_sel]
+        workers = min(resolver_workers(workers), max(1, len(indices)))
+        estadisticas = EstadisticasTrabajadores()
+        tareas = ((i, coordenadas, umbral_blanco, dpi, detectar) for i in indices)
+        try:
+            paginas = mapear_ordenado(
+                render_pdfium.renderizar_pagina, tareas, workers=workers,
+                estadisticas=estadisticas,
+                initializer=render_pdfium.abrir_documento, initargs=(pdf_path,)
+            )
+            for pagina in paginas:
+                ancho, alto = pagina.tamano
+                logger.debug(f"Página {pagina.numero}: tamaño {ancho}x{alto} puntos")
+                for idx in pagina.omitidas:
+                    logger.debug(f"Soporte vacío omitido: página {pagina.numero}, región {idx}")
+                metricas.contar('extractor.paginas')
+                if detectar and not pagina.detectadas:
+                    logger.debug(f"Página {pagina.numero}: detección fallida, se usan las coordenadas")
+                    metricas.contar('extractor.deteccion_fallida')
+                metricas.contar('extractor.regiones_vacias', len(pagina.omitidas))
+                if al_pagina is not None:
+                    al_pagina(pagina.numero, [idx for idx, _, _ in pagina.regiones])
+                for idx, caja, imagen in pagina.regiones:
+                    soporte = Soporte(imagen, pagina.numero, idx, caja)
+                    try:
+                        _guardar_png(soporte, sumidero_png)
+                    except Exception as e:
+                        # Sin PNG no tiene `ruta`, que necesitan los fragmentos: se omite como antes
+                        logger.error(f"Error al guardar soporte pagina {pagina.numero}, idx {idx}: {e}")
+                        continue
+                    metricas.contar('extractor.soportes')
+                    yield soporte
+        finally:
+            # En modo serie el documento se abrió en este mismo proceso
+            render_pdfium.cerrar_documento()
+        estadisticas.resumen("Renderizado de páginas")
+    except Exception as e:
+        logger.exception(f"Error al procesar el PDF: {e}")
+        raise
+
+
+def _iterar_paginas(
+    pdf_path: str,
+    coordenadas: List[Tuple[float, float, float, float]],
+    umbral_blanco: float,
+    sumidero_png: Optional[str],
+    paginas_sel: Optional[Collection[int]],
+    al_pagina: Optional[Callable[[int, List[int]], None]],
+    detectar: bool
+) -> Iterator[Soporte]:
+    import pdfplumber
 
     try:
         with pdfplumber.open(pdf_path) as pdf:
             logger.info(f"Abriendo PDF con {len(pdf.pages)} páginas")
             for page_num, page in enumerate(pdf.pages, start=1):
-                page_img = page.to_image(resolution=72).original
-                logger.info(f"Página {page_num}: tamaño {page.width}x{page.height} puntos")
+                if paginas_sel is not None and page_num not in paginas_sel:
+                    continue
+                with metricas.etapa('extractor.render_pagina'):
+                    page_img = page.to_image(resolution=72).original
+                    gris = a_gris(page_img)
+                    cajas = detectar_regiones(gris) if detectar else None
+                    if cajas is not None and not validar_regiones(cajas):
+                        cajas = None
+                    if detectar and cajas is None:
+                        metricas.contar('extractor.deteccion_fallida')
+                    cajas = cajas or coordenadas
+                    # Proporción de tinta de todas las regiones en una sola pasada
+                    proporciones = proporciones_no_blancos_regiones(gris, cajas)
+                logger.debug(f"Página {page_num}: tamaño {page.width}x{page.height} puntos")
+                metricas.contar('extractor.paginas')
+                if al_pagina is not None:
+                    al_pagina(page_num, [i for i, p in enumerate(proporciones, start=1)
+                                         if p > (1 - umbral_blanco)])
 
-                for idx, (x1, y1, x2, y2) in enumerate(coordenadas, start=1):
+                for idx, caja in enumerate(cajas, start=1):
                     try:
-                        soporte_img = page_img.crop((x1, y1, x2, y2))
-                        if not soporte_tiene_contenido(soporte_img, umbral_blanco):
-                            logger.info(f"Soporte vacío omitido: página {page_num}, región {idx}")
+                        if proporciones[idx - 1] <= (1 - umbral_blanco):
+                            logger.debug(f"Soporte vacío omitido: página {page_num}, región {idx}")
+                            metricas.contar('extractor.regiones_vacias')
                             continue
-                        nombre = f"soporte_p{page_num}_{idx}.png"
-                        ruta = os.path.join(output_dir, nombre)
-                        soporte_img.save(ruta)
-                        suport_paths.append(ruta)
-                        logger.info(f"Guardado soporte: {ruta}")
+                        soporte = Soporte(page_img.crop(caja), page_num, idx, tuple(caja))
+                        _guardar_png(soporte, sumidero_png)
                     except Exception as e:
                         logger.error(f"Error al procesar soporte pagina {page_num}, idx {idx}: {e}")
+                        continue
+                    metricas.contar('extractor.soportes')
+                    yield soporte
     except Exception as e:
         logger.exception(f"Error al procesar el PDF: {e}")
         raise
 
+
+def extract_soportes(
+    pdf_path: str,
+    output_dir: str,
+    coordenadas: List[Tuple[float, float, float, float]] = None,
+    umbral_blanco: float = 0.98,
+    motor: str = 'pdfium',
+    dpi: int = DPI_OCR,
+    detectar: bool = True
+) -> List[str]:
+    suport_paths: List[str] = []
+    for soporte in iterar_soportes(pdf_path, coordenadas, umbral_blanco, sumidero_png=output_dir,
+                                   motor=motor, dpi=dpi, detectar=detectar):
+        suport_paths.append(soporte.ruta)
     return suport_paths
 
 
@@ -74,10 +225,17 @@ if __name__ == '__main__':
     parser.add_argument('output_dir', help='Directorio de salida para imágenes')
     parser.add_argument('--umbral', type=float, default=0.98,
                         help='Umbral para omitir soportes vacíos (0-1)')
+    parser.add_argument('--motor', choices=['pdfium', 'pdfplumber'], default='pdfium',
+                        help='Motor de renderizado de páginas')
+    parser.add_argument('--dpi', type=int, default=DPI_OCR,
+                        help='Resolución de los recortes (solo pdfium)')
+    parser.add_argument('--sin-deteccion', action='store_true',
+                        help='Usa siempre las coordenadas fijas en lugar de detectar los soportes')
     args = parser.parse_args()
 
     try:
-        extract_soportes(args.pdf_path, args.output_dir, umbral_blanco=args.umbral)
+        extract_soportes(args.pdf_path, args.output_dir, umbral_blanco=args.umbral,
+                         motor=args.motor, dpi=args.dpi, detectar=not args.sin_deteccion)
         logger.info("Extracción completada exitosamente.")
     except Exception as e:
         logger.error(f"La extracción falló: {e}")
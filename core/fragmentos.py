@@ -0,0 +1,344 @@
+"""
+Ejecución de un PDF grande por fragmentos de páginas.
+
+Cada fragmento (un rango de páginas) extrae y pasa OCR a sus soportes de
+forma independiente, en otro proceso o en otra máquina que comparta el
+sistema de archivos, y deja en su carpeta los PNG de los soportes y un
+`fragmento.json` con regiones y resultados OCR. No toca el Excel.
+
+`fusionar_fragmentos` reúne después todos los fragmentos, los ordena por
+página y región y hace la asignación de TBs y la generación de PDFs en un
+único proceso. Si la detección de duplicados está activa, cada fragmento
+marca los duplicados entre sus propios soportes y la fusión compara además
+los originales de cada fragmento con los de los anteriores, de modo que el
+resultado no depende de cuántos fragmentos hubo ni del orden en que
+terminaron, y dos fragmentos nunca reclaman la misma TB.
+"""
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from core.diario import DiarioEjecucion, hash_archivo, hash_entrada_pdf, hash_imagen
+from core.duplicados import IndiceDuplicados, deteccion_habilitada, marcar_duplicados
+from core.excel_reader import guardar_excel, leer_excel
+from core.extractor import iterar_soportes
+from core.matcher import MODOS_ASIGNACION, Emparejador, ocr_soportes
+from core.pdf_generator import datos_tb, generar_pdfs
+from core.pipeline import ResumenFlujo, reconciliar_usado
+from core.render_pdfium import contar_paginas
+from core.soporte import Soporte
+from utils.cancelacion import TokenCancelacion
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+VERSION = 1
+NOMBRE_RESULTADO = 'fragmento.json'
+CARPETA_SOPORTES = 'soportes'
+
+
+@dataclass
+class Fragmento:
+    """Resultado de `ejecutar_fragmento` leído de su carpeta."""
+    carpeta: str
+    hash_pdf: str
+    paginas_pdf: int
+    primera: int
+    ultima: int
+    # página -> regiones no vacías
+    paginas: Dict[int, List[int]]
+    # Un dict por soporte: pagina, region, caja, imagen (hash), png, estado, valor, nivel
+    # y duplicado_de (nombre del original dentro del fragmento, o None)
+    soportes: List[Dict[str, Any]]
+
+    def ruta_png(self, soporte: Dict[str, Any]) -> str:
+        return os.path.join(self.carpeta, soporte['png'])
+
+
+def rangos_paginas(total: int, fragmentos: int) -> List[Tuple[int, int]]:
+    """Reparte las páginas 1..total en `fragmentos` rangos contiguos (primera, última) de tamaño parecido."""
+    fragmentos = max(1, min(fragmentos, total))
+    base, resto = divmod(total, fragmentos)
+    rangos, inicio = [], 1
+    for i in range(fragmentos):
+        fin = inicio + base + (1 if i < resto else 0) - 1
+        rangos.append((inicio, fin))
+        inicio = fin + 1
+    return rangos
+
+
+def cargar_fragmento(carpeta: str) -> Fragmento:
+    ruta = os.path.join(carpeta, NOMBRE_RESULTADO)
+    if not os.path.isfile(ruta):
+        raise FileNotFoundError(f"El fragmento '{carpeta}' no tiene {NOMBRE_RESULTADO} (¿no terminó?)")
+    with open(ruta, 'r', encoding='utf-8') as f:
+        datos = json.load(f)
+    if datos.get('version') != VERSION:
+        raise ValueError(f"Fragmento '{carpeta}' con versión {datos.get('version')}, se esperaba {VERSION}")
+    return Fragmento(
+        carpeta=carpeta,
+        hash_pdf=datos['hash_pdf'],
+        paginas_pdf=datos['paginas_pdf'],
+        primera=datos['primera'],
+        ultima=datos['ultima'],
+        paginas={int(p): regiones for p, regiones in datos['paginas'].items()},
+        soportes=datos['soportes'],
+    )
+
+
+def ejecutar_fragmento(
+    pdf_path: str,
+    primera: int,
+    ultima: int,
+    carpeta: str,
+    workers: Optional[int] = None,
+    forzar: bool = False,
+    cancelacion: Optional[TokenCancelacion] = None
+) -> Fragmento:
+    """
+    Extrae y pasa OCR a las páginas `primera`..`ultima` (desde 1, incluidas).
+
+    El `fragmento.json` se escribe al final y de forma atómica: una carpeta
+    sin él es un fragmento sin terminar. Si ya existe para el mismo PDF y
+    rango, se reutiliza salvo con `forzar`.
+
+    Args:
+        pdf_path: PDF de soportes completo.
+        primera: Primera página del fragmento.
+        ultima: Última página del fragmento.
+        carpeta: Carpeta del fragmento (PNGs y resultado).
+        workers: Procesos de renderizado y de OCR. None usa uno por núcleo.
+        forzar: Repite el fragmento aunque ya esté terminado.
+        cancelacion: Token para detener el fragmento desde otro hilo.
+
+    Returns:
+        Fragmento: El resultado escrito.
+    """
+    hash_pdf = hash_archivo(pdf_path)
+    paginas_pdf = contar_paginas(pdf_path)
+    if not 1 <= primera <= ultima <= paginas_pdf:
+        raise ValueError(f"Rango de páginas {primera}-{ultima} fuera del PDF ({paginas_pdf} páginas)")
+
+    if not forzar and os.path.isfile(os.path.join(carpeta, NOMBRE_RESULTADO)):
+        previo = cargar_fragmento(carpeta)
+        if (previo.hash_pdf, previo.primera, previo.ultima) == (hash_pdf, primera, ultima):
+            logger.info(f"Fragmento {primera}-{ultima} ya terminado en '{carpeta}', se reutiliza")
+            return previo
+
+    carpeta_png = os.path.join(carpeta, CARPETA_SOPORTES)
+    os.makedirs(carpeta_png, exist_ok=True)
+    paginas: Dict[int, List[int]] = {}
+    soportes: List[Dict[str, Any]] = []
+
+    iterador = iterar_soportes(pdf_path, sumidero_png=carpeta_png, workers=workers,
+                               paginas=range(primera, ultima + 1), al_pagina=paginas.__setitem__)
+    ocr = ocr_soportes(marcar_duplicados(iterador), workers)
+    try:
+        for soporte, estado, valor in ocr:
+            if cancelacion is not None:
+                cancelacion.verificar()
+            soportes.append({
+                'pagina': soporte.pagina,
+                'region': soporte.region,
+                'caja': list(soporte.caja),
+                'imagen': hash_imagen(soporte.imagen),
+                'png': os.path.relpath(soporte.ruta, carpeta),
+                'estado': estado,
+                'valor': valor,
+                'nivel': soporte.nivel_ocr,
+                'duplicado_de': soporte.duplicado_de,
+            })
+    finally:
+        ocr.close()
+        iterador.close()
+
+    datos = {
+        'version': VERSION,
+        'pdf': os.path.abspath(pdf_path),
+        'hash_pdf': hash_pdf,
+        'paginas_pdf': paginas_pdf,
+        'primera': primera,
+        'ultima': ultima,
+        'paginas': {str(p): regiones for p, regiones in sorted(paginas.items())},
+        'soportes': soportes,
+    }
+    ruta = os.path.join(carpeta, NOMBRE_RESULTADO)
+    with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(ruta + '.tmp', ruta)
+    logger.info(f"Fragmento {primera}-{ultima}: {len(soportes)} soportes en '{carpeta}'")
+    return cargar_fragmento(carpeta)
+
+
+def _validar(fragmentos: List[Fragmento]) -> None:
+    """Todos del mismo PDF, sin solaparse y cubriendo todas sus páginas."""
+    if not fragmentos:
+        raise ValueError("No hay fragmentos que fusionar")
+    hashes = {f.hash_pdf for f in fragmentos}
+    if len(hashes) > 1:
+        raise ValueError("Los fragmentos no son del mismo PDF")
+    cubiertas: Dict[int, str] = {}
+    for fragmento in fragmentos:
+        for pagina in range(fragmento.primera, fragmento.ultima + 1):
+            if pagina in cubiertas:
+                raise ValueError(f"La página {pagina} está en dos fragmentos: "
+                                 f"'{cubiertas[pagina]}' y '{fragmento.carpeta}'")
+            cubiertas[pagina] = fragmento.carpeta
+    faltantes = sorted(set(range(1, fragmentos[0].paginas_pdf + 1)) - set(cubiertas))
+    if faltantes:
+        raise ValueError(f"Faltan fragmentos para {len(faltantes)} páginas (primera: {faltantes[0]})")
+
+
+def _duplicados_entre_fragmentos(entradas: List[Tuple[Fragmento, Dict[str, Any]]]) -> Dict[str, str]:
+    """
+    Original de cada soporte duplicado, por nombre, contando los duplicados
+    entre fragmentos distintos.
+
+    `entradas` va en orden de (página, región). Los originales de cada
+    fragmento se comparan con los de los fragmentos anteriores leyendo sus
+    PNG; los duplicados ya marcados dentro de un fragmento apuntan a la raíz
+    de su original, así que todas las copias quedan con el mismo original
+    que en una ejecución del PDF completo.
+    """
+    indice = IndiceDuplicados()
+    originales: Dict[str, str] = {}
+    for fragmento, s in entradas:
+        nombre = Soporte.nombre_de(s['pagina'], s['region'])
+        if s.get('duplicado_de') is not None:
+            originales[nombre] = originales.get(s['duplicado_de'], s['duplicado_de'])
+            continue
+        with Image.open(fragmento.ruta_png(s)) as img:
+            original = indice.registrar(nombre, img)
+        if original is not None:
+            originales[nombre] = original
+            logger.info(f"Soporte {nombre} duplicado de {original} (en otro fragmento)")
+    return originales
+
+
+def fusionar_fragmentos(
+    carpetas: List[str],
+    excel_path: str,
+    output_dir: str,
+    margen: float = 100.0,
+    workers: Optional[int] = None,
+    log: Optional[Callable[[str], None]] = None,
+    asignacion: str = 'secuencial'
+) -> ResumenFlujo:
+    """
+    Asigna TBs a los soportes de todos los fragmentos y genera los PDFs.
+
+    Los soportes se emparejan en orden de (página, región), igual que en
+    `pipeline.ejecutar_flujo` con el PDF completo. Lo hecho se anota en el
+    mismo diario de `output_dir`, así que repetir la fusión reutiliza las
+    TBs ya asignadas en lugar de reclamar otras.
+
+    Args:
+        carpetas: Carpetas de los fragmentos, en cualquier orden.
+        excel_path: Excel de TBs.
+        output_dir: Carpeta de salida de PDFs (y del diario).
+        margen: Margen en pesos para emparejar.
+        workers: Procesos de generación de PDFs. None usa uno por núcleo.
+        log: Función para mensajes de progreso (por defecto, el logger).
+        asignacion: 'secuencial' o 'global' (ver `matcher.matchear_soportes`).
+
+    Returns:
+        ResumenFlujo: Totales de la fusión.
+    """
+    if asignacion not in MODOS_ASIGNACION:
+        raise ValueError(f"Modo de asignación desconocido: {asignacion}")
+    log = log or logger.info
+    fragmentos = [cargar_fragmento(c) for c in carpetas]
+    _validar(fragmentos)
+    hash_pdf = fragmentos[0].hash_pdf
+    log(f"Fusionando {len(fragmentos)} fragmentos ({fragmentos[0].paginas_pdf} páginas)")
+
+    resumen = ResumenFlujo()
+    excel_id = os.path.abspath(excel_path)
+    diario = DiarioEjecucion(output_dir)
+    try:
+        previo = diario.cargar(hash_pdf)
+        entradas: List[Tuple[Fragmento, Dict[str, Any]]] = []
+        for fragmento in fragmentos:
+            for pagina, regiones in fragmento.paginas.items():
+                diario.registrar('pagina', hash_pdf, pagina=pagina, regiones=regiones)
+            entradas.extend((fragmento, s) for s in fragmento.soportes)
+        entradas.sort(key=lambda e: (e[1]['pagina'], e[1]['region']))
+
+        if len(fragmentos) > 1 and deteccion_habilitada():
+            duplicados = _duplicados_entre_fragmentos(entradas)
+        else:
+            duplicados = {Soporte.nombre_de(s['pagina'], s['region']): s['duplicado_de']
+                          for _, s in entradas if s.get('duplicado_de') is not None}
+
+        items = []
+        # Ruta del PNG -> hash de la imagen y (página, región) del soporte
+        hashes: Dict[str, str] = {}
+        origen: Dict[str, Tuple[int, int]] = {}
+        for fragmento, s in entradas:
+            duplicado_de = duplicados.get(Soporte.nombre_de(s['pagina'], s['region']))
+            diario.registrar('region', hash_pdf, pagina=s['pagina'], region=s['region'],
+                             caja=s['caja'], imagen=s['imagen'])
+            diario.registrar('ocr', hash_pdf, pagina=s['pagina'], region=s['region'],
+                             estado=s['estado'], valor=s['valor'], nivel=s.get('nivel'),
+                             duplicado_de=duplicado_de)
+            if duplicado_de is not None:
+                # Copia de otro soporte: su TB, si la hay, es la del original
+                resumen.duplicados += 1
+                continue
+            # El PNG se llama como el soporte: el emparejador reconoce así sus asignaciones previas
+            ruta = fragmento.ruta_png(s)
+            hashes[ruta] = s['imagen']
+            origen[ruta] = (s['pagina'], s['region'])
+            items.append((ruta, s['estado'], s['valor']))
+        resumen.soportes = len(items) + resumen.duplicados
+        df = leer_excel(excel_path)
+        log(f"Transacciones en Excel: {len(df)}")
+        asignaciones = reconciliar_usado(previo, df, excel_id, margen, log)
+        emparejador = Emparejador(df, margen, asignaciones)
+        if asignacion == 'global':
+            resultados = emparejador.emparejar_lote(items)
+        else:
+            resultados = [emparejador.emparejar(*item) for item in items]
+        emparejador.finalizar()
+
+        a_generar, entradas_pdf = [], []
+        for res in resultados:
+            if res['tb_idx'] is None:
+                continue
+            resumen.emparejados += 1
+            pagina, region = origen[res['soporte']]
+            diario.registrar('tb', hash_pdf, sincronizar=True, pagina=pagina, region=region,
+                             tb=int(df.index.get_loc(res['tb_idx'])), excel=excel_id)
+            entrada = hash_entrada_pdf(hashes[res['soporte']], *datos_tb(res['tb_info']))
+            anterior = previo.soportes.get((pagina, region))
+            if (anterior is not None and anterior.entrada_pdf == entrada
+                    and anterior.pdf and os.path.isfile(anterior.pdf)):
+                resumen.pdfs_reutilizados += 1
+                continue
+            a_generar.append(res)
+            entradas_pdf.append(entrada)
+        log(f"Soportes fusionados: {resumen.soportes}, emparejados: {resumen.emparejados}")
+        if resumen.duplicados:
+            log(f"Soportes duplicados (sin TB propia): {resumen.duplicados}")
+
+        guardar_excel(df, excel_path)
+        log("Excel actualizado con marcas de usados.")
+
+        rutas = generar_pdfs(a_generar, output_dir, workers=workers)
+        for res, entrada, ruta in zip(a_generar, entradas_pdf, rutas):
+            pagina, region = origen[res['soporte']]
+            diario.registrar('salida', hash_pdf, pagina=pagina, region=region,
+                             ruta=os.path.abspath(ruta), entrada=entrada)
+        resumen.pdfs = len(rutas)
+        if resumen.pdfs_reutilizados:
+            log(f"PDFs sin cambios reutilizados: {resumen.pdfs_reutilizados}")
+        log(f"PDFs generados: {resumen.pdfs}")
+    finally:
+        diario.cerrar()
+    return resumen
+
@@ -0,0 +1,126 @@
+from bisect import bisect_left, bisect_right
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_SIN_LIBRE = np.iinfo(np.int64).max
+
+
+class IndiceTBs:
+    """
+    Índice de TBs ordenado por 'Valor' para buscar transacciones libres.
+
+    Responde "primera TB libre con valor dentro de ±margen" con la misma
+    semántica que `excel_reader.obtener_transaccion_libre` (la de menor
+    posición en el DataFrame), pero en tiempo logarítmico:
+
+    - los valores se ordenan una vez en un arreglo NumPy y el rango
+      [valor - margen, valor + margen] se localiza con bisect;
+    - un árbol de segmentos sobre ese orden guarda la menor posición libre de
+      cada tramo, así que la consulta y la marca de usado son O(log n);
+    - el estado 'usado' vive en un bitmap compacto que se vuelca a la
+      columna del DataFrame en un solo paso con `sincronizar`.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = df
+        valores = pd.to_numeric(df['Valor'], errors='coerce').to_numpy(dtype=float)
+        usados = df['usado'].fillna(False).astype(bool).to_numpy() if 'usado' in df.columns \
+            else np.zeros(len(df), dtype=bool)
+
+        self._n_filas = len(df)
+        self._bitmap = np.packbits(usados, bitorder='little')
+
+        # Las filas sin valor numérico nunca coinciden, igual que con between()
+        posiciones = np.flatnonzero(~np.isnan(valores))
+        orden = posiciones[np.argsort(valores[posiciones], kind='stable')]
+        self._valores = valores[orden].tolist()
+        self._posiciones = orden
+        self._rango = np.full(self._n_filas, -1, dtype=np.int64)
+        self._rango[orden] = np.arange(len(orden))
+
+        tamano = 1
+        while tamano < max(1, len(orden)):
+            tamano *= 2
+        arbol = np.full(2 * tamano, _SIN_LIBRE, dtype=np.int64)
+        arbol[tamano:tamano + len(orden)] = np.where(usados[orden], _SIN_LIBRE, orden)
+        nivel = tamano
+        while nivel > 1:
+            arbol[nivel // 2:nivel] = np.minimum(arbol[nivel:2 * nivel:2], arbol[nivel + 1:2 * nivel:2])
+            nivel //= 2
+        self._tamano = tamano
+        self._arbol = arbol.tolist()
+
+    def __len__(self) -> int:
+        return self._n_filas
+
+    def _minimo(self, inicio: int, fin: int) -> int:
+        """Menor posición libre entre los rangos ordenados [inicio, fin)."""
+        arbol = self._arbol
+        minimo = _SIN_LIBRE
+        inicio += self._tamano
+        fin += self._tamano
+        while inicio < fin:
+            if inicio & 1:
+                minimo = min(minimo, arbol[inicio])
+                inicio += 1
+            if fin & 1:
+                fin -= 1
+                minimo = min(minimo, arbol[fin])
+            inicio //= 2
+            fin //= 2
+        return minimo
+
+    def buscar_libre(self, valor_soporte: float, margen: float = 100.0) -> int:
+        """Devuelve la posición de la primera TB libre dentro de ±margen, o -1."""
+        inicio = bisect_left(self._valores, valor_soporte - margen)
+        fin = bisect_right(self._valores, valor_soporte + margen)
+        if inicio >= fin:
+            return -1
+        posicion = self._minimo(inicio, fin)
+        return -1 if posicion == _SIN_LIBRE else int(posicion)
+
+    def obtener_transaccion_libre(
+        self, valor_soporte: float, margen: float = 100.0
+    ) -> Tuple[int, Optional[pd.Series]]:
+        """Equivalente indexado de `excel_reader.obtener_transaccion_libre`."""
+        posicion = self.buscar_libre(valor_soporte, margen)
+        if posicion < 0:
+            logger.debug(f"No se encontró transacción libre para valor {valor_soporte}")
+            return -1, None
+        idx = self._df.index[posicion]
+        logger.debug(f"Transacción libre encontrada en índice {idx} para valor {valor_soporte}")
+        return idx, self._df.iloc[posicion]
+
+    def esta_usado(self, posicion: int) -> bool:
+        return bool(self._bitmap[posicion >> 3] & (1 << (posicion & 7)))
+
+    def marcar_usado_posicion(self, posicion: int) -> None:
+        self._bitmap[posicion >> 3] |= np.uint8(1 << (posicion & 7))
+        rango = int(self._rango[posicion])
+        if rango < 0:
+            return
+        nodo = rango + self._tamano
+        arbol = self._arbol
+        arbol[nodo] = _SIN_LIBRE
+        nodo //= 2
+        while nodo:
+            arbol[nodo] = min(arbol[2 * nodo], arbol[2 * nodo + 1])
+            nodo //= 2
+
+    def marcar_usado(self, idx) -> None:
+        """Marca como usada la TB con etiqueta `idx` del DataFrame."""
+        self.marcar_usado_posicion(self._df.index.get_loc(idx))
+        logger.debug(f"Transacción en índice {idx} marcada como usada.")
+
+    def usados(self) -> np.ndarray:
+        return np.unpackbits(self._bitmap, count=self._n_filas, bitorder='little').astype(bool)
+
+    def sincronizar(self, df: Optional[pd.DataFrame] = None) -> None:
+        """Vuelca el bitmap a la columna 'usado' del DataFrame en un solo paso."""
+        df = self._df if df is None else df
+        df['usado'] = self.usados()
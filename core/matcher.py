@@ -1,70 +1,309 @@
+from __future__ import annotations
+
 import logging
-from typing import List, Dict, Any
+import os
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+from core.asignacion import ResultadoAsignacion, asignar_global
+from core.duplicados import marcar_duplicados
+from core.soporte import Soporte
+from utils.paralelo import EstadisticasTrabajadores, mapear_ordenado, resolver_workers
+from utils import metricas
 
-from core.ocr_processor import procesar_soporte
-from core.excel_reader import obtener_transaccion_libre, marcar_usado
-import pandas as pd
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas y la pila de OCR se importan al usarse, no al importar el módulo
 
 logger = logging.getLogger(__name__)
 
+# 'secuencial': cada soporte toma la primera TB libre del margen según llega.
+# 'global': se espera a tener todos los valores y se minimiza la desviación total.
+MODOS_ASIGNACION = ('secuencial', 'global')
+
+
+# Nivel de OCR de un soporte que copia el resultado de su original
+NIVEL_DUPLICADO = 'duplicado'
+
+
+def _carga_ocr(soporte: Union[str, Soporte]) -> Union[str, Soporte, Tuple[str, float]]:
+    # Un Soporte con OCR ya conocido (p. ej. de una ejecución anterior) no
+    # viaja al pool: solo se envían su estado y valor. Un duplicado tampoco:
+    # `ocr_soportes` le copia el resultado de su original
+    if isinstance(soporte, Soporte) and soporte.estado is not None:
+        return soporte.estado, soporte.valor
+    if isinstance(soporte, Soporte) and soporte.duplicado_de is not None:
+        return 'ERROR', 0.0
+    return soporte
+
+
+def _ocr_tarea(tarea: Union[str, Soporte, Tuple[str, float]]) -> Tuple[str, float, Optional[str]]:
+    if isinstance(tarea, tuple):
+        return tarea[0], tarea[1], None
+    from core.ocr_processor import procesar_soporte
+    estado, valor = procesar_soporte(tarea)
+    # El nivel de la cascada se anota en la copia del Soporte del trabajador;
+    # se devuelve para anotarlo también en el original
+    return estado, valor, getattr(tarea, 'nivel_ocr', None)
+
+
+def ocr_soportes(
+    soportes: Iterable[Union[str, Soporte]],
+    workers: Optional[int] = None,
+    max_en_vuelo: Optional[int] = None,
+    estadisticas: Optional[EstadisticasTrabajadores] = None
+) -> Iterator[Tuple[Union[str, Soporte], str, float]]:
+    """
+    Ejecuta el OCR de los soportes en un pool de procesos y entrega
+    (soporte, estado, valor) en el orden de `soportes`, rellenando estado,
+    valor y nivel de OCR de cada Soporte. `workers=1` ejecuta el OCR en
+    este proceso.
+
+    Los Soportes marcados con `duplicado_de` (ver `duplicados`) no pasan por
+    tesseract: reciben el estado y valor de su original, que llega antes.
+    """
+    ocr = mapear_ordenado(
+        _ocr_tarea,
+        soportes,
+        workers=workers,
+        max_en_vuelo=max_en_vuelo,
+        estadisticas=estadisticas,
+        con_item=True,
+        carga=_carga_ocr
+    )
+    # Nombre -> (estado, valor) de los originales, para sus duplicados
+    leidos: Dict[str, Tuple[str, float]] = {}
+    for soporte, (estado, valor, nivel) in ocr:
+        if isinstance(soporte, Soporte):
+            if soporte.duplicado_de is not None:
+                if soporte.duplicado_de in leidos:
+                    estado, valor = leidos[soporte.duplicado_de]
+                else:
+                    logger.warning(f"Soporte {soporte.nombre}: su original {soporte.duplicado_de} "
+                                   f"no tiene OCR en esta ejecución")
+                nivel = NIVEL_DUPLICADO
+            else:
+                leidos[soporte.nombre] = (estado, valor)
+            soporte.estado, soporte.valor = estado, valor
+            if nivel is not None:
+                soporte.nivel_ocr = nivel
+        yield soporte, estado, valor
+
+
+def _nombre_soporte(soporte: Union[str, Soporte]) -> str:
+    if isinstance(soporte, Soporte):
+        return soporte.nombre
+    return os.path.splitext(os.path.basename(str(soporte)))[0]
+
+
+class Emparejador:
+    """
+    Asigna a cada soporte ABONADO la primera TB libre dentro del margen, de
+    uno en uno y en el orden en que llegan (`emparejar`), o a todos a la vez
+    minimizando la desviación total (`emparejar_lote`), marcándolas como usadas.
+
+    Args:
+        df_tbs: DataFrame de TBs con columna 'usado'.
+        margen: Margen en pesos para coincidencia de valores.
+        asignaciones_previas: Nombre de soporte -> posición de la TB que ya se
+            le asignó en una ejecución anterior; se reutiliza sin buscar. La
+            fila debe estar ya marcada como usada en `df_tbs`. Si los soportes
+            son rutas, el nombre es el del PNG sin extensión (el que le da
+            `extractor`).
+    """
+
+    def __init__(
+        self,
+        df_tbs: pd.DataFrame,
+        margen: float = 100.0,
+        asignaciones_previas: Optional[Dict[str, int]] = None
+    ):
+        from core.indice_tbs import IndiceTBs
+
+        self.df_tbs = df_tbs
+        self.margen = margen
+        self.indice = IndiceTBs(df_tbs)
+        self.asignaciones_previas = asignaciones_previas or {}
+        self.total = 0
+        self.emparejados = 0
+        # Del último emparejar_lote: costo y empates de la asignación global
+        self.asignacion: Optional[ResultadoAsignacion] = None
+
+    def _resultado(self, soporte: Union[str, Soporte], estado: str, valor: float) -> Tuple[Dict[str, Any], bool]:
+        """
+        Crea el resultado y resuelve los casos que no necesitan buscar TB.
+        Devuelve (resultado, pendiente de asignar).
+        """
+        resultado = {
+            'soporte': soporte,
+            'estado': estado,
+            'valor_soporte': valor,
+            'tb_idx': None,
+            'tb_info': None,
+            'duplicado_de': soporte.duplicado_de if isinstance(soporte, Soporte) else None
+        }
+        self.total += 1
+
+        if resultado['duplicado_de'] is not None:
+            # La TB, si la hay, ya es de su original: no se empareja dos veces
+            metricas.contar('matcher.duplicados')
+            logger.debug(f"Soporte {soporte} duplicado de {resultado['duplicado_de']}, no se empareja")
+            return resultado, False
+
+        if estado != 'ABONADO':
+            metricas.contar('matcher.rechazados')
+            logger.debug(f"Soporte rechazado: {soporte} con estado {estado}")
+            return resultado, False
+        nombre = _nombre_soporte(soporte)
+        if nombre in self.asignaciones_previas:
+            self._asignar(resultado, self.asignaciones_previas[nombre])
+            metricas.contar('matcher.reutilizados')
+            logger.debug(f"Soporte {soporte} conserva TB idx={resultado['tb_idx']} de la ejecución anterior")
+            return resultado, False
+        return resultado, True
+
+    def _asignar(self, resultado: Dict[str, Any], posicion: int) -> None:
+        resultado['tb_idx'] = self.df_tbs.index[posicion]
+        resultado['tb_info'] = self.df_tbs.iloc[posicion]
+        self.emparejados += 1
+
+    def emparejar(self, soporte: Union[str, Soporte], estado: str, valor: float) -> Dict[str, Any]:
+        resultado, pendiente = self._resultado(soporte, estado, valor)
+        if pendiente:
+            with metricas.etapa('matcher.busqueda'):
+                idx, tb = self.indice.obtener_transaccion_libre(valor, self.margen)
+                if tb is not None:
+                    self.indice.marcar_usado(idx)
+            if tb is not None:
+                resultado['tb_idx'] = idx
+                resultado['tb_info'] = tb
+                self.emparejados += 1
+                metricas.contar('matcher.emparejados')
+                logger.debug(f"Soporte {soporte} emparejado con TB idx={idx}")
+            else:
+                metricas.contar('matcher.sin_tb')
+                logger.warning(f"No se emparejó TB para soporte {soporte}")
+        return resultado
+
+    def emparejar_lote(
+        self, items: Sequence[Tuple[Union[str, Soporte], str, float]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Empareja todos los soportes a la vez con `asignacion.asignar_global`:
+        máximo número de pares y, entre esos, mínima desviación total.
+        """
+        import numpy as np
+        import pandas as pd
+
+        resultados, pendientes = [], []
+        for soporte, estado, valor in items:
+            resultado, pendiente = self._resultado(soporte, estado, valor)
+            resultados.append(resultado)
+            if pendiente:
+                pendientes.append(resultado)
+
+        valores_tb = pd.to_numeric(self.df_tbs['Valor'], errors='coerce').to_numpy(dtype=float)
+        libres = ~self.indice.usados() & ~np.isnan(valores_tb)
+        with metricas.etapa('matcher.asignacion_global'):
+            asignacion = asignar_global([r['valor_soporte'] for r in pendientes], valores_tb, libres, self.margen)
+        self.asignacion = asignacion
+
+        for i, resultado in enumerate(pendientes):
+            posicion = asignacion.asignaciones.get(i)
+            if posicion is None:
+                metricas.contar('matcher.sin_tb')
+                logger.warning(f"No se emparejó TB para soporte {resultado['soporte']}")
+                continue
+            self.indice.marcar_usado_posicion(posicion)
+            self._asignar(resultado, posicion)
+            metricas.contar('matcher.emparejados')
+            logger.debug(f"Soporte {resultado['soporte']} emparejado con TB idx={resultado['tb_idx']}")
+        for i in asignacion.empates:
+            logger.debug(f"Empate: el soporte {pendientes[i]['soporte']} admite otra TB con el mismo costo")
+        metricas.contar('matcher.empates', len(asignacion.empates))
+        logger.info(f"Asignación global: {len(asignacion.asignaciones)} de {len(pendientes)} soportes, "
+                    f"desviación total {asignacion.costo:.2f}, {len(asignacion.empates)} empates")
+        return resultados
+
+    def finalizar(self) -> None:
+        """Vuelca las marcas de 'usado' al DataFrame."""
+        self.indice.sincronizar(self.df_tbs)
+        logger.info(f"Emparejamiento: {self.emparejados} de {self.total} soportes con TB")
+
 
 def matchear_soportes(
-    soporte_paths: List[str],
+    soportes: Iterable[Union[str, Soporte]],
     df_tbs: pd.DataFrame,
-    margen: float = 100.0
+    margen: float = 100.0,
+    paralelo: bool = True,
+    workers: Optional[int] = None,
+    max_en_vuelo: Optional[int] = None,
+    asignaciones_previas: Optional[Dict[str, int]] = None,
+    al_resultado: Optional[Callable[[Dict[str, Any]], None]] = None,
+    asignacion: str = 'secuencial'
 ) -> List[Dict[str, Any]]:
     """
     Empareja soportes con transacciones bancarias.
 
+    El OCR se reparte en un pool de procesos, pero los resultados se recogen
+    en el orden de `soportes` y el emparejamiento contra `df_tbs` es
+    secuencial, de modo que la asignación de 'usado' es idéntica a la serie.
+
     Args:
-        soporte_paths: Lista de rutas a imágenes de soportes.
+        soportes: Rutas a imágenes o Soportes en memoria. Puede ser un
+            generador (por ejemplo `extractor.iterar_soportes`): el OCR
+            empieza mientras se siguen extrayendo páginas.
         df_tbs: DataFrame de TBs con columna 'usado'.
         margen: Margen en pesos para coincidencia de valores.
+        paralelo: Si es False, el OCR se ejecuta en serie en este proceso.
+        workers: Procesos de OCR. None usa un proceso por núcleo.
+        max_en_vuelo: Máximo de soportes enviados al pool sin recoger.
+        asignaciones_previas: Ver `Emparejador`.
+        al_resultado: Se llama con cada resultado en cuanto se empareja.
+        asignacion: 'secuencial' (primera TB libre, según llegan) o 'global'
+            (todos a la vez con mínima desviación total; ver `asignacion`).
 
     Returns:
         Lista de diccionarios con la información de emparejamiento:
         {
-            'soporte': ruta soporte,
+            'soporte': ruta o Soporte (con estado y valor rellenados),
             'estado': 'ABONADO'|'RECHAZADO'|'ERROR',
             'valor_soporte': float,
             'tb_idx': índice en df_tbs o None,
-            'tb_info': Serie de la TB o None
+            'tb_info': Serie de la TB o None,
+            'duplicado_de': nombre del original si el soporte es un duplicado
+                (entonces no se empareja), o None
         }
     """
+    if asignacion not in MODOS_ASIGNACION:
+        raise ValueError(f"Modo de asignación desconocido: {asignacion}")
     resultados = []
+    emparejador = Emparejador(df_tbs, margen, asignaciones_previas)
+    estadisticas = EstadisticasTrabajadores()
+    workers = resolver_workers(workers) if paralelo else 1
+    if isinstance(soportes, Sequence):
+        workers = min(workers, max(1, len(soportes)))
 
-    for path in soporte_paths:
-        estado, valor = procesar_soporte(path)
-        resultado = {
-            'soporte': path,
-            'estado': estado,
-            'valor_soporte': valor,
-            'tb_idx': None,
-            'tb_info': None
-        }
-
-        if estado != 'ABONADO':
-            logger.info(f"Soporte rechazado: {path} con estado {estado}")
+    ocr = ocr_soportes(marcar_duplicados(soportes), workers, max_en_vuelo, estadisticas)
+    if asignacion == 'global':
+        resultados = emparejador.emparejar_lote(list(ocr))
+        if al_resultado is not None:
+            for resultado in resultados:
+                al_resultado(resultado)
+    else:
+        for soporte, estado, valor in ocr:
+            resultado = emparejador.emparejar(soporte, estado, valor)
             resultados.append(resultado)
-            continue
-
-        idx, tb = obtener_transaccion_libre(df_tbs, valor, margen)
-        if idx >= 0 and isinstance(tb, pd.Series):
-            marcar_usado(df_tbs, idx)
-            resultado['tb_idx'] = idx
-            resultado['tb_info'] = tb
-            logger.info(f"Soporte {path} emparejado con TB idx={idx}")
-        else:
-            logger.warning(f"No se emparejó TB para soporte {path}")
-
-        resultados.append(resultado)
+            if al_resultado is not None:
+                al_resultado(resultado)
 
+    emparejador.finalizar()
+    estadisticas.resumen("OCR de soportes")
     return resultados
 
 
 if __name__ == '__main__':
     import argparse
-    import os
     from core.excel_reader import leer_excel, guardar_excel
 
     parser = argparse.ArgumentParser(description='Empareja soportes con TBs')
@@ -72,6 +311,12 @@ if __name__ == '__main__':
     parser.add_argument('excel_path', help='Ruta al Excel de TBs')
     parser.add_argument('--margen', type=float, default=100.0,
                         help='Margen en pesos para emparejar')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos de OCR (por defecto, uno por núcleo)')
+    parser.add_argument('--serie', action='store_true',
+                        help='Ejecuta el OCR en serie, sin pool de procesos')
+    parser.add_argument('--asignacion', choices=MODOS_ASIGNACION, default='secuencial',
+                        help='Primera TB libre por soporte o asignación global de mínima desviación')
     args = parser.parse_args()
 
     soporte_paths = [os.path.join(args.soportes_dir, f)
@@ -79,7 +324,9 @@ if __name__ == '__main__':
                      if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
 
     df = leer_excel(args.excel_path)
-    resultados = matchear_soportes(soporte_paths, df, args.margen)
+    resultados = matchear_soportes(soporte_paths, df, args.margen,
+                                   paralelo=not args.serie, workers=args.workers,
+                                   asignacion=args.asignacion)
     guardar_excel(df, args.excel_path)
 
     # Imprimir resumen
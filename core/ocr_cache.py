@@ -0,0 +1,145 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+from PIL import Image
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+NOMBRE_ARCHIVO = 'ocr_cache.sqlite3'
+MAX_BYTES_DEFECTO = 256 * 1024 * 1024
+# Cada cuántas escrituras se comprueba el límite de tamaño
+INTERVALO_PODA = 200
+
+
+def directorio_cache() -> str:
+    """Carpeta de la caché: AUTOMATCHER_CACHE_DIR o ~/.cache/automatcher."""
+    return os.environ.get('AUTOMATCHER_CACHE_DIR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'automatcher'
+    )
+
+
+def cache_habilitada() -> bool:
+    return os.environ.get('AUTOMATCHER_CACHE', '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def clave_imagen(img: Image.Image, ajustes: str) -> str:
+    """
+    Calcula la clave de contenido de un soporte.
+
+    Se usan los píxeles decodificados (modo, tamaño y bytes) y no el archivo,
+    de modo que el mismo soporte da la misma clave sin importar cómo se
+    codificó. `ajustes` describe el preprocesado y la configuración de tesseract.
+    """
+    h = hashlib.sha256()
+    h.update(ajustes.encode('utf-8'))
+    h.update(f"|{img.mode}|{img.width}x{img.height}|".encode('ascii'))
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+class CacheOCR:
+    """
+    Caché persistente de resultados OCR direccionada por contenido.
+
+    Guarda estado, valor y texto crudo en SQLite en modo WAL, lo que permite
+    lecturas y escrituras concurrentes desde varios procesos trabajadores.
+    Cuando el tamaño supera `max_bytes` se expulsan las entradas usadas hace
+    más tiempo (LRU).
+    """
+
+    def __init__(self, ruta: Optional[str] = None, max_bytes: int = MAX_BYTES_DEFECTO):
+        if ruta is None:
+            ruta = os.path.join(directorio_cache(), NOMBRE_ARCHIVO)
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self._escrituras = 0
+        self._conn = sqlite3.connect(ruta, timeout=30.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr ("
+            " clave TEXT PRIMARY KEY,"
+            " estado TEXT NOT NULL,"
+            " valor REAL NOT NULL,"
+            " texto TEXT NOT NULL,"
+            " tamano INTEGER NOT NULL,"
+            " ultimo_acceso REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_acceso ON ocr (ultimo_acceso)")
+
+    def obtener(self, clave: str) -> Optional[Tuple[str, float, str]]:
+        fila = self._conn.execute(
+            "SELECT estado, valor, texto FROM ocr WHERE clave = ?", (clave,)
+        ).fetchone()
+        if fila is None:
+            return None
+        self._conn.execute(
+            "UPDATE ocr SET ultimo_acceso = ? WHERE clave = ?", (time.time(), clave)
+        )
+        return fila[0], fila[1], fila[2]
+
+    def guardar(self, clave: str, estado: str, valor: float, texto: str) -> None:
+        tamano = len(clave) + len(estado) + len(texto.encode('utf-8')) + 16
+        self._conn.execute(
+            "INSERT OR REPLACE INTO ocr (clave, estado, valor, texto, tamano, ultimo_acceso)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (clave, estado, valor, texto, tamano, time.time())
+        )
+        self._escrituras += 1
+        if self._escrituras % INTERVALO_PODA == 0:
+            self.podar()
+
+    def podar(self) -> int:
+        """Expulsa entradas LRU hasta quedar por debajo del 90% de `max_bytes`."""
+        total = self._conn.execute("SELECT COALESCE(SUM(tamano), 0) FROM ocr").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        objetivo = int(self.max_bytes * 0.9)
+        expulsadas = 0
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self._conn.execute("SELECT clave, tamano FROM ocr ORDER BY ultimo_acceso")
+            claves = []
+            for clave, tamano in cursor:
+                if total <= objetivo:
+                    break
+                claves.append((clave,))
+                total -= tamano
+            self._conn.executemany("DELETE FROM ocr WHERE clave = ?", claves)
+            expulsadas = len(claves)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Caché OCR: {expulsadas} entradas expulsadas por tamaño")
+        return expulsadas
+
+    def cerrar(self) -> None:
+        self._conn.close()
+
+
+_cache_proceso: Optional[Tuple[int, CacheOCR]] = None
+
+
+def obtener_cache() -> Optional[CacheOCR]:
+    """
+    Devuelve la caché del proceso actual, o None si está deshabilitada.
+
+    Cada proceso trabajador abre su propia conexión SQLite.
+    """
+    global _cache_proceso
+    if not cache_habilitada():
+        return None
+    pid = os.getpid()
+    if _cache_proceso is None or _cache_proceso[0] != pid:
+        try:
+            _cache_proceso = (pid, CacheOCR())
+        except Exception as e:
+            logger.warning(f"No se pudo abrir la caché OCR: {e}")
+            return None
+    return _cache_proceso[1]
@@ -1,43 +1,169 @@
-import pytesseract
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image
 import re
-from typing import Tuple
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
+from core.kernels_imagen import a_gris, a_imagen_binaria, preprocesar_lote
+from core.ocr_cache import clave_imagen, obtener_cache
+from core import tesseract_persistente
+from core.soporte import Soporte
 from utils.logger import get_logger
+from utils import metricas
 
 logger = get_logger(__name__)
 
+IDIOMA_OCR = 'spa'
+CONFIG_TESSERACT = ''
+# Incrementar cuando cambie preprocesar_imagen o la cascada para invalidar la caché OCR
+VERSION_PREPROCESADO = 4
+
+# Cascada de OCR (ver `_cascada`):
+# 1. 'estado': todo el soporte a 1/REDUCCION_ESTADO de resolución, para
+#    saber si es ABONADO y dónde están las líneas del estado y del valor. A
+#    esa resolución una letra se lee mal con facilidad, así que un soporte
+#    sin 'abonado' no se rechaza solo con ella: se relee la línea del estado
+#    a resolución completa (psm 7) y se rechaza si dice otra cosa con
+#    confianza. Si no hay línea del estado, el rechazo lo decide el nivel 3.
+# 2. 'valor': la línea del valor a resolución completa, como una sola línea
+#    (psm 7) y solo con dígitos y separadores.
+# 3. 'completo': el soporte entero a resolución completa, si el nivel 1 no
+#    pudo confirmar ni descartar 'abonado' o el nivel 2 no encontró un valor
+#    o lo leyó con poca confianza.
+REDUCCION_ESTADO = 2
+CONFIG_ESTADO = '--psm 7'
+# Confianza media mínima de la línea del estado para rechazar sin nivel 3
+CONFIANZA_MIN_ESTADO = 70.0
+CONFIG_VALOR = '--psm 7 -c tessedit_char_whitelist=0123456789.,$'
+CONFIANZA_MIN_VALOR = 70.0
+# Margen en píxeles (de resolución completa) alrededor de las líneas del estado y del valor
+MARGEN_LINEA_VALOR = 12
+NIVELES_OCR = ('estado', 'valor', 'completo')
+
+PATRON_VALOR = re.compile(r"\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2})")
+# 'abonad' con las confusiones de dígitos y letras habituales a baja resolución
+# (ABONAD0, AB0NADO, A8ONADO...)
+PATRON_ABONADO_REDUCIDO = re.compile(r"[a4][b8][o0]n[a4]d", re.IGNORECASE)
+# Etiqueta del estado y, detrás, la palabra que lo da
+PATRON_LINEA_ESTADO = re.compile(r"[e3][s5]t[a4]d[o0]\W*(\w{4,})?", re.IGNORECASE)
+
+
+@dataclass
+class PalabraOCR:
+    """Palabra reconocida por tesseract con su caja (x, y, ancho, alto) y confianza."""
+    texto: str
+    caja: Tuple[int, int, int, int]
+    confianza: float
+    # Índice de la línea de `ResultadoOCR.texto` a la que pertenece
+    linea: int = 0
+
+
+@dataclass
+class ResultadoOCR:
+    """
+    Resultado de una única pasada de tesseract sobre un soporte.
+
+    Guarda el texto reconstruido línea a línea junto con las palabras, sus
+    cajas y confianzas, para que estado y valor se lean del mismo OCR.
+    """
+    texto: str
+    palabras: List[PalabraOCR] = field(default_factory=list)
+
+    @property
+    def confianza_media(self) -> float:
+        confianzas = [p.confianza for p in self.palabras if p.confianza >= 0]
+        if not confianzas:
+            return -1.0
+        return sum(confianzas) / len(confianzas)
+
+    def caja_linea(self, linea: int) -> Optional[Tuple[int, int, int, int]]:
+        """Caja (x1, y1, x2, y2) que envuelve las palabras de la línea."""
+        cajas = [p.caja for p in self.palabras if p.linea == linea]
+        if not cajas:
+            return None
+        return (min(x for x, _, _, _ in cajas), min(y for _, y, _, _ in cajas),
+                max(x + w for x, _, w, _ in cajas), max(y + h for _, y, _, h in cajas))
+
 
 def preprocesar_imagen(img: Image.Image) -> Image.Image:
-    img = img.convert("L")
-    img = img.filter(ImageFilter.MedianFilter())
-    enhancer = ImageEnhance.Contrast(img)
-    img = enhancer.enhance(2)
-    img = img.point(lambda x: 0 if x < 128 else 255, '1')
-    return img
+    return a_imagen_binaria(preprocesar_lote(a_gris(img), factor_contraste=2, umbral=128))
+
+
+def ejecutar_ocr(img: Image.Image, config: str = CONFIG_TESSERACT) -> ResultadoOCR:
+    """
+    Ejecuta tesseract una sola vez sobre la imagen mediante image_to_data.
+
+    Usa el tesseract persistente de este proceso (`tesseract_persistente`)
+    si está activado y, si no, un proceso nuevo con pytesseract.
 
+    Args:
+        img (PIL.Image.Image): Imagen ya preprocesada.
+        config (str): Opciones adicionales de tesseract.
 
-def extraer_estado(img: Image.Image) -> str:
+    Returns:
+        ResultadoOCR: Texto, palabras, cajas y confianzas del soporte.
+    """
+    # pytesseract importa pandas al cargarse: solo se paga al primer OCR
+    import pytesseract
+
+    datos = tesseract_persistente.image_to_data(img, IDIOMA_OCR, config)
+    if datos is None:
+        datos = pytesseract.image_to_data(
+            img, lang=IDIOMA_OCR, config=config, output_type=pytesseract.Output.DICT
+        )
+
+    palabras: List[PalabraOCR] = []
+    lineas: List[List[str]] = []
+    linea_actual = None
+    for i, texto in enumerate(datos['text']):
+        texto = (texto or '').strip()
+        if not texto:
+            continue
+        clave = (datos['block_num'][i], datos['par_num'][i], datos['line_num'][i])
+        if clave != linea_actual:
+            lineas.append([])
+            linea_actual = clave
+        lineas[-1].append(texto)
+        caja = (datos['left'][i], datos['top'][i], datos['width'][i], datos['height'][i])
+        palabras.append(PalabraOCR(texto, caja, float(datos['conf'][i]), len(lineas) - 1))
+
+    return ResultadoOCR(
+        texto="\n".join(" ".join(linea) for linea in lineas),
+        palabras=palabras
+    )
+
+
+def _como_resultado(ocr: Union[ResultadoOCR, Image.Image]) -> ResultadoOCR:
+    if isinstance(ocr, ResultadoOCR):
+        return ocr
+    return ejecutar_ocr(ocr)
+
+
+def extraer_estado(ocr: Union[ResultadoOCR, Image.Image]) -> str:
     try:
-        texto = pytesseract.image_to_string(img, lang='spa')
+        texto = _como_resultado(ocr).texto
         for linea in texto.splitlines():
             if 'abonado' in linea.lower():
-                logger.info("Estado encontrado: ABONADO")
+                logger.debug("Estado encontrado: ABONADO")
                 return "ABONADO"
-        logger.info("Estado no encontrado o diferente a 'ABONADO'")
+        logger.debug("Estado no encontrado o diferente a 'ABONADO'")
         return "RECHAZADO"
     except Exception as e:
         logger.error(f"Error en OCR de estado: {e}")
         return "ERROR"
 
 
-def extraer_valor(img: Image.Image) -> float:
+def _leer_valor(texto: str) -> Optional[float]:
+    coincidencias = PATRON_VALOR.findall(texto)
+    if not coincidencias:
+        return None
+    return round(float(coincidencias[-1].replace(".", "").replace(",", ".")), 2)
+
+
+def extraer_valor(ocr: Union[ResultadoOCR, Image.Image]) -> float:
     try:
-        texto = pytesseract.image_to_string(img, lang='spa')
-        coincidencias = re.findall(r"\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2})", texto)
-        if coincidencias:
-            valor_texto = coincidencias[-1].replace(".", "").replace(",", ".")
-            valor = round(float(valor_texto), 2)
-            logger.info(f"Valor extraído: {valor}")
+        valor = _leer_valor(_como_resultado(ocr).texto)
+        if valor is not None:
+            logger.debug(f"Valor extraído: {valor}")
             return valor
         else:
             logger.warning("No se encontró valor en el texto OCR")
@@ -47,13 +173,184 @@ def extraer_valor(img: Image.Image) -> float:
         return -1.0
 
 
-def procesar_soporte(imagen_path: str) -> Tuple[str, float]:
+@lru_cache(maxsize=1)
+def ajustes_ocr() -> str:
+    """Describe preprocesado y configuración de tesseract para la clave de caché."""
+    try:
+        import pytesseract
+        version = str(pytesseract.get_tesseract_version())
+    except Exception:
+        version = 'desconocida'
+    return (f"pre=v{VERSION_PREPROCESADO}|lang={IDIOMA_OCR}"
+            f"|config={CONFIG_TESSERACT}|estado=1/{REDUCCION_ESTADO}"
+            f"|linea_estado={CONFIG_ESTADO}@{CONFIANZA_MIN_ESTADO:g}"
+            f"|valor={CONFIG_VALOR}@{CONFIANZA_MIN_VALOR:g}|tesseract={version}")
+
+
+def _abrir_imagen(soporte: Union[str, Soporte, Image.Image]) -> Image.Image:
+    if isinstance(soporte, Soporte):
+        return soporte.imagen
+    if isinstance(soporte, Image.Image):
+        return soporte
+    return Image.open(soporte)
+
+
+def _ocr_medido(img: Image.Image, config: str = CONFIG_TESSERACT) -> ResultadoOCR:
+    with metricas.etapa('ocr.tesseract'):
+        ocr = ejecutar_ocr(img, config)
+    metricas.contar('ocr.llamadas')
+    return ocr
+
+
+def _linea_valor(ocr: ResultadoOCR) -> Optional[int]:
+    """Línea con el último importe reconocido o, si no hay ninguno, la que dice 'valor'."""
+    lineas = ocr.texto.splitlines()
+    for i in range(len(lineas) - 1, -1, -1):
+        if PATRON_VALOR.search(lineas[i]):
+            return i
+    for i, linea in enumerate(lineas):
+        if 'valor' in linea.lower():
+            return i
+    return None
+
+
+def _linea_estado(ocr: ResultadoOCR) -> Optional[int]:
+    """Primera línea con la etiqueta del estado."""
+    for i, linea in enumerate(ocr.texto.splitlines()):
+        if PATRON_LINEA_ESTADO.search(linea):
+            return i
+    return None
+
+
+def _recortar_linea(ocr_estado: ResultadoOCR, linea: Optional[int], completa: Image.Image) -> Optional[Image.Image]:
+    """Recorte a resolución completa de una línea del OCR reducido, con margen."""
+    caja = ocr_estado.caja_linea(linea) if linea is not None else None
+    if caja is None:
+        return None
+    x1, y1, x2, y2 = (c * REDUCCION_ESTADO for c in caja)
+    m = MARGEN_LINEA_VALOR
+    return completa.crop((max(0, x1 - m), max(0, y1 - m),
+                          min(completa.width, x2 + m), min(completa.height, y2 + m)))
+
+
+def _cascada(img: Image.Image) -> Tuple[str, float, str, str]:
+    """
+    Lee estado y valor con la cascada de niveles descrita en NIVELES_OCR.
+
+    Llamadas a tesseract por soporte: 2 en los casos habituales (reducido y
+    línea del estado para un rechazo, reducido y línea del valor para un
+    ABONADO); una más si hay que leer el soporte completo y hasta 4 si el
+    'abonado' solo se ve en la línea del estado y el valor no se lee en la
+    suya.
+
+    Returns:
+        (estado, valor, nivel que dio la respuesta, texto OCR del último nivel)
+    """
+    # Nivel 1: estado sobre una versión reducida de todo el soporte
+    with metricas.etapa('ocr.preprocesado'):
+        reducida = preprocesar_imagen(img.reduce(REDUCCION_ESTADO) if REDUCCION_ESTADO > 1 else img)
+    ocr_estado = _ocr_medido(reducida)
+    abonado = PATRON_ABONADO_REDUCIDO.search(ocr_estado.texto) is not None
+
+    with metricas.etapa('ocr.preprocesado'):
+        completa = preprocesar_imagen(img)
+
+    if not abonado:
+        # Sin 'abonado' a media resolución: solo la línea del estado a resolución completa
+        recorte = _recortar_linea(ocr_estado, _linea_estado(ocr_estado), completa)
+        if recorte is not None:
+            ocr_linea = _ocr_medido(recorte, CONFIG_ESTADO)
+            etiqueta = PATRON_LINEA_ESTADO.search(ocr_linea.texto)
+            if PATRON_ABONADO_REDUCIDO.search(ocr_linea.texto):
+                abonado = True
+            elif (etiqueta is not None and etiqueta.group(1)
+                  and ocr_linea.confianza_media >= CONFIANZA_MIN_ESTADO):
+                return "RECHAZADO", -1.0, 'estado', ocr_linea.texto
+
+    # Nivel 2: solo la línea del valor, como una línea de dígitos
+    recorte = _recortar_linea(ocr_estado, _linea_valor(ocr_estado), completa) if abonado else None
+    if recorte is not None:
+        ocr_valor = _ocr_medido(recorte, CONFIG_VALOR)
+        valor = _leer_valor(ocr_valor.texto)
+        if valor is not None and ocr_valor.confianza_media >= CONFIANZA_MIN_VALOR:
+            return "ABONADO", valor, 'valor', ocr_valor.texto
+
+    # Nivel 3: soporte completo a resolución completa
+    ocr = _ocr_medido(completa)
+    estado = "ABONADO" if abonado else extraer_estado(ocr)
+    return estado, extraer_valor(ocr), 'completo', ocr.texto
+
+
+def procesar_soporte(
+    soporte: Union[str, Soporte, Image.Image],
+    usar_cache: bool = True
+) -> Tuple[str, float]:
+    """
+    Obtiene estado y valor de un soporte con la cascada de OCR: estado a
+    baja resolución (los rechazados terminan al releer su línea del estado),
+    luego solo la línea del valor y, si hace falta, el soporte completo.
+
+    Si `soporte` es un Soporte, en `nivel_ocr` queda el nivel que respondió
+    ('estado', 'valor', 'completo' o 'cache').
+
+    Args:
+        soporte: Ruta a la imagen, Soporte en memoria o imagen PIL.
+        usar_cache: Consultar y alimentar la caché OCR persistente.
+
+    Returns:
+        Tuple[str, float]: Estado ('ABONADO'|'RECHAZADO'|'ERROR') y valor.
+    """
+    with metricas.etapa('ocr.soporte'):
+        estado, valor, nivel = _procesar_soporte(soporte, usar_cache)
+    metricas.contar(f"ocr.estado.{estado.lower()}")
+    if nivel is not None:
+        metricas.contar(f"ocr.nivel.{nivel}")
+        logger.debug(f"Soporte '{soporte}': {estado} {valor} (nivel {nivel})")
+    if isinstance(soporte, Soporte):
+        soporte.nivel_ocr = nivel
+    return estado, valor
+
+
+def _procesar_soporte(
+    soporte: Union[str, Soporte, Image.Image],
+    usar_cache: bool
+) -> Tuple[str, float, Optional[str]]:
+    try:
+        img = _abrir_imagen(soporte)
+    except Exception as e:
+        logger.error(f"Error procesando soporte '{soporte}': {e}")
+        return "ERROR", -1.0, None
+
+    # Un fallo de la caché (base bloqueada o corrupta) no debe costar el OCR:
+    # se registra y se sigue como si no hubiera caché
+    cache, clave = None, None
+    if usar_cache:
+        try:
+            cache = obtener_cache()
+            if cache is not None:
+                clave = clave_imagen(img, ajustes_ocr())
+                guardado = cache.obtener(clave)
+                if guardado is not None:
+                    estado, valor, _ = guardado
+                    metricas.contar('ocr.cache_aciertos')
+                    logger.debug(f"Soporte '{soporte}' resuelto desde caché OCR")
+                    return estado, valor, 'cache'
+                metricas.contar('ocr.cache_fallos')
+        except Exception as e:
+            logger.warning(f"Caché OCR no disponible para '{soporte}': {e}")
+            metricas.contar('ocr.cache_errores')
+            cache = None
+
     try:
-        img = Image.open(imagen_path)
-        img_proc = preprocesar_imagen(img)
-        estado = extraer_estado(img_proc)
-        valor = extraer_valor(img_proc)
-        return estado, valor
+        estado, valor, nivel, texto = _cascada(img)
     except Exception as e:
-        logger.error(f"Error procesando soporte '{imagen_path}': {e}")
-        return "ERROR", -1.0
+        logger.error(f"Error procesando soporte '{soporte}': {e}")
+        return "ERROR", -1.0, None
+
+    if cache is not None and estado != "ERROR":
+        try:
+            cache.guardar(clave, estado, valor, texto)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en la caché OCR el soporte '{soporte}': {e}")
+            metricas.contar('ocr.cache_errores')
+    return estado, valor, nivel
@@ -1,16 +1,89 @@
+from __future__ import annotations
+
 import os
 import logging
-from typing import Dict, Any, List
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple, Union
 from PIL import Image
+from core.soporte import Soporte
 from utils.logger import get_logger  # Importa la función para obtener el logger
+from utils.paralelo import EstadisticasTrabajadores, mapear_ordenado, resolver_workers
+from utils import metricas
+
+if TYPE_CHECKING:
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+# ReportLab se importa al generar el primer PDF (en el proceso que lo genera)
 
 # Obtén el logger usando la función get_logger
 logger = get_logger(__name__)
 
+# PDFs por tarea enviada al pool: amortiza el coste de serializar cada envío
+TAMANO_LOTE = 25
+
+
+def _lector_imagen(soporte: Union[str, Soporte, Image.Image]) -> ImageReader:
+    """Crea un único lector de imagen; los soportes en memoria no tocan disco."""
+    from reportlab.lib.utils import ImageReader
+
+    if isinstance(soporte, Soporte):
+        return ImageReader(soporte.imagen)
+    if isinstance(soporte, Image.Image):
+        return ImageReader(soporte)
+    if not os.path.isfile(soporte):
+        logger.error(f"No se encontró la imagen del soporte: {soporte}")
+        raise FileNotFoundError(f"Imagen no encontrada: {soporte}")
+    return ImageReader(soporte)
+
+
+def datos_tb(tb_info: Any) -> Tuple[str, str]:
+    """Devuelve ('No Egreso', 'Girado a') de la TB como texto, 'NA' si faltan."""
+    no_egreso = str(tb_info.get('No Egreso', 'NA')).strip()
+    girado_a = str(tb_info.get('Girado a', 'NA')).strip()
+    return no_egreso, girado_a
+
+
+def nombre_pdf(tb_info: Any) -> str:
+    """Nombre del PDF de salida para una TB: '<No Egreso> - <Girado a>.pdf'."""
+    no_egreso, girado_a = datos_tb(tb_info)
+    return f"{no_egreso} - {girado_a}.pdf"
+
+
+def _dibujar_pagina(c: canvas.Canvas, lector: ImageReader, no_egreso: str, girado_a: str) -> None:
+    from reportlab.lib.pagesizes import A4
+
+    width, height = A4
+
+    # Dibujar imagen del soporte
+    img_width, img_height = lector.getSize()
+    aspect = img_height / img_width
+    max_width = width * 0.8
+    max_height = height * 0.5
+
+    # Ajustar tamaño manteniendo proporción
+    if img_width > max_width:
+        img_width = max_width
+        img_height = img_width * aspect
+    if img_height > max_height:
+        img_height = max_height
+        img_width = img_height / aspect
+
+    x_img = (width - img_width) / 2
+    y_img = height - img_height - 50
+    c.drawImage(lector, x_img, y_img, img_width, img_height)
+
+    # Escribir datos de la TB debajo de la imagen
+    text_y = y_img - 30
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, text_y, f"No Egreso: {no_egreso}")
+    c.drawString(50, text_y - 20, f"Girado a: {girado_a}")
+
+    c.showPage()
+
+
 def generar_pdf_individual(
-    soporte_path: str,
+    soporte: Union[str, Soporte, Image.Image],
     tb_info: Any,
     output_dir: str
 ) -> str:
@@ -18,95 +91,142 @@ def generar_pdf_individual(
     Genera un PDF individual combinando la imagen del soporte y datos de la TB.
 
     Args:
-        soporte_path (str): Ruta a la imagen del soporte.
+        soporte: Ruta a la imagen, Soporte en memoria o imagen PIL.
         tb_info (pandas.Series): Serie con datos de la transacción ('No Egreso' y 'Girado a').
         output_dir (str): Carpeta donde guardar el PDF.
 
     Returns:
         str: Ruta al PDF generado.
     """
-    if not os.path.isfile(soporte_path):
-        logger.error(f"No se encontró la imagen del soporte: {soporte_path}")
-        raise FileNotFoundError(f"Imagen no encontrada: {soporte_path}")
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    lector = _lector_imagen(soporte)
 
     os.makedirs(output_dir, exist_ok=True)
 
     # Definir nombre del PDF
-    no_egreso = str(tb_info.get('No Egreso', 'NA')).strip()
-    girado_a = str(tb_info.get('Girado a', 'NA')).strip()
-    filename = f"{no_egreso} - {girado_a}.pdf"
-    output_path = os.path.join(output_dir, filename)
+    no_egreso, girado_a = datos_tb(tb_info)
+    output_path = os.path.join(output_dir, nombre_pdf(tb_info))
 
     try:
         # Crear canvas ReportLab
-        c = canvas.Canvas(output_path, pagesize=A4)
-        width, height = A4
-
-        # Dibujar imagen del soporte
-        img = Image.open(soporte_path)
-        img_width, img_height = img.size
-        aspect = img_height / img_width
-        max_width = width * 0.8
-        max_height = height * 0.5
-
-        # Ajustar tamaño manteniendo proporción
-        if img_width > max_width:
-            img_width = max_width
-            img_height = img_width * aspect
-        if img_height > max_height:
-            img_height = max_height
-            img_width = img_height / aspect
-
-        x_img = (width - img_width) / 2
-        y_img = height - img_height - 50
-        c.drawImage(soporte_path, x_img, y_img, img_width, img_height)
-
-        # Escribir datos de la TB debajo de la imagen
-        text_y = y_img - 30
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(50, text_y, f"No Egreso: {no_egreso}")
-        c.drawString(50, text_y - 20, f"Girado a: {girado_a}")
-
-        c.showPage()
-        c.save()
+        with metricas.etapa('pdf.individual'):
+            c = canvas.Canvas(output_path, pagesize=A4)
+            _dibujar_pagina(c, lector, no_egreso, girado_a)
+            c.save()
+        metricas.contar('pdf.generados')
 
-        logger.info(f"PDF generado: {output_path}")
+        logger.debug(f"PDF generado: {output_path}")
         return output_path
 
     except Exception as e:
-        logger.error(f"Error generando PDF para {soporte_path}: {e}")
+        logger.error(f"Error generando PDF para {soporte}: {e}")
         raise
 
 
+def _generar_lote(lote: List[Tuple[Any, Dict[str, str]]], output_dir: str) -> List[str]:
+    return [generar_pdf_individual(soporte, tb, output_dir) for soporte, tb in lote]
+
+
+def _trabajos(resultados: List[Dict[str, Any]]) -> List[Tuple[Any, Dict[str, str]]]:
+    trabajos = []
+    for res in resultados:
+        if res['estado'] == 'ABONADO' and res['tb_info'] is not None:
+            no_egreso, girado_a = datos_tb(res['tb_info'])
+            # Solo los datos necesarios viajan al pool, no la Serie completa
+            trabajos.append((res['soporte'], {'No Egreso': no_egreso, 'Girado a': girado_a}))
+        else:
+            metricas.contar('pdf.omitidos')
+            logger.debug(f"Saltando generación de PDF para soporte con estado {res['estado']}")
+    return trabajos
+
+
+def generar_pdf_consolidado(
+    resultados: List[Dict[str, Any]],
+    output_path: str
+) -> str:
+    """
+    Genera un único PDF con una página por soporte emparejado.
+
+    Todas las páginas comparten el mismo canvas, así que fuentes y recursos
+    se escriben una sola vez en el archivo.
+
+    Returns:
+        str: Ruta al PDF generado.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    trabajos = _trabajos(resultados)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with metricas.etapa('pdf.consolidado'):
+        c = canvas.Canvas(output_path, pagesize=A4)
+        for soporte, tb in trabajos:
+            try:
+                _dibujar_pagina(c, _lector_imagen(soporte), tb['No Egreso'], tb['Girado a'])
+            except Exception as e:
+                logger.error(f"Error agregando soporte {soporte} al PDF consolidado: {e}")
+                raise
+        c.save()
+    metricas.contar('pdf.generados')
+    metricas.contar('pdf.paginas_consolidado', len(trabajos))
+    logger.info(f"PDF consolidado generado con {len(trabajos)} páginas: {output_path}")
+    return output_path
+
+
 def generar_pdfs(
     resultados: List[Dict[str, Any]],
-    output_dir: str
+    output_dir: str,
+    workers: Optional[int] = None,
+    tamano_lote: int = TAMANO_LOTE,
+    consolidado: bool = False,
+    nombre_consolidado: str = 'soportes_emparejados.pdf'
 ) -> List[str]:
     """
     Genera múltiples PDFs individuales para cada resultado emparejado.
 
+    Los PDFs se reparten en lotes entre un pool de procesos; el orden de las
+    rutas devueltas es el de `resultados`.
+
     Args:
         resultados: Lista de dicts con claves 'soporte', 'tb_info', 'estado'.
         output_dir: Carpeta de salida para los PDFs.
+        workers: Procesos de generación. None usa uno por núcleo; 1 genera en serie.
+        tamano_lote: PDFs por tarea del pool.
+        consolidado: Si es True genera un único PDF con una página por soporte.
+        nombre_consolidado: Nombre del PDF consolidado dentro de `output_dir`.
 
     Returns:
         List[str]: Rutas de los PDFs generados.
     """
-    pdf_paths = []
-    for res in resultados:
-        if res['estado'] == 'ABONADO' and res['tb_info'] is not None:
-            path = generar_pdf_individual(
-                res['soporte'], res['tb_info'], output_dir
-            )
-            pdf_paths.append(path)
-        else:
-            logger.info(f"Saltando generación de PDF para soporte con estado {res['estado']}")
-    return pdf_paths
+    if consolidado:
+        return [generar_pdf_consolidado(resultados, os.path.join(output_dir, nombre_consolidado))]
+
+    trabajos = _trabajos(resultados)
+    if not trabajos:
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Si dos TBs dan el mismo nombre, el último soporte sobrescribía al anterior;
+    # se genera solo ese para que el resultado no dependa del orden entre procesos
+    ultimo = {nombre_pdf(tb): i for i, (_, tb) in enumerate(trabajos)}
+    unicos = [trabajos[i] for i in sorted(ultimo.values())]
+
+    lotes = [unicos[i:i + tamano_lote] for i in range(0, len(unicos), tamano_lote)]
+    workers = min(resolver_workers(workers), len(lotes))
+    estadisticas = EstadisticasTrabajadores()
+    for _ in mapear_ordenado(partial(_generar_lote, output_dir=output_dir), lotes,
+                             workers=workers, estadisticas=estadisticas):
+        pass
+    estadisticas.resumen("Generación de PDFs")
+
+    return [os.path.join(output_dir, nombre_pdf(tb)) for _, tb in trabajos]
 
 
 if __name__ == '__main__':
     import argparse
-    from matcher import matchear_soportes
+    from core.matcher import matchear_soportes
     from core.excel_reader import leer_excel, guardar_excel
 
     parser = argparse.ArgumentParser(description='Genera PDFs individuales')
@@ -0,0 +1,334 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from core.diario import DiarioEjecucion, EstadoPDF, hash_archivo, hash_entrada_pdf, hash_imagen
+from core.duplicados import marcar_duplicados
+from core.excel_reader import guardar_excel, leer_excel
+from core.extractor import iterar_soportes
+from core.matcher import MODOS_ASIGNACION, Emparejador, ocr_soportes
+from core.pdf_generator import datos_tb, generar_pdf_individual
+from core.render_pdfium import contar_paginas
+from core.soporte import Soporte
+from utils.cancelacion import ColaCancelable, FlujoCancelado, TokenCancelacion
+from utils.logger import get_logger
+from utils.paralelo import EstadisticasTrabajadores
+
+logger = get_logger(__name__)
+
+# Capacidad de las colas entre etapas: soportes con OCR esperando a ser
+# emparejados y emparejados esperando su PDF
+MAX_COLA_OCR = 64
+MAX_COLA_SALIDA = 64
+
+_FIN = object()
+
+
+@dataclass
+class ResumenFlujo:
+    """Totales de una ejecución del flujo completo."""
+    soportes: int = 0
+    emparejados: int = 0
+    pdfs: int = 0
+    pdfs_reutilizados: int = 0
+    paginas_reanudadas: int = 0
+    duplicados: int = 0
+
+
+def reconciliar_usado(
+    previo: EstadoPDF,
+    df: pd.DataFrame,
+    excel_id: str,
+    margen: float,
+    log: Callable[[str], None]
+) -> Dict[str, int]:
+    """
+    Marca como usadas en `df` las TBs que el diario asignó en ejecuciones
+    anteriores (por si la caída fue antes de guardar el Excel) y devuelve
+    esas asignaciones por nombre de soporte. Las que ya no cuadran con el
+    Excel (fila inexistente o valor fuera de margen) se descartan.
+    """
+    asignaciones: Dict[str, int] = {}
+    valores = pd.to_numeric(df['Valor'], errors='coerce').to_numpy(dtype=float)
+    for (pagina, region), posicion in previo.asignaciones(excel_id).items():
+        soporte = previo.soportes[(pagina, region)]
+        if posicion >= len(df) or not abs(valores[posicion] - soporte.valor) <= margen:
+            log(f"Asignación previa descartada para {Soporte.nombre_de(pagina, region)}: "
+                f"la TB {posicion} ya no coincide con el Excel")
+            continue
+        asignaciones[Soporte.nombre_de(pagina, region)] = posicion
+
+    if asignaciones:
+        usados = df['usado'].to_numpy(dtype=bool, copy=True)
+        faltantes = int((~usados[list(asignaciones.values())]).sum())
+        usados[list(asignaciones.values())] = True
+        df['usado'] = usados
+        if faltantes:
+            log(f"Reconciliado 'usado' con el diario: {faltantes} TBs marcadas")
+    return asignaciones
+
+
+def _soportes_con_diario(
+    soportes: Iterator[Soporte],
+    diario: DiarioEjecucion,
+    hash_pdf: str,
+    previo: EstadoPDF,
+    hashes: Dict[str, str]
+) -> Iterator[Soporte]:
+    """Anota cada región extraída y recupera el OCR ya registrado de su imagen."""
+    for soporte in soportes:
+        h = hash_imagen(soporte.imagen)
+        hashes[soporte.nombre] = h
+        diario.registrar('region', hash_pdf, pagina=soporte.pagina, region=soporte.region,
+                         caja=list(soporte.caja), imagen=h)
+        anterior = previo.soportes.get((soporte.pagina, soporte.region))
+        if anterior is not None and anterior.imagen == h and anterior.estado in ('ABONADO', 'RECHAZADO'):
+            soporte.estado, soporte.valor = anterior.estado, anterior.valor
+        yield soporte
+
+
+def _en_hilo(
+    nombre: str,
+    func: Callable[[], None],
+    token: TokenCancelacion,
+    errores: List[BaseException]
+) -> threading.Thread:
+    """Lanza una etapa en un hilo; si falla, guarda el error y detiene las demás."""
+    def ejecutar() -> None:
+        try:
+            func()
+        except FlujoCancelado:
+            pass
+        except BaseException as e:
+            errores.append(e)
+            token.cancelar()
+
+    hilo = threading.Thread(target=ejecutar, name=nombre, daemon=True)
+    hilo.start()
+    return hilo
+
+
+def ejecutar_flujo(
+    pdf_path: str,
+    excel_path: str,
+    output_dir: str,
+    margen: float = 100.0,
+    workers: Optional[int] = None,
+    reanudar: bool = True,
+    log: Optional[Callable[[str], None]] = None,
+    cancelacion: Optional[TokenCancelacion] = None,
+    asignacion: str = 'secuencial',
+    progreso: Optional[Callable[[str, int, int], None]] = None
+) -> ResumenFlujo:
+    """
+    Ejecuta el flujo completo: extracción, OCR, emparejamiento, guardado del
+    Excel y generación de PDFs.
+
+    Las etapas se solapan: un hilo renderiza páginas y las pasa al pool de
+    OCR, este hilo empareja cada resultado en cuanto llega y otro hilo
+    escribe los PDFs de los emparejados, conectados por colas acotadas. El
+    Excel se lee mientras arranca la extracción.
+
+    Todo queda anotado en un diario dentro de `output_dir` con clave (hash
+    del PDF, página, región). Si una ejecución anterior se interrumpió, se
+    omiten las páginas terminadas, se reutilizan OCR y TBs asignadas, se
+    reconcilia la columna 'usado' y no se regeneran PDFs cuyas entradas no
+    cambiaron.
+
+    Args:
+        pdf_path: PDF de soportes.
+        excel_path: Excel de TBs.
+        output_dir: Carpeta de salida de PDFs (y del diario).
+        margen: Margen en pesos para emparejar.
+        workers: Procesos de renderizado y de OCR. None usa uno por núcleo.
+        reanudar: Si es False se ignora lo registrado en el diario.
+        log: Función para mensajes de progreso (por defecto, el logger).
+        cancelacion: Token para detener el flujo desde otro hilo. Al
+            cancelar se guardan en el Excel las TBs ya asignadas y se lanza
+            FlujoCancelado; la ejecución se puede reanudar después.
+        asignacion: 'secuencial' o 'global' (ver `matcher.matchear_soportes`).
+        progreso: Se llama como progreso(etapa, hechos, total) con etapa
+            'paginas', 'soportes' o 'pdfs', desde los hilos del flujo. Un
+            total 0 indica que aún no se conoce.
+
+    Returns:
+        ResumenFlujo: Totales de la ejecución.
+    """
+    if asignacion not in MODOS_ASIGNACION:
+        raise ValueError(f"Modo de asignación desconocido: {asignacion}")
+    log = log or logger.info
+    avisar = progreso or (lambda etapa, hechos, total: None)
+    resumen = ResumenFlujo()
+    log("Iniciando proceso...")
+
+    token = TokenCancelacion(padre=cancelacion)
+    errores: List[BaseException] = []
+    hilos: List[threading.Thread] = []
+    excel_id = os.path.abspath(excel_path)
+    diario = DiarioEjecucion(output_dir)
+    lector_excel = ThreadPoolExecutor(max_workers=1, thread_name_prefix='lector-excel')
+    df: Optional[pd.DataFrame] = None
+    emparejador: Optional[Emparejador] = None
+    excel_guardado = False
+
+    try:
+        # 1. El Excel se lee en paralelo con la extracción
+        futuro_df = lector_excel.submit(leer_excel, excel_path)
+        hash_pdf = hash_archivo(pdf_path)
+        previo = diario.cargar(hash_pdf) if reanudar else EstadoPDF()
+
+        terminadas = previo.paginas_terminadas(excel_id)
+        total_paginas = contar_paginas(pdf_path)
+        paginas = None
+        if terminadas:
+            paginas = set(range(1, total_paginas + 1)) - terminadas
+            resumen.paginas_reanudadas = len(terminadas)
+            log(f"Reanudando: {len(terminadas)} páginas ya completadas se omiten")
+
+        hashes: Dict[str, str] = {}
+        cola_ocr = ColaCancelable(token, MAX_COLA_OCR)
+        cola_salida = ColaCancelable(token, MAX_COLA_SALIDA)
+        estadisticas = EstadisticasTrabajadores()
+        # Avance de cada etapa; 'pdfs' sabe su total al acabar el emparejamiento
+        conteo = {'paginas': 0, 'pdfs_encolados': 0, 'pdfs_total': 0}
+        pendientes_paginas = total_paginas - len(terminadas or ())
+        avisar('paginas', 0, pendientes_paginas)
+
+        def al_pagina(numero: int, regiones: List[int]) -> None:
+            diario.registrar('pagina', hash_pdf, pagina=numero, regiones=regiones)
+            conteo['paginas'] += 1
+            avisar('paginas', conteo['paginas'], pendientes_paginas)
+
+        # 2a. Etapa de extracción y OCR
+        def extraer() -> None:
+            soportes = marcar_duplicados(_soportes_con_diario(
+                iterar_soportes(pdf_path, workers=workers, paginas=paginas, al_pagina=al_pagina),
+                diario, hash_pdf, previo, hashes
+            ))
+            ocr = ocr_soportes(soportes, workers, estadisticas=estadisticas)
+            try:
+                for item in ocr:
+                    cola_ocr.poner(item)
+            finally:
+                # Cierra los pools de OCR y de renderizado aunque se cancele
+                ocr.close()
+                soportes.close()
+            cola_ocr.poner(_FIN)
+
+        # 2c. Etapa de escritura de PDFs
+        def escribir() -> None:
+            while True:
+                item = cola_salida.sacar()
+                if item is _FIN:
+                    return
+                res, entrada = item
+                soporte = res['soporte']
+                ruta = generar_pdf_individual(soporte, res['tb_info'], output_dir)
+                diario.registrar('salida', hash_pdf, pagina=soporte.pagina, region=soporte.region,
+                                 ruta=os.path.abspath(ruta), entrada=entrada)
+                resumen.pdfs += 1
+                avisar('pdfs', resumen.pdfs, conteo['pdfs_total'])
+
+        hilos.append(_en_hilo('extraccion-ocr', extraer, token, errores))
+        escritor = _en_hilo('salida-pdf', escribir, token, errores)
+        hilos.append(escritor)
+
+        # 2b. Emparejamiento en este hilo, a medida que llega el OCR
+        df = futuro_df.result()
+        log(f"Transacciones en Excel: {len(df)}")
+        asignaciones = reconciliar_usado(previo, df, excel_id, margen, log)
+        emparejador = Emparejador(df, margen, asignaciones)
+
+        def al_emparejar(res: Dict[str, Any]) -> None:
+            if res['tb_idx'] is None:
+                return
+            soporte = res['soporte']
+            resumen.emparejados += 1
+            diario.registrar('tb', hash_pdf, sincronizar=True, pagina=soporte.pagina,
+                             region=soporte.region, tb=int(df.index.get_loc(res['tb_idx'])),
+                             excel=excel_id)
+            # No se regeneran PDFs que ya existen con las mismas entradas
+            entrada = hash_entrada_pdf(hashes[soporte.nombre], *datos_tb(res['tb_info']))
+            anterior = previo.soportes.get((soporte.pagina, soporte.region))
+            if (anterior is not None and anterior.entrada_pdf == entrada
+                    and anterior.pdf and os.path.isfile(anterior.pdf)):
+                resumen.pdfs_reutilizados += 1
+                return
+            conteo['pdfs_encolados'] += 1
+            cola_salida.poner((res, entrada))
+
+        # En modo global el OCR se anota según llega, pero la asignación
+        # espera a tener todos los valores
+        pendientes = []
+        while True:
+            item = cola_ocr.sacar()
+            if item is _FIN:
+                break
+            soporte, estado, valor = item
+            resumen.soportes += 1
+            diario.registrar('ocr', hash_pdf, pagina=soporte.pagina, region=soporte.region,
+                             estado=estado, valor=valor, nivel=soporte.nivel_ocr,
+                             duplicado_de=soporte.duplicado_de)
+            if soporte.duplicado_de is not None:
+                resumen.duplicados += 1
+            avisar('soportes', resumen.soportes, 0)
+            if asignacion == 'global':
+                pendientes.append(item)
+            else:
+                al_emparejar(emparejador.emparejar(*item))
+        if asignacion == 'global':
+            for res in emparejador.emparejar_lote(pendientes):
+                al_emparejar(res)
+
+        emparejador.finalizar()
+        estadisticas.resumen("OCR de soportes")
+        avisar('soportes', resumen.soportes, resumen.soportes)
+        conteo['pdfs_total'] = conteo['pdfs_encolados']
+        avisar('pdfs', resumen.pdfs, conteo['pdfs_total'])
+        cola_salida.poner(_FIN)
+        log(f"Soportes extraídos: {resumen.soportes}")
+        if resumen.duplicados:
+            log(f"Soportes duplicados (sin OCR ni TB propios): {resumen.duplicados}")
+        log("Emparejamiento completado.")
+
+        # 3. El Excel se guarda mientras terminan de escribirse los PDFs
+        guardar_excel(df, excel_path)
+        excel_guardado = True
+        log("Excel actualizado con marcas de usados.")
+        escritor.join()
+        if errores:
+            raise errores[0] from None
+        token.verificar()
+        if resumen.pdfs_reutilizados:
+            log(f"PDFs sin cambios reutilizados: {resumen.pdfs_reutilizados}")
+        log(f"PDFs generados: {resumen.pdfs}")
+    except BaseException as e:
+        token.cancelar()
+        for hilo in hilos:
+            hilo.join()
+        if emparejador is not None and not excel_guardado:
+            # Lo ya asignado también está en el diario; se guarda para no perderlo
+            try:
+                emparejador.finalizar()
+                guardar_excel(df, excel_path)
+            except Exception:
+                logger.exception("No se pudo guardar el Excel tras la interrupción")
+        if isinstance(e, FlujoCancelado) and errores:
+            # Una etapa falló y detuvo a las demás: se informa su error
+            raise errores[0] from None
+        if isinstance(e, FlujoCancelado):
+            log("Proceso cancelado; puede reanudarse más tarde.")
+        raise
+    finally:
+        token.cancelar()
+        for hilo in hilos:
+            hilo.join()
+        lector_excel.shutdown(wait=True)
+        diario.cerrar()
+
+    log("Proceso finalizado con éxito.")
+    return resumen
@@ -0,0 +1,121 @@
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import pypdfium2 as pdfium
+from PIL import Image
+from core.detector_regiones import detectar_regiones, validar_regiones
+from core.kernels_imagen import a_gris, proporciones_no_blancos_regiones
+from utils import metricas
+
+DPI_OCR = 300
+# Resolución de la pasada rápida que decide qué regiones están vacías
+DPI_DETECCION = 72
+
+# Documento abierto por `abrir_documento` en este proceso. Hay uno por
+# proceso, y pdfium no admite llamadas desde varios hilos a la vez, así que
+# los flujos simultáneos van en procesos distintos (ver `cli.ColaTrabajos`)
+_documento: Optional[pdfium.PdfDocument] = None
+
+
+@dataclass
+class PaginaRenderizada:
+    """Regiones no vacías de una página, ya rasterizadas a la resolución de OCR."""
+    numero: int
+    tamano: Tuple[float, float]
+    regiones: List[Tuple[int, Tuple[float, float, float, float], Image.Image]] = field(default_factory=list)
+    omitidas: List[int] = field(default_factory=list)
+    # True si las regiones salen del detector y no de las coordenadas configuradas
+    detectadas: bool = False
+
+
+def contar_paginas(pdf_path: str) -> int:
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def abrir_documento(pdf_path: str) -> None:
+    """Inicializador de proceso: cada trabajador abre el documento una sola vez."""
+    global _documento
+    cerrar_documento()
+    _documento = pdfium.PdfDocument(pdf_path)
+
+
+def cerrar_documento() -> None:
+    global _documento
+    if _documento is not None:
+        _documento.close()
+        _documento = None
+
+
+def ajustar_a_pagina(
+    caja: Tuple[float, float, float, float], ancho: float, alto: float
+) -> Tuple[float, float, float, float]:
+    """Recorta la caja a los límites de la página (p. ej. coordenadas Carta sobre A4)."""
+    x1, y1, x2, y2 = caja
+    return (min(max(x1, 0), ancho), min(max(y1, 0), alto),
+            min(max(x2, 0), ancho), min(max(y2, 0), alto))
+
+
+def renderizar_region(
+    page: pdfium.PdfPage,
+    caja: Tuple[float, float, float, float],
+    dpi: int
+) -> Image.Image:
+    """
+    Rasteriza solo la caja (x1, y1, x2, y2), en puntos con origen arriba a la
+    izquierda, recortando directamente en pdfium en lugar de la página entera.
+    """
+    ancho, alto = page.get_size()
+    x1, y1, x2, y2 = ajustar_a_pagina(caja, ancho, alto)
+    # pdfium recibe cuánto recortar de cada lado: (izquierda, abajo, derecha, arriba)
+    recorte = (x1, alto - y2, ancho - x2, y1)
+    return page.render(scale=dpi / 72, crop=recorte).to_pil()
+
+
+def renderizar_pagina(
+    tarea: Tuple[int, Sequence[Tuple[float, float, float, float]], float, int, bool]
+) -> PaginaRenderizada:
+    """
+    Renderiza las regiones con contenido de una página del documento abierto.
+
+    La página se rasteriza primero a DPI_DETECCION para localizar los
+    soportes (si `detectar` es True; si la detección falla se usan las
+    coordenadas) y descartar regiones vacías; después solo las regiones
+    restantes se rasterizan a `dpi`.
+    """
+    indice, coordenadas, umbral_blanco, dpi, detectar = tarea
+    with metricas.etapa('extractor.render_pagina'):
+        return _renderizar_pagina(indice, coordenadas, umbral_blanco, dpi, detectar)
+
+
+def _renderizar_pagina(
+    indice: int,
+    coordenadas: Sequence[Tuple[float, float, float, float]],
+    umbral_blanco: float,
+    dpi: int,
+    detectar: bool
+) -> PaginaRenderizada:
+    page = _documento[indice]
+    try:
+        ancho, alto = page.get_size()
+        resultado = PaginaRenderizada(indice + 1, (ancho, alto))
+        escala = DPI_DETECCION / 72
+        gris = a_gris(page.render(scale=escala).to_pil())
+        if detectar:
+            detectadas = detectar_regiones(gris, escala)
+            if detectadas is not None and validar_regiones(detectadas):
+                coordenadas = detectadas
+                resultado.detectadas = True
+        cajas = [tuple(c * escala for c in ajustar_a_pagina(caja, ancho, alto)) for caja in coordenadas]
+        proporciones = proporciones_no_blancos_regiones(gris, cajas)
+        for idx, (caja, proporcion) in enumerate(zip(coordenadas, proporciones), start=1):
+            if proporcion <= (1 - umbral_blanco):
+                resultado.omitidas.append(idx)
+                continue
+            resultado.regiones.append((idx, tuple(caja), renderizar_region(page, caja, dpi)))
+        return resultado
+    finally:
+        page.close()
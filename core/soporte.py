@@ -0,0 +1,39 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from PIL import Image
+
+
+@dataclass
+class Soporte:
+    """
+    Soporte extraído de un PDF que viaja en memoria por todo el flujo.
+
+    Guarda la imagen recortada, su origen (página, región y caja en puntos
+    PDF) y, una vez procesado, el resultado del OCR y el nivel de la cascada
+    de OCR que lo dio. `ruta` solo se rellena cuando se ha escrito el PNG de
+    depuración.
+    """
+    imagen: Image.Image
+    pagina: int
+    region: int
+    caja: Tuple[float, float, float, float]
+    ruta: Optional[str] = None
+    estado: Optional[str] = None
+    valor: Optional[float] = None
+    texto_ocr: Optional[str] = None
+    nivel_ocr: Optional[str] = None
+    # Nombre del soporte anterior del que este es una copia (ver `duplicados`)
+    duplicado_de: Optional[str] = None
+
+    @property
+    def nombre(self) -> str:
+        return self.nombre_de(self.pagina, self.region)
+
+    @staticmethod
+    def nombre_de(pagina: int, region: int) -> str:
+        return f"soporte_p{pagina}_{region}"
+
+    def __str__(self) -> str:
+        return self.ruta or self.nombre
+
@@ -0,0 +1,250 @@
+"""
+Procesos tesseract de larga vida para el OCR de soportes.
+
+pytesseract lanza un tesseract nuevo en cada llamada, que vuelve a cargar
+el modelo del idioma; en los recortes pequeños de la cascada ese costo fijo
+pesa más que el reconocimiento. Aquí cada proceso de OCR mantiene abierto
+un tesseract por configuración en modo `stream_filelist`: lee rutas de
+imagen por stdin, una por línea, y escribe por stdout el TSV de cada una
+(el mismo que devuelve `pytesseract.image_to_data`).
+
+Detrás de cada imagen se envía una imagen en blanco como centinela: cuando
+aparece en el TSV la primera fila de su página, la salida de la imagen real
+está completa. Si el tesseract instalado no entrega la salida a tiempo, se
+cae o no existe, `image_to_data` devuelve None y `ocr_processor` vuelve a
+un proceso por llamada.
+
+Está desactivado por defecto: AUTOMATCHER_TESSERACT=persistente lo activa.
+El arranque de cada trabajador puede tardar hasta ESPERA_ARRANQUE si el
+tesseract instalado no entrega la salida por página, y la ganancia depende
+de la versión; conviene medirla antes con `benchmarks.bench_tesseract`.
+"""
+import atexit
+import os
+import queue
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PIL import Image
+
+from utils.logger import get_logger
+from utils import metricas
+
+logger = get_logger(__name__)
+
+# Segundos para cargar el modelo y responder a la primera imagen
+ESPERA_ARRANQUE = 15.0
+# Segundos como máximo para el TSV de una imagen
+ESPERA_IMAGEN = 120.0
+# Fallos seguidos de un trabajador ya arrancado tras los que este proceso
+# deja de usar el modo persistente. Si no arranca, se deja al primer intento
+MAX_FALLOS = 3
+
+COLUMNAS_TSV = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+                'left', 'top', 'width', 'height', 'conf', 'text')
+_COLUMNAS_ENTERAS = COLUMNAS_TSV[:10]
+
+
+class ErrorTrabajador(RuntimeError):
+    """El tesseract persistente no respondió como se esperaba."""
+
+
+def habilitado() -> bool:
+    return os.environ.get('AUTOMATCHER_TESSERACT', 'proceso').strip().lower() == 'persistente'
+
+
+class TrabajadorTesseract:
+    """
+    Un tesseract en modo `stream_filelist` con un idioma y una configuración
+    fijos. No es seguro entre hilos: `image_to_data` lo usa con un candado.
+    """
+
+    def __init__(self, comando: str, idioma: str, config: str = ''):
+        self.pid_dueno = os.getpid()
+        self.candado = threading.Lock()
+        self._carpeta = tempfile.mkdtemp(prefix='automatcher_tesseract_')
+        self._imagen = os.path.join(self._carpeta, 'soporte.png')
+        self._centinela = os.path.join(self._carpeta, 'centinela.png')
+        Image.new('L', (64, 64), 255).save(self._centinela)
+        # Página del TSV que tendrá la próxima imagen (tesseract cuenta desde 1)
+        self._pagina = 1
+        self._lineas: queue.SimpleQueue = queue.SimpleQueue()
+        args = [comando, '-', 'stdout', '-l', idioma, *shlex.split(config),
+                '-c', 'stream_filelist=1', 'tsv']
+        try:
+            self._proceso = subprocess.Popen(
+                args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, encoding='utf-8', errors='replace',
+                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+            )
+        except OSError:
+            shutil.rmtree(self._carpeta, ignore_errors=True)
+            raise
+        threading.Thread(target=self._leer_salida, name='tesseract-salida', daemon=True).start()
+        try:
+            # El centinela solo confirma que el modelo cargó y que la salida llega por página
+            self._enviar(self._centinela)
+            self._filas_hasta(self._pagina, ESPERA_ARRANQUE)
+            self._pagina += 1
+        except BaseException:
+            self.cerrar()
+            raise
+
+    def _leer_salida(self) -> None:
+        for linea in self._proceso.stdout:
+            self._lineas.put(linea)
+        self._lineas.put(None)
+
+    def _enviar(self, *rutas: str) -> None:
+        try:
+            self._proceso.stdin.write(''.join(ruta + '\n' for ruta in rutas))
+            self._proceso.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise ErrorTrabajador(f"tesseract no acepta más imágenes: {e}") from None
+
+    def _filas_hasta(self, pagina: int, espera: float) -> List[List[str]]:
+        """
+        Lee el TSV hasta la primera fila de `pagina` y devuelve las filas
+        leídas de la página anterior.
+        """
+        limite = time.monotonic() + espera
+        filas = []
+        while True:
+            try:
+                linea = self._lineas.get(timeout=max(0.0, limite - time.monotonic()))
+            except queue.Empty:
+                raise ErrorTrabajador(f"tesseract no respondió en {espera:g} s") from None
+            if linea is None:
+                raise ErrorTrabajador(f"tesseract terminó (código {self._proceso.poll()})")
+            campos = linea.rstrip('\r\n').split('\t')
+            if len(campos) < len(COLUMNAS_TSV) - 1 or not campos[1].isdigit():
+                # Cabecera del TSV
+                continue
+            pagina_fila = int(campos[1])
+            if pagina_fila == pagina:
+                return filas
+            if pagina_fila == pagina - 1:
+                filas.append(campos)
+
+    def image_to_data(self, img: Image.Image) -> Dict[str, List[Any]]:
+        """TSV de `img` como el diccionario de `pytesseract.Output.DICT`."""
+        info = {'dpi': img.info['dpi']} if 'dpi' in img.info else {}
+        img.save(self._imagen, format='PNG', compress_level=1, **info)
+        pagina = self._pagina
+        self._pagina += 2
+        self._enviar(self._imagen, self._centinela)
+        filas = self._filas_hasta(pagina + 1, ESPERA_IMAGEN)
+
+        datos: Dict[str, List[Any]] = {columna: [] for columna in COLUMNAS_TSV}
+        for campos in filas:
+            campos = campos + [''] * (len(COLUMNAS_TSV) - len(campos))
+            for columna, valor in zip(COLUMNAS_TSV, campos):
+                if columna == 'page_num':
+                    # pytesseract lee una imagen por llamada: siempre la página 1
+                    datos[columna].append(1)
+                elif columna in _COLUMNAS_ENTERAS:
+                    datos[columna].append(int(valor))
+                elif columna == 'conf':
+                    datos[columna].append(float(valor))
+                else:
+                    datos[columna].append(valor)
+        return datos
+
+    def cerrar(self) -> None:
+        try:
+            self._proceso.stdin.close()
+            self._proceso.wait(timeout=5)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self._proceso.kill()
+        shutil.rmtree(self._carpeta, ignore_errors=True)
+
+
+# (comando, idioma, config) -> trabajador de este proceso y sus fallos
+# seguidos. Ambos y `_descartados` solo se tocan con `_candado`
+_trabajadores: Dict[Tuple[str, str, str], TrabajadorTesseract] = {}
+_fallos: Dict[Tuple[str, str, str], int] = {}
+_candado = threading.Lock()
+# Comandos cuyo tesseract no arrancó en modo persistente (no existe, es
+# anterior a stream_filelist o no vacía la salida por página)
+_descartados: Set[str] = set()
+
+
+def _trabajador(clave: Tuple[str, str, str]) -> TrabajadorTesseract:
+    with _candado:
+        trabajador = _trabajadores.get(clave)
+        if trabajador is not None and trabajador.pid_dueno != os.getpid():
+            # Heredado por fork: sus tuberías son del proceso padre
+            _trabajadores.clear()
+            _fallos.clear()
+            trabajador = None
+        if trabajador is None:
+            with metricas.etapa('tesseract.arranque'):
+                trabajador = TrabajadorTesseract(*clave)
+            metricas.contar('tesseract.arranques')
+            _trabajadores[clave] = trabajador
+        return trabajador
+
+
+def _descartar(clave: Tuple[str, str, str]) -> int:
+    """Cierra el trabajador de `clave` tras un fallo y devuelve sus fallos seguidos."""
+    with _candado:
+        trabajador = _trabajadores.pop(clave, None)
+        fallos = _fallos[clave] = _fallos.get(clave, 0) + 1
+    if trabajador is not None:
+        trabajador.cerrar()
+    return fallos
+
+
+def image_to_data(img: Image.Image, idioma: str, config: str = '') -> Optional[Dict[str, List[Any]]]:
+    """
+    OCR de `img` con el tesseract persistente de (idioma, config).
+
+    Returns:
+        El diccionario de `pytesseract.image_to_data` (Output.DICT), o None
+        si el modo persistente está desactivado o no funciona en este
+        proceso; entonces hay que usar pytesseract.
+    """
+    if not habilitado():
+        return None
+    import pytesseract
+
+    clave = (pytesseract.pytesseract.tesseract_cmd, idioma, config)
+    with _candado:
+        if clave[0] in _descartados or _fallos.get(clave, 0) >= MAX_FALLOS:
+            return None
+    try:
+        trabajador = _trabajador(clave)
+    except (OSError, ErrorTrabajador) as e:
+        with _candado:
+            _descartados.add(clave[0])
+        logger.info(f"tesseract persistente no disponible ({e}); se usa un proceso por llamada")
+        return None
+    try:
+        with trabajador.candado:
+            datos = trabajador.image_to_data(img)
+    except (OSError, ErrorTrabajador) as e:
+        fallos = _descartar(clave)
+        metricas.contar('tesseract.fallos')
+        if fallos >= MAX_FALLOS:
+            logger.warning(f"tesseract persistente desactivado ({e}); se usa un proceso por llamada")
+        else:
+            logger.debug(f"tesseract persistente reiniciado: {e}")
+        return None
+    with _candado:
+        _fallos[clave] = 0
+    return datos
+
+
+@atexit.register
+def cerrar_trabajadores() -> None:
+    """Cierra los tesseract abiertos por este proceso."""
+    with _candado:
+        propios = [t for t in _trabajadores.values() if t.pid_dueno == os.getpid()]
+        _trabajadores.clear()
+    for trabajador in propios:
+        trabajador.cerrar()
@@ -4,10 +4,7 @@ import logging
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 
-from core.extractor import extract_soportes
-from core.excel_reader import leer_excel, guardar_excel
-from core.matcher import matchear_soportes
-from core.pdf_generator import generar_pdfs
+from gui.puente import MAX_LINEAS, PuenteGUI
 
 # Configurar logging para la GUI
 logger = logging.getLogger(__name__)
@@ -17,11 +14,22 @@ logging.basicConfig(level=logging.INFO,
 ctk.set_appearance_mode("System")  # Modo claro/oscuro según sistema
 ctk.set_default_color_theme("blue")  # Tema primario
 
+# Cada cuántos milisegundos la ventana recoge los mensajes del flujo
+INTERVALO_VACIADO_MS = 100
+
+
+def _precargar_flujo():
+    try:
+        import core.pipeline  # noqa: F401
+    except Exception:
+        logger.exception("No se pudo precargar el flujo de procesamiento:")
+
+
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
         self.title("AutoMatcher - Emparejador de Soportes y TBs")
-        self.geometry("700x500")
+        self.geometry("700x560")
         self.resizable(False, False)
 
         # Variables de ruta
@@ -29,7 +37,14 @@ class App(ctk.CTk):
         self.excel_path = ctk.StringVar()
         self.output_dir = ctk.StringVar()
 
+        # Estado de la ejecución en curso
+        self._puente = None
+        self._cancelacion = None
+
         self._build_ui()
+        # La pila de procesamiento (pandas, OCR, ReportLab) se carga en segundo
+        # plano una vez visible la ventana, no antes de mostrarla
+        self.after(200, lambda: threading.Thread(target=_precargar_flujo, daemon=True).start())
 
     def _build_ui(self):
         # Título
@@ -56,13 +71,25 @@ class App(ctk.CTk):
         ctk.CTkEntry(frame_output, textvariable=self.output_dir, width=400).grid(row=0, column=1, padx=5)
         ctk.CTkButton(frame_output, text="Examinar", command=self._select_output).grid(row=0, column=2)
 
-        # Botón de ejecución
-        self.run_button = ctk.CTkButton(self, text="Ejecutar Proceso", command=self._start_process, width=200)
-        self.run_button.pack(pady=10)
+        # Botones de ejecución y cancelación
+        frame_botones = ctk.CTkFrame(self, fg_color="transparent")
+        frame_botones.pack(pady=10)
+        self.run_button = ctk.CTkButton(frame_botones, text="Ejecutar Proceso", command=self._start_process, width=200)
+        self.run_button.grid(row=0, column=0, padx=5)
+        self.cancel_button = ctk.CTkButton(frame_botones, text="Cancelar", command=self._cancel_process,
+                                           width=120, state="disabled")
+        self.cancel_button.grid(row=0, column=1, padx=5)
+
+        # Barra de progreso
+        self.progress_bar = ctk.CTkProgressBar(self, width=650)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(padx=20)
+        self.progress_label = ctk.CTkLabel(self, text="")
+        self.progress_label.pack()
 
         # Área de logs
         self.log_box = ctk.CTkTextbox(self, width=650, height=230, state="disabled")
-        self.log_box.pack(padx=20, pady=(10, 20))
+        self.log_box.pack(padx=20, pady=(5, 20))
 
     def _select_pdf(self):
         path = filedialog.askopenfilename(
@@ -84,45 +111,85 @@ class App(ctk.CTk):
             self.output_dir.set(path)
 
     def _start_process(self):
+        from utils.cancelacion import TokenCancelacion
+
         # Disable button during processing
         self.run_button.configure(state="disabled")
-        threading.Thread(target=self._run_flow, daemon=True).start()
-
-    def _run_flow(self):
+        self.cancel_button.configure(state="normal")
+        self.progress_bar.set(0)
+        self.progress_label.configure(text="")
+        self._puente = PuenteGUI()
+        self._cancelacion = TokenCancelacion()
+        # Las variables de Tk se leen aquí: el hilo del flujo no toca la interfaz
+        rutas = (self.pdf_path.get(), self.excel_path.get(), self.output_dir.get())
+        threading.Thread(target=self._run_flow, args=(*rutas, self._puente, self._cancelacion),
+                         daemon=True).start()
+        self.after(INTERVALO_VACIADO_MS, self._drain_bridge)
+
+    def _cancel_process(self):
+        if self._cancelacion is not None:
+            self._cancelacion.cancelar()
+            self.cancel_button.configure(state="disabled")
+            self._log("Cancelando... se guardará lo ya emparejado.")
+
+    @staticmethod
+    def _run_flow(pdf_path, excel_path, output_dir, puente, cancelacion):
+        # Se ejecuta en un hilo aparte: solo se comunica con la ventana a través del puente
         try:
-            self._log("Iniciando proceso...")
-            # 1. Extraer soportes
-            soportes = extract_soportes(self.pdf_path.get(), self.output_dir.get())
-            self._log(f"Soportes extraídos: {len(soportes)}")
-
-            # 2. Leer Excel
-            df = leer_excel(self.excel_path.get())
-            self._log(f"Transacciones en Excel: {len(df)}")
-
-            # 3. Emparejar
-            resultados = matchear_soportes(soportes, df)
-            self._log("Emparejamiento completado.")
-
-            # 4. Guardar Excel actualizado
-            guardar_excel(df, self.excel_path.get())
-            self._log("Excel actualizado con marcas de usados.")
-
-            # 5. Generar PDFs
-            pdfs = generar_pdfs(resultados, self.output_dir.get())
-            self._log(f"PDFs generados: {len(pdfs)}")
-
-            self._log("Proceso finalizado con éxito.")
-            messagebox.showinfo("Éxito", "Proceso completado exitosamente.")
+            from core.pipeline import ejecutar_flujo
+            from utils.cancelacion import FlujoCancelado
+
+            try:
+                # El flujo anota su avance en un diario y reanuda si se interrumpió
+                ejecutar_flujo(
+                    pdf_path,
+                    excel_path,
+                    output_dir,
+                    log=puente.log,
+                    cancelacion=cancelacion,
+                    progreso=puente.progreso
+                )
+            except FlujoCancelado:
+                puente.terminar('cancelado')
+                return
+            puente.terminar('ok')
         except Exception as e:
             logger.exception("Error durante el proceso:")
-            self._log(f"Error: {e}")
-            messagebox.showerror("Error", str(e))
-        finally:
-            self.run_button.configure(state="normal")
+            puente.log(f"Error: {e}")
+            puente.terminar('error', str(e))
+
+    def _drain_bridge(self):
+        puente = self._puente
+        lote = puente.vaciar()
+        if lote.omitidas:
+            self._log(f"... {lote.omitidas} líneas omitidas ...")
+        if lote.lineas:
+            self._log("\n".join(lote.lineas))
+        self.progress_bar.set(1.0 if lote.fin and lote.fin[0] == 'ok' else puente.fraccion())
+        self.progress_label.configure(text=puente.resumen())
+
+        if lote.fin is None:
+            self.after(INTERVALO_VACIADO_MS, self._drain_bridge)
+            return
+        self.run_button.configure(state="normal")
+        self.cancel_button.configure(state="disabled")
+        self._puente = None
+        self._cancelacion = None
+        estado, mensaje = lote.fin
+        if estado == 'ok':
+            messagebox.showinfo("Éxito", "Proceso completado exitosamente.")
+        elif estado == 'cancelado':
+            messagebox.showinfo("Cancelado", "Proceso cancelado. Al ejecutarlo de nuevo se reanuda donde quedó.")
+        else:
+            messagebox.showerror("Error", mensaje)
 
     def _log(self, msg: str):
+        # Solo desde el hilo de Tk; el cuadro conserva las últimas MAX_LINEAS líneas
         self.log_box.configure(state="normal")
         self.log_box.insert("end", f"{msg}\n")
+        lineas = int(self.log_box.index("end-1c").split(".")[0]) - 1
+        if lineas > MAX_LINEAS:
+            self.log_box.delete("1.0", f"{lineas - MAX_LINEAS + 1}.0")
         self.log_box.see("end")
         self.log_box.configure(state="disabled")
 
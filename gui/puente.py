@@ -0,0 +1,97 @@
+"""
+Puente entre el hilo que ejecuta el flujo y el bucle principal de Tk.
+
+Tk no es seguro entre hilos: el flujo solo encola mensajes (líneas de log,
+avance por etapa y el resultado final) y la ventana vacía la cola con
+`after` cada pocos milisegundos, insertando todas las líneas pendientes de
+una vez.
+"""
+import queue
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Líneas que se conservan como máximo (en cada vaciado y en el cuadro de log)
+MAX_LINEAS = 2000
+
+# Peso de cada etapa en la barra de progreso. El renderizado y el OCR van
+# por páginas y dominan el tiempo; el emparejamiento avanza a la par del OCR
+PESOS_ETAPAS: Dict[str, float] = {'paginas': 0.85, 'pdfs': 0.15}
+
+
+@dataclass
+class Lote:
+    """Lo recibido desde el último vaciado del puente."""
+    lineas: List[str] = field(default_factory=list)
+    # Líneas descartadas por superar MAX_LINEAS en un solo vaciado
+    omitidas: int = 0
+    # Resultado del flujo: (estado, mensaje) con estado 'ok', 'cancelado' o 'error'
+    fin: Optional[Tuple[str, str]] = None
+
+
+class PuenteGUI:
+    """
+    Cola de mensajes del flujo hacia la interfaz.
+
+    `log`, `progreso` y `terminar` se pueden llamar desde cualquier hilo;
+    `vaciar` solo desde el hilo de Tk.
+    """
+
+    def __init__(self, max_lineas: int = MAX_LINEAS):
+        self._cola: queue.SimpleQueue = queue.SimpleQueue()
+        self.max_lineas = max_lineas
+        # etapa -> (hechos, total); el total nunca baja, por si un aviso
+        # anterior llega después de uno que ya lo conocía
+        self.etapas: Dict[str, Tuple[int, int]] = {}
+
+    def log(self, mensaje: str) -> None:
+        self._cola.put(('log', str(mensaje)))
+
+    def progreso(self, etapa: str, hechos: int, total: int) -> None:
+        self._cola.put(('progreso', etapa, hechos, total))
+
+    def terminar(self, estado: str, mensaje: str = '') -> None:
+        self._cola.put(('fin', estado, mensaje))
+
+    def vaciar(self) -> Lote:
+        """Saca todo lo pendiente, quedándose con las últimas `max_lineas` líneas."""
+        lote = Lote()
+        lineas: deque = deque(maxlen=self.max_lineas)
+        recibidas = 0
+        while True:
+            try:
+                mensaje = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            tipo = mensaje[0]
+            if tipo == 'log':
+                lineas.append(mensaje[1])
+                recibidas += 1
+            elif tipo == 'progreso':
+                _, etapa, hechos, total = mensaje
+                hechos_previos, total_previo = self.etapas.get(etapa, (0, 0))
+                self.etapas[etapa] = (max(hechos, hechos_previos), max(total, total_previo))
+            else:
+                lote.fin = (mensaje[1], mensaje[2])
+        lote.lineas = list(lineas)
+        lote.omitidas = recibidas - len(lineas)
+        return lote
+
+    def fraccion(self) -> float:
+        """Avance total entre 0 y 1, ponderando las etapas con total conocido."""
+        avance = 0.0
+        for etapa, peso in PESOS_ETAPAS.items():
+            hechos, total = self.etapas.get(etapa, (0, 0))
+            if total:
+                avance += peso * min(1.0, hechos / total)
+        return avance
+
+    def resumen(self) -> str:
+        """Texto corto con el avance de cada etapa, p. ej. 'Páginas 3/10 · Soportes 12'."""
+        partes = []
+        for etapa, titulo in (('paginas', 'Páginas'), ('soportes', 'Soportes'), ('pdfs', 'PDFs')):
+            if etapa not in self.etapas:
+                continue
+            hechos, total = self.etapas[etapa]
+            partes.append(f"{titulo} {hechos}/{total}" if total else f"{titulo} {hechos}")
+        return ' · '.join(partes)
@@ -0,0 +1,74 @@
+import random
+import time
+
+import numpy as np
+import pytest
+
+from core.asignacion import asignar_global
+
+
+def _fuerza_bruta(valores, valores_tb, libres, margen):
+    """(pares, costo) óptimos probando todas las asignaciones."""
+    s = [round(v * 100) for v in valores]
+    t = {i: round(v * 100) for i, v in enumerate(valores_tb) if libres[i]}
+    m = round(margen * 100)
+    mejor = (0, 0)
+
+    def recorrer(k, usadas, pares, costo):
+        nonlocal mejor
+        if k == len(s):
+            if pares > mejor[0] or (pares == mejor[0] and costo < mejor[1]):
+                mejor = (pares, costo)
+            return
+        recorrer(k + 1, usadas, pares, costo)
+        for i, v in t.items():
+            if i not in usadas and abs(s[k] - v) <= m:
+                recorrer(k + 1, usadas | {i}, pares + 1, costo + abs(s[k] - v))
+
+    recorrer(0, frozenset(), 0, 0)
+    return mejor[0], mejor[1] / 100
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_igual_que_fuerza_bruta(semilla):
+    rng = random.Random(semilla)
+    for _ in range(120):
+        # Importes redondos y con centavos, con muchos repetidos
+        base = rng.choice([1, 5, 50])
+        valores = [rng.randint(0, 20) * base + rng.choice([0, 0, 0.5]) for _ in range(rng.randint(0, 6))]
+        valores_tb = np.array([rng.randint(0, 20) * base + rng.choice([0, 0, 0.25])
+                               for _ in range(rng.randint(0, 7))], dtype=float)
+        libres = np.array([rng.random() > 0.15 for _ in valores_tb], dtype=bool)
+        margen = rng.choice([0, 1, 5, 20, 100])
+
+        resultado = asignar_global(valores, valores_tb, libres, margen)
+
+        assert (len(resultado.asignaciones), resultado.costo) == pytest.approx(
+            _fuerza_bruta(valores, valores_tb, libres, margen))
+        posiciones = list(resultado.asignaciones.values())
+        assert len(set(posiciones)) == len(posiciones)
+        for i, posicion in resultado.asignaciones.items():
+            assert libres[posicion] and abs(valores[i] - valores_tb[posicion]) <= margen + 1e-9
+
+
+def test_empate_gana_la_tb_de_menor_posicion():
+    resultado = asignar_global([100.0], np.array([100.0, 90.0, 100.0]), np.ones(3, dtype=bool), 20)
+    assert resultado.asignaciones == {0: 0}
+    assert resultado.empates == [0]
+
+
+@pytest.mark.parametrize('redondos', [True, False])
+def test_grupo_denso_en_tiempo_acotado(redondos):
+    # Todos los soportes alcanzan todas las TBs: 10^8 pares candidatos
+    rng = np.random.default_rng(1)
+    if redondos:
+        valores, valores_tb = (rng.integers(1000, 1101, n).astype(float) for n in (5000, 20000))
+    else:
+        valores, valores_tb = (np.round(rng.uniform(1000, 1100, n), 2) for n in (5000, 20000))
+
+    inicio = time.perf_counter()
+    resultado = asignar_global(valores.tolist(), valores_tb, np.ones(len(valores_tb), dtype=bool), 100)
+    duracion = time.perf_counter() - inicio
+
+    assert len(resultado.asignaciones) == 5000
+    assert duracion < 20, f"asignar_global tardó {duracion:.1f} s"
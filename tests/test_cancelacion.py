@@ -0,0 +1,34 @@
+import threading
+import time
+
+import pytest
+
+from utils.cancelacion import ColaCancelable, FlujoCancelado, TokenCancelacion
+
+
+def test_cancelar_libera_a_quien_espera():
+    token = TokenCancelacion(padre=TokenCancelacion())
+    llena, vacia = ColaCancelable(token, 1), ColaCancelable(token, 1)
+    llena.poner('ocupa el único hueco')
+    salidas = []
+
+    def esperar(accion):
+        try:
+            accion()
+        except FlujoCancelado:
+            salidas.append(threading.current_thread().name)
+
+    hilos = [threading.Thread(target=esperar, args=(lambda: llena.poner('no cabe'),), name='productor'),
+             threading.Thread(target=esperar, args=(vacia.sacar,), name='consumidor')]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(3 * ColaCancelable.INTERVALO)
+    assert all(hilo.is_alive() for hilo in hilos)
+
+    token._padre.cancelar()
+    for hilo in hilos:
+        hilo.join(timeout=5 * ColaCancelable.INTERVALO)
+    assert not any(hilo.is_alive() for hilo in hilos)
+    assert sorted(salidas) == ['consumidor', 'productor']
+    with pytest.raises(FlujoCancelado):
+        vacia.poner('tras cancelar')
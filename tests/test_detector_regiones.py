@@ -0,0 +1,105 @@
+import random
+
+import pytest
+from reportlab.lib.pagesizes import A4, letter
+from reportlab.pdfgen import canvas
+
+from benchmarks.sinteticos import generar_pdf_soportes
+from core.detector_regiones import validar_regiones
+from core.extractor import COORDENADAS_DEFECTO, iterar_soportes
+
+
+def _pdf_sin_borde(ruta, paginas=2):
+    """
+    Tres soportes por página sin recuadro, cada uno con dos bloques de texto
+    separados por más blanco que HUECO_FILAS_PT.
+    """
+    rng = random.Random(4)
+    ancho, alto = letter
+    c = canvas.Canvas(str(ruta), pagesize=letter)
+    for _ in range(paginas):
+        for x1, y1, x2, y2 in COORDENADAS_DEFECTO:
+            c.setFont('Helvetica-Bold', 18)
+            bloques = [
+                ["ESTADO: ABONADO", f"REFERENCIA: {rng.randint(10**7, 10**8 - 1)}",
+                 "VALOR: $ 1.234.567,89"],
+                ["BANCO DE PRUEBA S.A.", "CUENTA: 123-456789-01", "FECHA: 2024-03-15"],
+            ]
+            y = alto - y1 - 50
+            for bloque in bloques:
+                for texto in bloque:
+                    c.drawString(x1 + 30, y, texto)
+                    y -= 22
+                y -= 40
+        c.showPage()
+    c.save()
+
+
+@pytest.mark.parametrize('motor', ['pdfium', 'pdfplumber'])
+def test_diseno_sin_borde_usa_las_coordenadas(tmp_path, motor):
+    pdf = tmp_path / 'sin_borde.pdf'
+    _pdf_sin_borde(pdf)
+    soportes = list(iterar_soportes(str(pdf), motor=motor, workers=1))
+    assert [(s.pagina, s.region) for s in soportes] == [(p, r) for p in (1, 2) for r in (1, 2, 3)]
+    for soporte in soportes:
+        # Cada recorte contiene el soporte entero: estado, referencia y valor
+        assert soporte.caja == pytest.approx(COORDENADAS_DEFECTO[soporte.region - 1])
+
+
+def test_diseno_con_borde_usa_la_deteccion(tmp_path):
+    pdf = tmp_path / 'con_borde.pdf'
+    generar_pdf_soportes(str(pdf), 1)
+    soportes = list(iterar_soportes(str(pdf), workers=1))
+    assert len(soportes) == 3
+    assert any(s.caja != pytest.approx(c) for s, c in zip(soportes, COORDENADAS_DEFECTO))
+
+
+def _pdf_a4_dos_columnas(ruta):
+    """Una página A4 con seis soportes con recuadro, en dos columnas de tres."""
+    ancho, alto = A4
+    margen, hueco = 20, 30
+    ancho_soporte = (ancho - 2 * margen - hueco) / 2
+    alto_soporte = (alto - 2 * margen - 2 * hueco) / 3
+    c = canvas.Canvas(str(ruta), pagesize=A4)
+    for fila in range(3):
+        for columna in range(2):
+            x = margen + columna * (ancho_soporte + hueco)
+            y = alto - margen - (fila + 1) * alto_soporte - fila * hueco
+            c.setLineWidth(3)
+            c.rect(x, y, ancho_soporte, alto_soporte)
+            c.setFont('Helvetica-Bold', 14)
+            c.drawString(x + 20, y + alto_soporte - 40, "BANCO DE PRUEBA S.A.")
+            c.setFont('Helvetica', 12)
+            c.drawString(x + 20, y + alto_soporte - 70, "Estado: ABONADO")
+            c.drawString(x + 20, y + alto_soporte - 95, f"Valor: $ {fila * 2 + columna + 1}.000,00")
+    c.showPage()
+    c.save()
+    return ancho_soporte, alto_soporte
+
+
+@pytest.mark.parametrize('motor', ['pdfium', 'pdfplumber'])
+def test_a4_dos_columnas_da_seis_regiones(tmp_path, motor):
+    pdf = tmp_path / 'a4.pdf'
+    ancho_soporte, alto_soporte = _pdf_a4_dos_columnas(pdf)
+    soportes = list(iterar_soportes(str(pdf), motor=motor, workers=1))
+    assert [s.region for s in soportes] == [1, 2, 3, 4, 5, 6]
+    for soporte in soportes:
+        x1, y1, x2, y2 = soporte.caja
+        # Un soporte por recorte: del tamaño de su recuadro, no de una banda Carta
+        assert x2 - x1 == pytest.approx(ancho_soporte, abs=16)
+        assert y2 - y1 == pytest.approx(alto_soporte, abs=16)
+    assert max(s.caja[3] for s in soportes) > letter[1] - 20
+
+
+def test_validar_regiones():
+    partidas = [(46, 42, 271, 100), (46, 111, 191, 161)] * 3
+    assert not validar_regiones(partidas)
+    assert not validar_regiones(partidas[:2])
+    assert validar_regiones([(16, 11, 596, 253), (16, 275, 596, 489)])
+    # Seis soportes en dos columnas, más que las bandas configuradas
+    assert validar_regiones([(x, y, x + 270, y + 250) for y in (16, 290, 564) for x in (16, 306)])
+    # Solapadas, o más regiones que MAX_REGIONES
+    assert not validar_regiones([(16, 11, 596, 253), (16, 200, 596, 489)])
+    assert not validar_regiones([(0, i * 150, 200, i * 150 + 140) for i in range(13)])
+    # Demasiado alargada
+    assert not validar_regiones([(0, 0, 1000, 120)])
@@ -0,0 +1,55 @@
+import json
+
+from core.diario import DiarioEjecucion
+
+EXCEL = 'tbs.xlsx'
+
+
+def _soporte_terminado(diario, pdf, pagina, region, tb):
+    diario.registrar('region', 'h', pagina=pagina, region=region, imagen=f'img{pagina}{region}')
+    diario.registrar('ocr', 'h', pagina=pagina, region=region, estado='ABONADO', valor=1000.0)
+    diario.registrar('tb', 'h', sincronizar=True, pagina=pagina, region=region, tb=tb, excel=EXCEL)
+    diario.registrar('salida', 'h', pagina=pagina, region=region, ruta=str(pdf), entrada=f'e{tb}')
+
+
+def test_reanuda_tras_una_linea_final_truncada(tmp_path):
+    pdf = tmp_path / 'salida.pdf'
+    pdf.write_bytes(b'%PDF')
+    diario = DiarioEjecucion(str(tmp_path))
+    diario.registrar('pagina', 'h', pagina=1, regiones=[1, 2])
+    _soporte_terminado(diario, pdf, 1, 1, tb=7)
+    diario.registrar('region', 'h', pagina=1, region=2, imagen='img12')
+    diario.cerrar()
+    # La caída corta a medias el registro de la TB de la región 2
+    completa = json.dumps({'tipo': 'tb', 'pdf': 'h', 'pagina': 1, 'region': 2, 'tb': 8, 'excel': EXCEL})
+    with open(diario.ruta, 'a', encoding='utf-8') as f:
+        f.write(completa[:len(completa) // 2])
+
+    estado = DiarioEjecucion(str(tmp_path)).cargar('h')
+    assert estado.asignaciones(EXCEL) == {(1, 1): 7}
+    assert estado.soporte_terminado(1, 1, EXCEL)
+    assert not estado.soporte_terminado(1, 2, EXCEL)
+    assert estado.paginas_terminadas(EXCEL) == set()
+
+    # La reanudación escribe detrás de la línea truncada sin pegarse a ella
+    diario = DiarioEjecucion(str(tmp_path))
+    diario.registrar('ocr', 'h', pagina=1, region=2, estado='ABONADO', valor=2000.0)
+    diario.registrar('tb', 'h', pagina=1, region=2, tb=8, excel=EXCEL)
+    diario.registrar('salida', 'h', pagina=1, region=2, ruta=str(pdf), entrada='e8')
+    diario.cerrar()
+
+    estado = DiarioEjecucion(str(tmp_path)).cargar('h')
+    assert estado.asignaciones(EXCEL) == {(1, 1): 7, (1, 2): 8}
+    assert estado.paginas_terminadas(EXCEL) == {1}
+    with open(diario.ruta, encoding='utf-8') as f:
+        ilegibles = [linea for linea in f if not linea.startswith('{"tipo"') or not linea.endswith('}\n')]
+    assert len(ilegibles) == 1
+
+
+def test_otro_pdf_no_se_mezcla(tmp_path):
+    pdf = tmp_path / 'salida.pdf'
+    pdf.write_bytes(b'%PDF')
+    diario = DiarioEjecucion(str(tmp_path))
+    _soporte_terminado(diario, pdf, 1, 1, tb=7)
+    diario.cerrar()
+    assert DiarioEjecucion(str(tmp_path)).cargar('otro').soportes == {}
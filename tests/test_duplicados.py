@@ -0,0 +1,73 @@
+import pytest
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from core.duplicados import calcular_firma, comparar, marcar_duplicados
+from core.extractor import COORDENADAS_DEFECTO, iterar_soportes
+
+ORIGINAL = ('12345678', '1.234.567,89')
+
+
+def _soporte(c, region, referencia, valor, dx=0.0, dy=0.0):
+    """Soporte con recuadro como los de `benchmarks.sinteticos`, desplazado (dx, dy) puntos."""
+    x1, y1, x2, _ = COORDENADAS_DEFECTO[region]
+    alto = letter[1]
+    c.setLineWidth(3)
+    c.rect(x1 + 20 + dx, alto - y1 - 215 + dy, (x2 - x1) - 40, 200)
+    c.setFont("Helvetica-Bold", 18)
+    c.drawString(x1 + 50 + dx, alto - y1 - 60 + dy, "BANCO DE PRUEBA S.A.")
+    c.setFont("Helvetica", 14)
+    c.drawString(x1 + 50 + dx, alto - y1 - 95 + dy, "Estado: ABONADO")
+    c.drawString(x1 + 50 + dx, alto - y1 - 125 + dy, f"Referencia: {referencia}")
+    c.drawString(x1 + 50 + dx, alto - y1 - 155 + dy, f"Valor: $ {valor}")
+
+
+@pytest.fixture
+def soportes(tmp_path):
+    """
+    Página 1: el original en las tres regiones (la 2 desplazada menos de un
+    punto). Página 2: variantes del original en un dígito del valor o de la
+    referencia, en la misma región que el original.
+    """
+    pdf = tmp_path / 'soportes.pdf'
+    c = canvas.Canvas(str(pdf), pagesize=letter)
+    for region, (dx, dy) in enumerate([(0, 0), (0.37, -0.21), (0, 0)]):
+        _soporte(c, region, *ORIGINAL, dx, dy)
+    c.showPage()
+    for region, variante in enumerate([('12345678', '1.234.561,89'), ('12345679', '1.234.567,89'),
+                                       ('12345678', '1.234.567,88')]):
+        # Todas en la región 0, la del original, para que el rasterizado coincida salvo el dígito
+        _soporte(c, 0, *variante)
+        c.showPage()
+    c.save()
+    return list(iterar_soportes(str(pdf), workers=1, detectar=False))
+
+
+def test_copias_se_marcan_y_un_digito_distinto_no(soportes):
+    marcados = {s.nombre: s.duplicado_de for s in marcar_duplicados(soportes)}
+    assert marcados == {
+        'soporte_p1_1': None,
+        'soporte_p1_2': 'soporte_p1_1',
+        'soporte_p1_3': 'soporte_p1_1',
+        'soporte_p2_1': None,
+        'soporte_p3_1': None,
+        'soporte_p4_1': None,
+    }
+
+
+def test_la_rejilla_sola_no_separa_un_digito(soportes):
+    # Sin la confirmación a resolución completa estas variantes pasarían por copias
+    original = soportes[0].imagen
+    for variante in soportes[3:]:
+        distancia, diferencia = comparar(original, variante.imagen)
+        assert distancia <= 6 and diferencia <= 32
+
+
+def test_se_puede_desactivar(soportes, monkeypatch):
+    monkeypatch.setenv('AUTOMATCHER_DUPLICADOS', '0')
+    assert all(s.duplicado_de is None for s in marcar_duplicados(soportes))
+
+
+def test_firma_guarda_poca_tinta(soportes):
+    firma = calcular_firma(soportes[0].imagen)
+    assert len(firma.tinta) < 64 * 1024
@@ -0,0 +1,78 @@
+import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from core import excel_reader
+from core.excel_reader import guardar_usado_incremental, leer_excel
+
+
+@pytest.fixture
+def excel(tmp_path, monkeypatch):
+    monkeypatch.setenv('AUTOMATCHER_CACHE', '0')
+    ruta = tmp_path / 'tbs.xlsx'
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['No Egreso', 'Girado a', 'Valor'])
+    for i in range(3):
+        ws.append([i, f'P{i}', 1000.0 * (i + 1)])
+    wb.save(ruta)
+    return str(ruta)
+
+
+def test_guardar_usado_incremental_escribe_solo_cambios(excel):
+    df = leer_excel(excel)
+    df.loc[1, 'usado'] = True
+    # Las celdas vacías ya valen False: solo cambia la fila marcada
+    assert guardar_usado_incremental(df, excel) == 1
+    assert leer_excel(excel)['usado'].tolist() == [False, True, False]
+
+
+def test_guardar_usado_incremental_cierra_el_libro_si_falla(excel, monkeypatch):
+    df = leer_excel(excel)
+    df.loc[0, 'usado'] = True
+    cerrados = []
+    load_workbook = __import__('openpyxl').load_workbook
+
+    def abrir(*args, **kwargs):
+        wb = load_workbook(*args, **kwargs)
+        cerrar = wb.close
+        wb.close = lambda: (cerrados.append(True), cerrar())
+
+        def save(ruta):
+            raise PermissionError('archivo bloqueado')
+        wb.save = save
+        return wb
+    monkeypatch.setattr('openpyxl.load_workbook', abrir)
+    with pytest.raises(PermissionError):
+        guardar_usado_incremental(df, excel)
+    assert cerrados == [True]
+
+
+def test_cache_da_el_mismo_dataframe(tmp_path, monkeypatch):
+    monkeypatch.setenv('AUTOMATCHER_CACHE', '1')
+    monkeypatch.setenv('AUTOMATCHER_CACHE_DIR', str(tmp_path / 'cache'))
+    ruta = str(tmp_path / 'tbs.xlsx')
+    wb = Workbook()
+    ws = wb.active
+    fecha = datetime.datetime(2024, 3, 15)
+    ws.append(['No Egreso', 'Girado a', 'Valor', 'Fecha', 'Cuenta', 'Nota', 'usado'])
+    ws.append([1, 'Proveedor A', 1000.0, fecha, 10, 'x', True])
+    ws.append([None, None, None, None, 11, None, None])
+    ws.append([3, 'Proveedor C', 3000, fecha, 12, 2.5, 'si'])
+    ws.append([4, 5, 4000.5, fecha, 13, None, 0])
+    wb.save(ruta)
+    columnas = ['Valor', 'No Egreso', 'Girado a', 'Fecha', 'Cuenta', 'Nota', 'usado']
+
+    sin_cache = leer_excel(ruta, columnas=columnas)
+
+    def sin_openpyxl(*args):
+        raise AssertionError('debía leerse de la caché')
+    monkeypatch.setattr(excel_reader, '_leer_columnas_openpyxl', sin_openpyxl)
+    con_cache = leer_excel(ruta, columnas=columnas)
+
+    pd.testing.assert_frame_equal(con_cache, sin_cache)
+    # Celdas de tipos mezclados con su tipo original, y vacías como en openpyxl
+    assert con_cache['Girado a'].tolist() == ['Proveedor A', None, 'Proveedor C', 5]
+    assert con_cache['Cuenta'].dtype == 'int64'
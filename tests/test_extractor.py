@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from benchmarks.sinteticos import generar_pdf_soportes
+from core import extractor
+
+
+@pytest.mark.parametrize('motor', ['pdfium', 'pdfplumber'])
+def test_soporte_sin_png_se_omite(tmp_path, monkeypatch, motor):
+    pdf = tmp_path / 'soportes.pdf'
+    generar_pdf_soportes(str(pdf), 1)
+    salida = tmp_path / 'png'
+    salida.mkdir()
+    guardar = extractor._guardar_png
+
+    def guardar_fallando(soporte, sumidero_png):
+        if soporte.nombre == 'soporte_p1_2':
+            raise OSError('disco lleno')
+        guardar(soporte, sumidero_png)
+
+    monkeypatch.setattr(extractor, '_guardar_png', guardar_fallando)
+    soportes = list(extractor.iterar_soportes(str(pdf), sumidero_png=str(salida), motor=motor, workers=1))
+
+    assert [s.nombre for s in soportes] == ['soporte_p1_1', 'soporte_p1_3']
+    assert all(s.ruta and os.path.isfile(s.ruta) for s in soportes)
@@ -0,0 +1,37 @@
+from PIL import Image, ImageDraw, ImageFont
+
+from core.fragmentos import Fragmento, _duplicados_entre_fragmentos
+
+
+def _soporte(referencia, valor):
+    img = Image.new('L', (600, 300), 255)
+    dibujo = ImageDraw.Draw(img)
+    fuente = ImageFont.load_default(size=28)
+    for i, texto in enumerate(["Estado: ABONADO", f"Referencia: {referencia}", f"Valor: $ {valor}"]):
+        dibujo.text((30, 40 + 70 * i), texto, fill=0, font=fuente)
+    return img
+
+
+def _fragmento(carpeta, primera, ultima, soportes):
+    """Fragmento con los PNG de `soportes`: (página, región, imagen, duplicado_de)."""
+    carpeta.mkdir()
+    filas = []
+    for pagina, region, img, duplicado_de in soportes:
+        png = f'p{pagina}_{region}.png'
+        img.save(carpeta / png)
+        filas.append({'pagina': pagina, 'region': region, 'png': png, 'duplicado_de': duplicado_de})
+    return Fragmento(str(carpeta), 'hash', ultima, primera, ultima, {}, filas)
+
+
+def test_duplicados_entre_fragmentos(tmp_path):
+    a = _soporte('12345678', '1.234.567,89')
+    b = _soporte('87654321', '2.500.000,00')
+    primero = _fragmento(tmp_path / 'f1', 1, 1, [(1, 1, a, None), (1, 2, b, None)])
+    # En el segundo fragmento la copia de A es original y tiene a su vez una copia
+    segundo = _fragmento(tmp_path / 'f2', 2, 2, [(2, 1, a.copy(), None), (2, 2, a.copy(), 'soporte_p2_1')])
+    entradas = [(f, s) for f in (primero, segundo) for s in f.soportes]
+
+    assert _duplicados_entre_fragmentos(entradas) == {
+        'soporte_p2_1': 'soporte_p1_1',
+        'soporte_p2_2': 'soporte_p1_1',
+    }
@@ -0,0 +1,23 @@
+"""
+Regresión del tiempo de importación de cada punto de entrada, con la sonda
+de `benchmarks.bench_importacion` (un intérprete nuevo por módulo).
+
+El presupuesto de tiempo se aplica con holgura (AUTOMATCHER_ESCALA_IMPORTACION,
+3 por defecto) para no fallar en máquinas de CI lentas; las dependencias
+pesadas importadas al cargar el módulo fallan siempre.
+"""
+import os
+
+import pytest
+
+from benchmarks.bench_importacion import PRESUPUESTOS, medir
+
+ESCALA = float(os.environ.get('AUTOMATCHER_ESCALA_IMPORTACION', '3'))
+
+
+@pytest.mark.parametrize('modulo', sorted(PRESUPUESTOS))
+def test_importacion_dentro_de_presupuesto(modulo):
+    presupuesto, vigilados = PRESUPUESTOS[modulo]
+    ms, cargados = medir(modulo, vigilados, intentos=3)
+    assert not cargados, f"{modulo} importa al cargarse: {', '.join(cargados)}"
+    assert ms <= presupuesto * ESCALA, f"{modulo} tarda {ms:.0f} ms (presupuesto {presupuesto * ESCALA:.0f} ms)"
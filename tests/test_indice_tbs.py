@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.excel_reader import marcar_usado, obtener_transaccion_libre
+from core.indice_tbs import IndiceTBs
+
+
+def _libro(rng, filas):
+    """TBs con valores repetidos, celdas sin valor numérico, usadas previas e índice no contiguo."""
+    valores = rng.integers(0, 40, filas) * 50.0 + rng.choice([0.0, 0.5], filas)
+    df = pd.DataFrame({
+        'Valor': valores.astype(object),
+        'usado': rng.random(filas) < 0.2,
+    }, index=rng.permutation(np.arange(1000, 1000 + 3 * filas, 3)))
+    df.loc[df.index[rng.random(filas) < 0.05], 'Valor'] = None
+    df.loc[df.index[rng.random(filas) < 0.03], 'Valor'] = 'sin valor'
+    return df
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_igual_que_la_busqueda_lineal(semilla):
+    rng = np.random.default_rng(semilla)
+    df = _libro(rng, int(rng.integers(1, 300)))
+    lineal = df.copy()
+    lineal['Valor'] = pd.to_numeric(lineal['Valor'], errors='coerce')
+    indice = IndiceTBs(df)
+
+    for _ in range(400):
+        valor = float(rng.integers(-2, 42) * 50 + rng.choice([0, 0.5, 25]))
+        margen = float(rng.choice([0, 0.5, 50, 100, 300]))
+        esperado, _ = obtener_transaccion_libre(lineal, valor, margen)
+        idx, fila = indice.obtener_transaccion_libre(valor, margen)
+        assert idx == esperado
+        if idx != -1:
+            assert fila.name == idx
+            marcar_usado(lineal, idx)
+            indice.marcar_usado(idx)
+
+    assert lineal['usado'].sum() > df['usado'].sum()
+    indice.sincronizar()
+    assert df['usado'].tolist() == lineal['usado'].tolist()
+
+
+def test_vacio():
+    indice = IndiceTBs(pd.DataFrame({'Valor': [], 'usado': []}))
+    assert len(indice) == 0
+    assert indice.buscar_libre(100.0) == -1
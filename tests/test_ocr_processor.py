@@ -0,0 +1,113 @@
+import sqlite3
+
+import pytest
+from PIL import Image
+
+import core.ocr_processor as ocr_processor
+from core.ocr_processor import PalabraOCR, ResultadoOCR, procesar_soporte
+
+
+@pytest.fixture
+def imagen():
+    return Image.new('L', (400, 200), 255)
+
+
+@pytest.fixture
+def ocr_abonado(monkeypatch):
+    """OCR simulado que lee siempre un soporte ABONADO de 1.234,56."""
+    textos = []
+
+    def ejecutar(img, config=''):
+        textos.append(config)
+        return ResultadoOCR(texto="Estado: ABONADO\nValor: $ 1.234,56")
+    monkeypatch.setattr(ocr_processor, 'ejecutar_ocr', ejecutar)
+    return textos
+
+
+class CacheRota:
+    def __init__(self, falla_obtener=False, falla_guardar=False):
+        self.falla_obtener = falla_obtener
+        self.falla_guardar = falla_guardar
+
+    def obtener(self, clave):
+        if self.falla_obtener:
+            raise sqlite3.OperationalError('database is locked')
+        return None
+
+    def guardar(self, clave, estado, valor, texto):
+        if self.falla_guardar:
+            raise sqlite3.DatabaseError('database disk image is malformed')
+
+
+@pytest.mark.parametrize('cache', [CacheRota(falla_obtener=True), CacheRota(falla_guardar=True)])
+def test_error_de_cache_no_pierde_el_ocr(monkeypatch, imagen, ocr_abonado, cache):
+    monkeypatch.setattr(ocr_processor, 'obtener_cache', lambda: cache)
+    monkeypatch.setattr(ocr_processor, 'ajustes_ocr', lambda: 'prueba')
+    assert procesar_soporte(imagen) == ('ABONADO', 1234.56)
+
+
+def _ocr_por_recorte(monkeypatch, lecturas):
+    """
+    OCR simulado por recorte: `lecturas` da (texto, confianza) para 'reducida',
+    'estado' (línea del estado), 'valor' (línea del valor) y 'completa'.
+    Devuelve la lista de recortes leídos, uno por llamada a `_ocr_medido`.
+    """
+    llamadas = []
+    medido = ocr_processor._ocr_medido
+
+    def recorte(img, config):
+        if config == ocr_processor.CONFIG_ESTADO:
+            return 'estado'
+        if config == ocr_processor.CONFIG_VALOR:
+            return 'valor'
+        return 'reducida' if img.width < 400 else 'completa'
+
+    def ejecutar(img, config=''):
+        texto, confianza = lecturas[recorte(img, config)]
+        # Una palabra por línea, para que la cascada encuentre la caja de cada una
+        palabras = [PalabraOCR(linea, (10, 20 * i, 100, 15), confianza, i)
+                    for i, linea in enumerate(texto.splitlines())]
+        return ResultadoOCR(texto=texto, palabras=palabras)
+
+    def contar(img, config=ocr_processor.CONFIG_TESSERACT):
+        llamadas.append(recorte(img, config))
+        return medido(img, config)
+    monkeypatch.setattr(ocr_processor, 'ejecutar_ocr', ejecutar)
+    monkeypatch.setattr(ocr_processor, '_ocr_medido', contar)
+    return llamadas
+
+
+VALOR = ("1.234,56", 95.0)
+
+
+@pytest.mark.parametrize('lecturas, esperado, llamadas_esperadas', [
+    # Mal leído a media resolución: se acepta y el valor sale de su línea
+    ({'reducida': ("Estado: ABONAD0\nValor: $ 1.234,56", 95.0), 'valor': VALOR},
+     ('ABONADO', 1234.56), ['reducida', 'valor']),
+    # Ilegible a media resolución: la línea del estado a resolución completa dice ABONADO
+    ({'reducida': ("Estad0: A8QN\nValor: $ 1.234,56", 95.0), 'estado': ("Estado: ABONADO", 95.0),
+      'valor': VALOR},
+     ('ABONADO', 1234.56), ['reducida', 'estado', 'valor']),
+    # Línea del estado dudosa: decide el soporte completo
+    ({'reducida': ("Estado: RECHAZADO", 95.0), 'estado': ("Estado: ABONAD", 40.0),
+      'valor': ("", -1.0), 'completa': ("Estado: ABONADO\nValor: $ 1.234,56", 90.0)},
+     ('ABONADO', 1234.56), ['reducida', 'estado', 'completa']),
+    # Sin línea del estado: decide el soporte completo
+    ({'reducida': ("Banco de prueba", 95.0), 'completa': ("Estado: RECHAZADO", 90.0)},
+     ('RECHAZADO', -1.0), ['reducida', 'completa']),
+])
+def test_cascada_confirma_el_estado_a_resolucion_completa(monkeypatch, imagen, lecturas, esperado,
+                                                         llamadas_esperadas):
+    llamadas = _ocr_por_recorte(monkeypatch, lecturas)
+    assert procesar_soporte(imagen, usar_cache=False) == esperado
+    assert llamadas == llamadas_esperadas
+
+
+def test_rechazo_con_dos_llamadas(monkeypatch, imagen):
+    llamadas = _ocr_por_recorte(monkeypatch, {
+        'reducida': ("BANCO DE PRUEBA\nEstado: RECHAZADO\nValor: $ 1.234,56", 95.0),
+        'estado': ("Estado: RECHAZADO", 92.0),
+    })
+    assert procesar_soporte(imagen, usar_cache=False) == ('RECHAZADO', -1.0)
+    # El soporte reducido y la línea del estado; nunca el soporte completo
+    assert llamadas == ['reducida', 'estado']
@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from benchmarks.sinteticos import generar_excel_tbs, generar_pdf_soportes
+from core import pipeline
+from core.diario import NOMBRE_DIARIO
+from utils.cancelacion import FlujoCancelado, TokenCancelacion
+
+HILOS_FLUJO = ('extraccion-ocr', 'salida-pdf', 'lector-excel')
+
+
+@pytest.fixture
+def entradas(tmp_path, monkeypatch):
+    monkeypatch.setenv('AUTOMATCHER_CACHE', '0')
+    pdf, excel = tmp_path / 'soportes.pdf', tmp_path / 'tbs.xlsx'
+    esperados = generar_pdf_soportes(str(pdf), 4)
+    generar_excel_tbs(str(excel), esperados)
+
+    def ocr_falso(soportes, workers=None, estadisticas=None):
+        # OCR sin tesseract: cada soporte lee el valor que se dibujó en él
+        for soporte in soportes:
+            soporte.estado, soporte.valor = 'ABONADO', esperados[soporte.nombre]
+            yield soporte, soporte.estado, soporte.valor
+
+    monkeypatch.setattr(pipeline, 'ocr_soportes', ocr_falso)
+    return str(pdf), str(excel), len(esperados)
+
+
+def _salidas_registradas(carpeta):
+    with open(os.path.join(carpeta, NOMBRE_DIARIO), encoding='utf-8') as f:
+        registros = [json.loads(linea) for linea in f]
+    return {os.path.basename(r['ruta']) for r in registros if r['tipo'] == 'salida'}
+
+
+def _pdfs(carpeta):
+    return {nombre for nombre in os.listdir(carpeta) if nombre != NOMBRE_DIARIO}
+
+
+def test_cancelar_a_mitad_del_flujo(tmp_path, entradas):
+    pdf, excel, total = entradas
+    salida = str(tmp_path / 'salida')
+    cancelacion = TokenCancelacion()
+
+    def progreso(etapa, hechos, _total):
+        if etapa == 'soportes' and hechos == 3:
+            cancelacion.cancelar()
+
+    with pytest.raises(FlujoCancelado):
+        pipeline.ejecutar_flujo(pdf, excel, salida, workers=1, cancelacion=cancelacion,
+                                progreso=progreso)
+
+    # Ninguna etapa sigue viva ni escribe después de volver
+    assert not [h.name for h in threading.enumerate() if h.name.startswith(HILOS_FLUJO)]
+    generados = _pdfs(salida)
+    time.sleep(0.3)
+    assert _pdfs(salida) == generados
+    # Sin salida a medias: cada archivo es un PDF completo anotado en el diario
+    assert len(generados) < total
+    assert generados == _salidas_registradas(salida)
+    for nombre in generados:
+        with open(os.path.join(salida, nombre), 'rb') as f:
+            assert f.read().rstrip().endswith(b'%%EOF')
+
+    # Al reanudar se completa el resto
+    pipeline.ejecutar_flujo(pdf, excel, salida, workers=1)
+    assert len(_pdfs(salida)) == total
@@ -0,0 +1,59 @@
+import threading
+
+from gui.puente import PuenteGUI
+
+
+def test_vacia_en_orden():
+    puente = PuenteGUI()
+    for i in range(5):
+        puente.log(f"linea {i}")
+        puente.progreso('paginas', i + 1, 5)
+    puente.terminar('ok', 'listo')
+
+    lote = puente.vaciar()
+    assert lote.lineas == [f"linea {i}" for i in range(5)]
+    assert lote.omitidas == 0
+    assert lote.fin == ('ok', 'listo')
+    assert puente.etapas == {'paginas': (5, 5)}
+    assert puente.vaciar().lineas == []
+
+
+def test_orden_por_hilo_entre_vaciados():
+    puente = PuenteGUI()
+    recibidas = []
+
+    def emitir(nombre):
+        for i in range(500):
+            puente.log(f"{nombre} {i}")
+
+    hilos = [threading.Thread(target=emitir, args=(f"h{n}",)) for n in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    while any(hilo.is_alive() for hilo in hilos):
+        recibidas += puente.vaciar().lineas
+    recibidas += puente.vaciar().lineas
+
+    assert len(recibidas) == 4 * 500
+    for n in range(4):
+        assert [linea for linea in recibidas if linea.startswith(f"h{n} ")] == \
+            [f"h{n} {i}" for i in range(500)]
+
+
+def test_se_queda_con_las_ultimas_lineas():
+    puente = PuenteGUI(max_lineas=3)
+    for i in range(10):
+        puente.log(i)
+    lote = puente.vaciar()
+    assert lote.lineas == ['7', '8', '9']
+    assert lote.omitidas == 7
+
+
+def test_un_aviso_atrasado_no_retrocede():
+    puente = PuenteGUI()
+    puente.progreso('pdfs', 4, 10)
+    puente.progreso('pdfs', 3, 0)
+    puente.progreso('soportes', 12, 0)
+    puente.vaciar()
+    assert puente.etapas == {'pdfs': (4, 10), 'soportes': (12, 0)}
+    assert puente.resumen() == 'Soportes 12 · PDFs 4/10'
+    assert puente.fraccion() == 0.15 * 0.4
@@ -0,0 +1,126 @@
+"""
+`tesseract_persistente` contra un tesseract falso que imita el modo
+`stream_filelist`: prueba el TSV y el centinela sin el binario real.
+"""
+import os
+import stat
+import sys
+
+import pytest
+from PIL import Image
+
+from core import tesseract_persistente
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='el tesseract falso es un script con shebang')
+
+# Por cada ruta de stdin escribe el TSV de una página. Las imágenes con tinta
+# llevan palabras con el ancho de la imagen, para distinguir una de otra.
+# FALSO_MODO=buffer no vacía la salida; FALSO_MODO=muere-N termina al
+# pedirle la página N
+TESSERACT_FALSO = r'''#!{python} -u
+import os, sys
+from PIL import Image
+modo = os.environ.get('FALSO_MODO', '')
+if modo == 'buffer':
+    sys.stdout = open(sys.stdout.fileno(), 'w', buffering=1 << 16, closefd=False)
+with open({registro!r}, 'a') as f:
+    f.write(' '.join(sys.argv[1:]) + '\n')
+sys.stdout.write('level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n')
+for pagina, linea in enumerate(sys.stdin, start=1):
+    if modo.startswith('muere-') and pagina >= int(modo[6:]):
+        sys.exit(1)
+    img = Image.open(linea.strip())
+    sys.stdout.write(f'1\t{{pagina}}\t0\t0\t0\t0\t0\t0\t{{img.width}}\t{{img.height}}\t-1\t\n')
+    if img.getextrema()[0] < 128:
+        sys.stdout.write(f'5\t{{pagina}}\t1\t1\t1\t1\t4\t2\t30\t12\t91.5\tEstado:\n')
+        sys.stdout.write(f'5\t{{pagina}}\t1\t1\t1\t2\t40\t2\t30\t12\t90\t{{img.width}}\n')
+    if modo != 'buffer':
+        sys.stdout.flush()
+'''
+
+
+@pytest.fixture
+def falso(tmp_path, monkeypatch):
+    pytesseract = pytest.importorskip('pytesseract')
+    registro = tmp_path / 'argumentos.txt'
+    script = tmp_path / 'tesseract'
+    script.write_text(TESSERACT_FALSO.format(python=sys.executable, registro=str(registro)))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(pytesseract.pytesseract, 'tesseract_cmd', str(script))
+    monkeypatch.setenv('AUTOMATCHER_TESSERACT', 'persistente')
+    monkeypatch.setattr(tesseract_persistente, '_descartados', set())
+    monkeypatch.setattr(tesseract_persistente, '_fallos', {})
+    yield registro
+    tesseract_persistente.cerrar_trabajadores()
+
+
+def _con_tinta(ancho):
+    img = Image.new('L', (ancho, 40), 255)
+    img.paste(0, (2, 2, 10, 10))
+    return img
+
+
+def test_tsv_como_pytesseract(falso):
+    datos = tesseract_persistente.image_to_data(_con_tinta(300), 'spa', '--psm 7')
+    assert datos == {
+        'level': [1, 5, 5],
+        'page_num': [1, 1, 1],
+        'block_num': [0, 1, 1],
+        'par_num': [0, 1, 1],
+        'line_num': [0, 1, 1],
+        'word_num': [0, 1, 2],
+        'left': [0, 4, 40],
+        'top': [0, 2, 2],
+        'width': [300, 30, 30],
+        'height': [40, 12, 12],
+        'conf': [-1.0, 91.5, 90.0],
+        'text': ['', 'Estado:', '300'],
+    }
+    assert falso.read_text().split() == ['-', 'stdout', '-l', 'spa', '--psm', '7',
+                                         '-c', 'stream_filelist=1', 'tsv']
+
+
+def test_el_centinela_separa_las_imagenes(falso):
+    # Un solo proceso, y cada llamada ve solo las filas de su imagen
+    anchos = [120, 340, 77, 340]
+    for ancho in anchos:
+        datos = tesseract_persistente.image_to_data(_con_tinta(ancho), 'spa')
+        assert datos['text'] == ['', 'Estado:', str(ancho)]
+        assert datos['width'][0] == ancho
+    blanca = tesseract_persistente.image_to_data(Image.new('L', (50, 50), 255), 'spa')
+    assert blanca['level'] == [1] and blanca['text'] == ['']
+    assert len(falso.read_text().splitlines()) == 1
+
+
+def test_una_configuracion_por_trabajador(falso):
+    for config in ('', '--psm 7', ''):
+        tesseract_persistente.image_to_data(_con_tinta(90), 'spa', config)
+    assert len(falso.read_text().splitlines()) == 2
+
+
+def test_sin_salida_por_pagina_se_descarta(falso, monkeypatch):
+    monkeypatch.setenv('FALSO_MODO', 'buffer')
+    monkeypatch.setattr(tesseract_persistente, 'ESPERA_ARRANQUE', 1.0)
+    assert tesseract_persistente.image_to_data(_con_tinta(90), 'spa') is None
+    # Descartado el comando, no se vuelve a arrancar
+    assert tesseract_persistente.image_to_data(_con_tinta(90), 'spa') is None
+    assert len(falso.read_text().splitlines()) == 1
+
+
+def test_se_reinicia_y_se_desactiva_tras_fallos_seguidos(falso, monkeypatch):
+    # Cada trabajador arranca con el centinela y muere con la primera imagen
+    monkeypatch.setenv('FALSO_MODO', 'muere-2')
+    for _ in range(tesseract_persistente.MAX_FALLOS + 2):
+        assert tesseract_persistente.image_to_data(_con_tinta(90), 'spa') is None
+    assert len(falso.read_text().splitlines()) == tesseract_persistente.MAX_FALLOS
+
+
+def test_un_fallo_aislado_no_acumula(falso, monkeypatch):
+    # Cada trabajador responde a una imagen (páginas 2 y 3) y muere con la segunda
+    monkeypatch.setenv('FALSO_MODO', 'muere-4')
+    clave = (os.fspath(falso.parent / 'tesseract'), 'spa', '')
+    assert tesseract_persistente.image_to_data(_con_tinta(90), 'spa') is not None
+    assert tesseract_persistente.image_to_data(_con_tinta(90), 'spa') is None
+    assert tesseract_persistente._fallos[clave] == 1
+    assert tesseract_persistente.image_to_data(_con_tinta(90), 'spa') is not None
+    assert tesseract_persistente._fallos[clave] == 0
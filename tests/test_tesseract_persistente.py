@@ -0,0 +1,47 @@
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from core import tesseract_persistente
+from core.ocr_processor import CONFIG_VALOR, IDIOMA_OCR
+
+
+@pytest.fixture
+def tesseract():
+    pytesseract = pytest.importorskip('pytesseract')
+    try:
+        idiomas = pytesseract.get_languages()
+    except Exception:
+        pytest.skip('tesseract no está instalado')
+    if IDIOMA_OCR not in idiomas:
+        pytest.skip(f"tesseract sin el idioma '{IDIOMA_OCR}'")
+    yield pytesseract
+    tesseract_persistente.cerrar_trabajadores()
+
+
+@pytest.fixture
+def soporte():
+    img = Image.new('L', (900, 300), 255)
+    dibujo = ImageDraw.Draw(img)
+    fuente = ImageFont.load_default(size=36)
+    for i, texto in enumerate(["Estado: ABONADO", "Referencia: 12345678", "Valor: $ 1.234.567,89"]):
+        dibujo.text((40, 30 + 80 * i), texto, fill=0, font=fuente)
+    return img
+
+
+def test_desactivado_por_defecto(monkeypatch, soporte):
+    monkeypatch.delenv('AUTOMATCHER_TESSERACT', raising=False)
+    assert not tesseract_persistente.habilitado()
+    assert tesseract_persistente.image_to_data(soporte, IDIOMA_OCR) is None
+
+
+@pytest.mark.parametrize('config', ['', CONFIG_VALOR])
+def test_igual_que_pytesseract(monkeypatch, tesseract, soporte, config):
+    monkeypatch.setenv('AUTOMATCHER_TESSERACT', 'persistente')
+    esperado = tesseract.image_to_data(soporte, lang=IDIOMA_OCR, config=config,
+                                       output_type=tesseract.Output.DICT)
+    # Dos veces: la segunda imagen reutiliza el mismo proceso
+    for _ in range(2):
+        datos = tesseract_persistente.image_to_data(soporte, IDIOMA_OCR, config)
+        if datos is None:
+            pytest.skip('el tesseract instalado no admite el modo persistente')
+        assert datos == esperado
@@ -0,0 +1,63 @@
+import queue
+import threading
+from typing import Any, Optional
+
+
+class FlujoCancelado(Exception):
+    """El flujo se detuvo porque se solicitó su cancelación."""
+
+
+class TokenCancelacion:
+    """
+    Señal de cancelación compartida entre las etapas de un flujo (y con
+    quien lo lanzó, p. ej. el botón Cancelar de la interfaz).
+    """
+
+    def __init__(self, padre: Optional['TokenCancelacion'] = None) -> None:
+        # Un token hijo se cancela con el padre, pero cancelarlo no afecta al padre
+        self._evento = threading.Event()
+        self._padre = padre
+
+    def cancelar(self) -> None:
+        self._evento.set()
+
+    @property
+    def cancelado(self) -> bool:
+        return self._evento.is_set() or (self._padre is not None and self._padre.cancelado)
+
+    def verificar(self) -> None:
+        """Lanza FlujoCancelado si se pidió cancelar."""
+        if self.cancelado:
+            raise FlujoCancelado("Proceso cancelado")
+
+
+class ColaCancelable:
+    """
+    Cola acotada entre dos etapas: `poner` bloquea mientras la cola está
+    llena (contrapresión) y tanto `poner` como `sacar` abandonan la espera
+    en cuanto se cancela el token.
+    """
+
+    # Cada cuánto se revisa el token mientras se espera
+    INTERVALO = 0.1
+
+    def __init__(self, token: TokenCancelacion, maximo: int):
+        self.token = token
+        self._cola: queue.Queue = queue.Queue(maxsize=max(1, maximo))
+
+    def poner(self, item: Any) -> None:
+        while True:
+            self.token.verificar()
+            try:
+                self._cola.put(item, timeout=self.INTERVALO)
+                return
+            except queue.Full:
+                continue
+
+    def sacar(self) -> Any:
+        while True:
+            self.token.verificar()
+            try:
+                return self._cola.get(timeout=self.INTERVALO)
+            except queue.Empty:
+                continue
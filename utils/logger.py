@@ -1,4 +1,15 @@
 import logging
+import os
+from typing import Set
+
+# Con AUTOMATCHER_DEBUG=1 se emiten también los mensajes por soporte, página y TB
+_DEBUG = os.environ.get('AUTOMATCHER_DEBUG', '').strip().lower() in ('1', 'true', 'si', 'sí')
+_NOMBRES: Set[str] = set()
+
+
+def _nivel() -> int:
+    return logging.DEBUG if _DEBUG else logging.INFO
+
 
 def get_logger(name: str = __name__) -> logging.Logger:
     """
@@ -16,6 +27,22 @@ def get_logger(name: str = __name__) -> logging.Logger:
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
         handler.setFormatter(formatter)
         logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
+        logger.setLevel(_nivel())
         logger.propagate = False
+        _NOMBRES.add(name)
     return logger
+
+
+def activar_debug(activo: bool = True) -> None:
+    """
+    Activa o desactiva los mensajes de depuración por elemento en todos los
+    loggers de la aplicación, incluidos los de procesos trabajadores que se
+    creen después (heredan la variable de entorno).
+    """
+    global _DEBUG
+    _DEBUG = activo
+    os.environ['AUTOMATCHER_DEBUG'] = '1' if activo else '0'
+    for nombre in _NOMBRES:
+        logging.getLogger(nombre).setLevel(_nivel())
+    for nombre in ('core', 'automatcher', 'utils', 'gui'):
+        logging.getLogger(nombre).setLevel(_nivel())
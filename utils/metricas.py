@@ -0,0 +1,144 @@
+"""
+Métricas ligeras de ejecución: contadores, tiempos por etapa e histogramas
+de latencia, con volcado a un informe JSON.
+
+Las métricas son globales al proceso. Los trabajadores de
+`utils.paralelo.mapear_ordenado` devuelven lo que registraron en cada tarea
+y el proceso principal lo acumula, así que el informe cubre todo el pool.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+# Límites superiores (segundos) de las cubetas de los histogramas de latencia
+LIMITES_LATENCIA: List[float] = [
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+]
+
+
+class Metricas:
+    """Registro de contadores y etapas cronometradas, seguro entre hilos."""
+
+    def __init__(self) -> None:
+        self._candado = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        with self._candado:
+            self.inicio = time.time()
+            self.contadores: Dict[str, int] = {}
+            # etapa -> [veces, segundos totales, mínimo, máximo, cubetas]
+            self.etapas: Dict[str, list] = {}
+
+    def contar(self, nombre: str, n: int = 1) -> None:
+        with self._candado:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def observar(self, nombre: str, segundos: float) -> None:
+        """Registra una duración de la etapa `nombre`."""
+        with self._candado:
+            etapa = self.etapas.get(nombre)
+            if etapa is None:
+                etapa = self.etapas[nombre] = [0, 0.0, segundos, segundos, [0] * (len(LIMITES_LATENCIA) + 1)]
+            etapa[0] += 1
+            etapa[1] += segundos
+            etapa[2] = min(etapa[2], segundos)
+            etapa[3] = max(etapa[3], segundos)
+            etapa[4][bisect_left(LIMITES_LATENCIA, segundos)] += 1
+
+    @contextmanager
+    def etapa(self, nombre: str) -> Iterator[None]:
+        """Cronometra el bloque y lo registra como una ocurrencia de `nombre`."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio)
+
+    def instantanea(self) -> Dict[str, Any]:
+        """Copia serializable del estado, para enviarla desde un trabajador."""
+        with self._candado:
+            return {
+                'contadores': dict(self.contadores),
+                'etapas': {k: [v[0], v[1], v[2], v[3], list(v[4])] for k, v in self.etapas.items()},
+            }
+
+    def fusionar(self, instantanea: Dict[str, Any]) -> None:
+        """Acumula una instantánea tomada en otro proceso."""
+        with self._candado:
+            for nombre, n in instantanea['contadores'].items():
+                self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+            for nombre, (veces, total, minimo, maximo, cubetas) in instantanea['etapas'].items():
+                etapa = self.etapas.get(nombre)
+                if etapa is None:
+                    self.etapas[nombre] = [veces, total, minimo, maximo, list(cubetas)]
+                    continue
+                etapa[0] += veces
+                etapa[1] += total
+                etapa[2] = min(etapa[2], minimo)
+                etapa[3] = max(etapa[3], maximo)
+                etapa[4] = [a + b for a, b in zip(etapa[4], cubetas)]
+
+    def vacia(self) -> bool:
+        return not self.contadores and not self.etapas
+
+    def reporte(self) -> Dict[str, Any]:
+        """Informe con contadores y, por etapa, totales y percentiles aproximados."""
+        with self._candado:
+            etapas = {}
+            for nombre, (veces, total, minimo, maximo, cubetas) in sorted(self.etapas.items()):
+                etapas[nombre] = {
+                    'veces': veces,
+                    'segundos': round(total, 6),
+                    'media_ms': round(total / veces * 1000, 3),
+                    'min_ms': round(minimo * 1000, 3),
+                    'max_ms': round(maximo * 1000, 3),
+                    'p50_ms': _percentil(cubetas, veces, 0.50, maximo),
+                    'p90_ms': _percentil(cubetas, veces, 0.90, maximo),
+                    'p99_ms': _percentil(cubetas, veces, 0.99, maximo),
+                    'cubetas': {_etiqueta(i): n for i, n in enumerate(cubetas) if n},
+                }
+            return {
+                'inicio': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.inicio)),
+                'duracion_s': round(time.time() - self.inicio, 3),
+                'contadores': dict(sorted(self.contadores.items())),
+                'etapas': etapas,
+            }
+
+    def guardar_reporte(self, ruta: str) -> None:
+        carpeta = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(carpeta, exist_ok=True)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(self.reporte(), f, indent=2, ensure_ascii=False)
+
+
+def _etiqueta(cubeta: int) -> str:
+    if cubeta < len(LIMITES_LATENCIA):
+        return f"<={LIMITES_LATENCIA[cubeta] * 1000:g}ms"
+    return f">{LIMITES_LATENCIA[-1] * 1000:g}ms"
+
+
+def _percentil(cubetas: List[int], veces: int, q: float, maximo: float) -> float:
+    # Límite superior de la cubeta donde cae el percentil (acotado por el máximo real)
+    objetivo = q * veces
+    acumulado = 0
+    for i, n in enumerate(cubetas):
+        acumulado += n
+        if acumulado >= objetivo and n:
+            limite = LIMITES_LATENCIA[i] if i < len(LIMITES_LATENCIA) else maximo
+            return round(min(limite, maximo) * 1000, 3)
+    return round(maximo * 1000, 3)
+
+
+METRICAS = Metricas()
+
+contar = METRICAS.contar
+observar = METRICAS.observar
+etapa = METRICAS.etapa
+reporte = METRICAS.reporte
+guardar_reporte = METRICAS.guardar_reporte
+reiniciar = METRICAS.reiniciar
@@ -0,0 +1,129 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from utils.logger import get_logger
+from utils.metricas import METRICAS
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class EstadisticasTrabajadores:
+    """Acumula tareas y tiempo de cómputo por proceso trabajador (pid)."""
+    tareas: Dict[int, int] = field(default_factory=dict)
+    segundos: Dict[int, float] = field(default_factory=dict)
+    inicio: float = field(default_factory=time.perf_counter)
+
+    def registrar(self, pid: int, segundos: float) -> None:
+        self.tareas[pid] = self.tareas.get(pid, 0) + 1
+        self.segundos[pid] = self.segundos.get(pid, 0.0) + segundos
+
+    def resumen(self, etiqueta: str) -> None:
+        total = sum(self.tareas.values())
+        pared = time.perf_counter() - self.inicio
+        if not total:
+            return
+        logger.info(f"{etiqueta}: {total} tareas en {pared:.2f}s "
+                    f"({total / pared if pared > 0 else 0:.2f}/s) con {len(self.tareas)} trabajadores")
+        for pid in sorted(self.tareas):
+            tareas, segundos = self.tareas[pid], self.segundos[pid]
+            logger.info(f"  trabajador {pid}: {tareas} tareas, "
+                        f"{tareas / segundos if segundos > 0 else 0:.2f}/s de cómputo")
+
+
+def resolver_workers(workers: Optional[int]) -> int:
+    """Devuelve el número de procesos a usar; None significa un proceso por núcleo."""
+    if workers is None:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _identidad(item: Any) -> Any:
+    return item
+
+
+def _medir(func: Callable[[Any], Any], item: Any) -> Tuple[Any, int, float]:
+    inicio = time.perf_counter()
+    resultado = func(item)
+    return resultado, os.getpid(), time.perf_counter() - inicio
+
+
+def _medir_en_trabajador(func: Callable[[Any], Any], item: Any) -> Tuple[Any, int, float, Optional[Dict]]:
+    # Las métricas registradas en el trabajador viajan con el resultado
+    METRICAS.reiniciar()
+    resultado, pid, segundos = _medir(func, item)
+    return resultado, pid, segundos, None if METRICAS.vacia() else METRICAS.instantanea()
+
+
+def mapear_ordenado(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    workers: Optional[int] = None,
+    max_en_vuelo: Optional[int] = None,
+    estadisticas: Optional[EstadisticasTrabajadores] = None,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Tuple = (),
+    con_item: bool = False,
+    carga: Optional[Callable[[Any], Any]] = None
+) -> Iterator[Any]:
+    """
+    Aplica `func` a cada item en un pool de procesos y entrega los resultados
+    en el mismo orden de entrada.
+
+    Args:
+        func: Función a nivel de módulo (debe poder serializarse con pickle).
+        items: Iterable de entradas; se consume de forma perezosa.
+        workers: Procesos del pool. None usa todos los núcleos; 1 ejecuta en serie.
+        max_en_vuelo: Máximo de tareas enviadas sin recoger. Por defecto 2 por trabajador.
+        estadisticas: Acumulador opcional de rendimiento por trabajador.
+        initializer, initargs: Inicializador opcional de cada proceso trabajador.
+        con_item: Si es True entrega tuplas (item, resultado), útil cuando
+            `items` es un generador que no puede recorrerse dos veces.
+        carga: Transforma cada item en lo que realmente se envía a `func`
+            (se evalúa en este proceso); el item original se conserva.
+
+    Yields:
+        Resultado de `func` para cada item, en orden.
+    """
+    workers = resolver_workers(workers)
+    if carga is None:
+        carga = _identidad
+    if workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            resultado, pid, segundos = _medir(func, carga(item))
+            if estadisticas is not None:
+                estadisticas.registrar(pid, segundos)
+            yield (item, resultado) if con_item else resultado
+        return
+
+    max_en_vuelo = max(1, max_en_vuelo or workers * 2)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+    pendientes: deque = deque()
+    try:
+        for item in items:
+            pendientes.append((item, pool.submit(_medir_en_trabajador, func, carga(item))))
+            if len(pendientes) >= max_en_vuelo:
+                yield _recoger(pendientes.popleft(), estadisticas, con_item)
+        while pendientes:
+            yield _recoger(pendientes.popleft(), estadisticas, con_item)
+    finally:
+        # Si el consumidor abandona el generador, se cancelan las tareas que no
+        # empezaron; solo se espera a las que ya se están ejecutando, para no
+        # dejar procesos trabajadores huérfanos
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _recoger(pendiente, estadisticas: Optional[EstadisticasTrabajadores], con_item: bool) -> Any:
+    item, futuro = pendiente
+    resultado, pid, segundos, metricas = futuro.result()
+    if metricas is not None:
+        METRICAS.fusionar(metricas)
+    if estadisticas is not None:
+        estadisticas.registrar(pid, segundos)
+    return (item, resultado) if con_item else resultado